@@ -7,12 +7,25 @@ import random
 import string
 import shutil
 import glob
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, send_from_directory
-from werkzeug.utils import secure_filename
+import time
+import atexit
+import gzip
+import hashlib
+from functools import partial
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, send_from_directory, send_file, Response, stream_with_context
+from werkzeug.utils import safe_join, secure_filename
 
 from config_manager import config
-from utils.converter import convert_to_images
-from utils.analyzer import analyze_images_realtime
+from utils.converter import get_pdf_page_count, get_pdf_path, iter_pdf_pages, prefetch, prepare_pdf
+from utils.analyzer import analyze_images_realtime, analysis_cache, engine
+from utils.metrics import summarize_slides
+from utils.office_pool import get_office_pool
+from utils.uploads import UploadIndex, link_or_copy, link_tree, save_and_hash
+from utils.thumbnails import ThumbnailCache
+from utils.scheduler import JobScheduler
+from utils.events import EventBus, format_sse
+from utils.state import create_task_store
+from utils.sessions import SessionStore
 
 app = Flask(__name__)
 
@@ -37,43 +50,51 @@ app.config['UPLOAD_FOLDER'] = os.path.abspath(UPLOAD_FOLDER)
 app.config['RESULTS_FOLDER'] = os.path.abspath(RESULTS_FOLDER)
 app.config['MAX_CONTENT_LENGTH'] = app_config['max_file_size_bytes']
 
-# 存储处理任务状态
-processing_tasks = {}
-
-# 历史记录存储 - 存储格式：{session_id: record_info}
-history_records = {}
+# 存储处理任务状态，[state] backend = sqlite 时可由多个worker进程共享
+processing_tasks = create_task_store(config.get_state_config())
+atexit.register(processing_tasks.sync)
+
+# 上传文件摘要索引，用于复用相同文件的分析结果
+upload_index = UploadIndex(app_config['upload_index_path'])
+
+# 会话调度：转换和分析分别限制并发数，超出的会话排队
+scheduler_config = config.get_scheduler_config()
+scheduler = JobScheduler(scheduler_config['conversion_workers'], scheduler_config['analysis_workers'],
+                         scheduler_config['max_queue'], scheduler_config['estimated_seconds_per_page'],
+                         scheduler_config['estimated_seconds_per_conversion'],
+                         scheduler_config['aging_pages_per_minute'])
+
+# 网页显示用的缩略图缓存
+thumbnail_config = config.get_thumbnail_config()
+thumbnail_cache = ThumbnailCache(thumbnail_config['cache_dir'], thumbnail_config['cache_max_size_bytes'],
+                                 thumbnail_config['widths'], thumbnail_config['format'],
+                                 thumbnail_config['quality'])
+
+# 事件总线：主题为会话ID（处理进度和模型实时输出）或 'history'（历史记录变化）
+event_bus = EventBus()
+HISTORY_TOPIC = 'history'
+
+# 历史记录存储（SQLite），旧版的 history.json 在首次启动时导入
+session_store = SessionStore(app_config['session_db_path'], app_config['progress_flush_seconds'])
+atexit.register(session_store.flush)
 HISTORY_FILE = 'history.json'
 
 def load_history():
     """加载历史记录"""
-    global history_records
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history_records = json.load(f)
+        imported = session_store.import_json(HISTORY_FILE)
+        if imported:
+            print(f"已从 {HISTORY_FILE} 导入 {imported} 条历史记录")
         
         # 验证历史记录的完整性，清理无效记录
-        valid_records = {}
-        for session_id, record in history_records.items():
-            if validate_record(session_id, record):
-                valid_records[session_id] = record
-            else:
+        for record in session_store.all():
+            session_id = record['session_id']
+            if not validate_record(session_id, record):
                 # 清理无效记录的文件
                 cleanup_session_files(session_id)
-        
-        history_records = valid_records
-        save_history()
+                session_store.delete(session_id)
     except Exception as e:
         print(f"加载历史记录失败: {e}")
-        history_records = {}
-
-def save_history():
-    """保存历史记录"""
-    try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history_records, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"保存历史记录失败: {e}")
 
 def validate_record(session_id, record):
     """验证记录的有效性"""
@@ -98,6 +119,8 @@ def validate_record(session_id, record):
 def cleanup_session_files(session_id):
     """清理会话相关的所有文件"""
     try:
+        upload_index.remove_session(session_id)
+        
         # 清理上传文件
         session_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
         if os.path.exists(session_upload_dir):
@@ -115,24 +138,22 @@ def cleanup_session_files(session_id):
 def manage_history_limit():
     """管理历史记录数量限制"""
     max_records = app_config.get('max_history_records', 30)
+    record_count = len(session_store)
     
-    if len(history_records) >= max_records:
+    if record_count >= max_records:
         # 按创建时间排序，删除最早的记录
-        sorted_records = sorted(history_records.items(), 
-                              key=lambda x: x[1].get('created_at', ''))
-        
-        # 计算需要删除的记录数量
-        to_delete = len(history_records) - max_records + 1
+        to_delete = record_count - max_records + 1
         
-        for i in range(to_delete):
-            session_id, record = sorted_records[i]
+        for record in session_store.all(newest_first=False, limit=to_delete):
+            session_id = record['session_id']
             cleanup_session_files(session_id)
-            del history_records[session_id]
+            session_store.delete(session_id)
+            if session_id in processing_tasks:
+                del processing_tasks[session_id]
+            publish_history_event(session_id)
             print(f"由于达到历史记录上限，删除了记录: {record.get('original_filename', session_id)}")
-        
-        save_history()
 
-def add_history_record(session_id, original_filename, new_filename):
+def add_history_record(session_id, original_filename, new_filename, status='converting'):
     """添加历史记录"""
     manage_history_limit()
     
@@ -141,19 +162,50 @@ def add_history_record(session_id, original_filename, new_filename):
         'original_filename': original_filename,
         'new_filename': new_filename,
         'created_at': datetime.datetime.now().isoformat(),
-        'status': 'converting',
+        'status': status,
         'total_images': 0,
         'processed_images': 0
     }
     
-    history_records[session_id] = record
-    save_history()
+    session_store.add(record)
+    publish_history_event(session_id)
 
 def update_history_record(session_id, **kwargs):
     """更新历史记录"""
-    if session_id in history_records:
-        history_records[session_id].update(kwargs)
-        save_history()
+    if session_store.update(session_id, **kwargs):
+        publish_history_event(session_id)
+
+def update_history_progress(session_id, **kwargs):
+    """更新历史记录中的分析进度，逐张幻灯片的进度批量写入数据库"""
+    if session_store.update_progress(session_id, **kwargs):
+        publish_history_event(session_id)
+
+def get_history_view(record):
+    """历史记录的展示数据，正在处理中的会话合并任务的实时状态"""
+    session_id = record['session_id']
+    try:
+        task = processing_tasks[session_id]
+    except KeyError:
+        return record
+    
+    return dict(record,
+                status=task.get('status', record.get('status')),
+                total_images=task.get('total_images', record.get('total_images', 0)),
+                processed_images=task.get('processed_images', record.get('processed_images', 0)),
+                completed=task.get('completed', False),
+                metrics=get_task_metrics(task),
+                error=task.get('error'))
+
+def publish_history_event(session_id):
+    """向历史记录订阅者推送一条记录的变化，记录已删除时推送删除事件"""
+    if not event_bus.has_subscribers(HISTORY_TOPIC):
+        return
+    record = session_store.get(session_id)
+    if record:
+        event = {'type': 'record', 'record': get_history_view(record)}
+    else:
+        event = {'type': 'delete', 'session_id': session_id}
+    event_bus.publish(HISTORY_TOPIC, event)
 
 # 启动时加载历史记录
 load_history()
@@ -218,6 +270,13 @@ def upload_file():
             'allowed': list(ALLOWED_EXTENSIONS)
         }), 400
     
+    # 排队的会话过多时拒绝，提示客户端稍后重试；在读取文件内容之前检查，不为被拒绝的上传写盘和计算摘要
+    if scheduler.is_full():
+        retry_after = scheduler.retry_after()
+        response = jsonify({'error': f'当前排队的文件过多，请约 {retry_after} 秒后重试', 'retry_after': retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
+    
     # 生成唯一会话ID
     session_id = str(uuid.uuid4())
     session['session_id'] = session_id
@@ -237,136 +296,552 @@ def upload_file():
     random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
     new_filename = f"{timestamp}_{random_suffix}.{extension}"
     
-    # 保存上传的文件
+    # 保存上传的文件，同时计算摘要
     filepath = os.path.join(session_upload_dir, new_filename)
-    file.save(filepath)
+    file_sha256 = save_and_hash(file.stream, filepath)
     
     # 记录文件重命名信息
     print(f"文件重命名: {original_filename} -> {new_filename}")
     
+    # 相同文件已有完整的分析结果时直接复用
+    force = request.form.get('force', '').lower() in ('1', 'true', 'yes', 'on')
+    if app_config['reuse_identical_uploads'] and not force:
+        source_id = upload_index.get(file_sha256)
+        if source_id and reuse_session(source_id, session_id, original_filename, new_filename, file_sha256):
+            return jsonify({
+                'success': True,
+                'session_id': session_id,
+                'reused_from': source_id,
+                'message': '相同文件已分析过，已直接复用分析结果'
+            })
+    
     # 初始化任务状态
-    processing_tasks[session_id] = {
-        'status': 'converting',
+    task = create_task(original_filename, new_filename, status='queued')
+    task['file_sha256'] = file_sha256
+    processing_tasks[session_id] = task
+    
+    # 添加到历史记录
+    add_history_record(session_id, original_filename, new_filename, status='queued')
+    update_history_record(session_id, file_sha256=file_sha256)
+    
+    # 交给调度器：先排队转换，再按页数排队分析
+    scheduler.submit(session_id,
+                     partial(process_file_background, session_id, filepath, session_images_dir, session_desc_dir),
+                     convert=partial(convert_file_background, session_id, filepath, session_images_dir))
+    
+    queue_info = scheduler.queue_info(session_id)
+    return jsonify({
+        'success': True,
+        'session_id': session_id,
+        'queue': queue_info,
+        'message': f"文件上传成功，排在第 {queue_info['position']} 位" if queue_info else '文件上传成功，正在处理...'
+    })
+
+def create_task(original_filename, new_filename, status='converting'):
+    """创建会话的任务状态"""
+    return {
+        'status': status,
         'total_images': 0,
         'processed_images': 0,
         'descriptions': [],
+        'slide_stats': [],
         'images': [],
         'original_filename': original_filename,  # 保存原始文件名以供参考
         'new_filename': new_filename,
+        'streaming': {},  # 正在生成中的幻灯片文本 {index: text}
+        'conversion': None,  # 转换耗时统计
         'completed': False
     }
+
+def reuse_session(source_id, session_id, original_filename, new_filename, file_sha256):
+    """以硬链接方式复制已完成会话的上传文件、图片、描述文件和result.json，生成已完成的新会话
+
+    源会话已被删除或结果不完整时移除其索引并返回False，由调用方重新分析。
+    """
+    source_record = session_store.get(source_id)
+    source_results_dir = os.path.join(app.config['RESULTS_FOLDER'], source_id)
+    try:
+        if not source_record or source_record.get('status') != 'completed':
+            raise FileNotFoundError(f"会话 {source_id} 不存在或未完成")
+        with open(os.path.join(source_results_dir, 'result.json'), 'r', encoding='utf-8') as f:
+            result_data = json.load(f)
+        
+        link_tree(source_results_dir, os.path.join(app.config['RESULTS_FOLDER'], session_id))
+        
+        # 上传文件内容相同，改为指向源会话的同一份文件
+        source_upload = os.path.join(app.config['UPLOAD_FOLDER'], source_id, source_record.get('new_filename', ''))
+        if os.path.isfile(source_upload):
+            link_or_copy(source_upload, os.path.join(app.config['UPLOAD_FOLDER'], session_id, new_filename))
+    except Exception as e:
+        print(f"无法复用会话 {source_id} 的结果，重新分析: {e}")
+        upload_index.remove_session(source_id)
+        return False
     
-    # 添加到历史记录
-    add_history_record(session_id, original_filename, new_filename)
+    task = create_task(original_filename, new_filename, status='completed')
+    task.update({
+        'total_images': len(result_data['images']),
+        'processed_images': len(result_data['images']),
+        'images': result_data['images'],
+        'descriptions': result_data['descriptions'],
+        'slide_stats': result_data.get('slide_stats') or [None] * len(result_data['images']),
+        'file_sha256': file_sha256,
+        'reused_from': source_id,
+        'completed': True,
+    })
+    processing_tasks[session_id] = task
+    processing_tasks.release(session_id)
     
-    # 启动后台处理线程
-    thread = threading.Thread(target=process_file_background, args=(session_id, filepath, session_images_dir, session_desc_dir))
-    thread.daemon = True
-    thread.start()
+    add_history_record(session_id, original_filename, new_filename)
+    update_history_record(session_id,
+                          status='completed',
+                          completed=True,
+                          total_images=task['total_images'],
+                          processed_images=task['processed_images'],
+                          metrics=result_data.get('metrics'),
+                          file_sha256=file_sha256,
+                          reused_from=source_id)
+    print(f"文件与会话 {source_id} 相同，已复用其分析结果: {original_filename}")
+    return True
+
+def fail_task(session_id, error):
+    """记录会话处理失败"""
+    with processing_tasks.lock:
+        processing_tasks[session_id]['error'] = str(error)
+        processing_tasks.release(session_id)
+    # 更新历史记录状态为错误
+    update_history_record(session_id, status='error', error=str(error))
+    publish_status(session_id)
+    publish_stream_event(session_id, {'type': 'end', 'error': str(error)})
+    print(f"处理文件时出错: {str(error)}")
+
+def convert_file_background(session_id, filepath, images_dir):
+    """转换阶段：PPT/PPTX转换为PDF并读取页数，返回页数供分析队列排序，失败时返回None"""
+    task = processing_tasks[session_id]
+    with processing_tasks.lock:
+        task['status'] = 'converting'
+        processing_tasks.mark_changed(session_id, 'status')
+    update_history_record(session_id, status='converting')
+    publish_status(session_id)
+    try:
+        timings = {}
+        pdf_path = prepare_pdf(filepath, images_dir, timings)
+        total_images = get_pdf_page_count(pdf_path)
+    except Exception as e:
+        fail_task(session_id, e)
+        return None
     
-    return jsonify({
-        'success': True,
-        'session_id': session_id,
-        'message': '文件上传成功，正在处理...'
-    })
-
-def process_file_background(session_id, filepath, images_dir, desc_dir):
-    """后台处理文件的函数"""
+    with processing_tasks.lock:
+        task['conversion'] = timings
+        task['total_images'] = total_images
+        task['status'] = 'queued'
+        processing_tasks.mark_changed(session_id, 'conversion', 'total_images', 'status')
+    update_history_record(session_id, status='queued', total_images=total_images)
+    publish_status(session_id)
+    return total_images
+
+def process_file_background(session_id, filepath, images_dir, desc_dir, image_paths=None, resume=False):
+    """分析阶段：逐页渲染并分析
+
+    未传入image_paths时边渲染边分析：PDF（转换阶段已生成）逐批渲染为图片，每渲染好一页就开始分析并推送给页面，
+    已渲染未分析的页面数受 [processing] render_queue_size 限制。
+    resume为True时为恢复中断的会话，复用已写入的描述文件继续分析；
+    同时传入image_paths时跳过渲染，直接使用已渲染的图片。
+    """
     try:
-        # 转换文件为图片
-        image_paths = convert_to_images(filepath, images_dir)
+        timings = dict(processing_tasks[session_id]['conversion'] or {})
+        if image_paths is not None:
+            total_images = len(image_paths)
+            pages = image_paths
+            processing_tasks[session_id]['images'] = [os.path.basename(img) for img in image_paths]
+        else:
+            # 页面在分析过程中逐批渲染
+            processing_config = config.get_processing_config()
+            pdf_path = get_pdf_path(filepath, images_dir)
+            total_images = processing_tasks[session_id]['total_images']
+            timings['page_render_ms'] = []
+            pages = prefetch(iter_pdf_pages(pdf_path, images_dir, batch_size=processing_config['render_batch_size'],
+                                            workers=processing_config['render_max_workers'], timings=timings),
+                             processing_config['render_queue_size'])
+            processing_tasks[session_id]['images'] = [None] * total_images
         
         # 更新任务状态
-        processing_tasks[session_id]['status'] = 'analyzing'
-        processing_tasks[session_id]['total_images'] = len(image_paths)
-        processing_tasks[session_id]['images'] = [os.path.basename(img) for img in image_paths]
+        with processing_tasks.lock:
+            processing_tasks[session_id]['status'] = 'analyzing'
+            processing_tasks[session_id]['total_images'] = total_images
+            processing_tasks.mark_changed(session_id, 'images', 'status', 'total_images')
         
         # 更新历史记录
         update_history_record(session_id, 
                             status='analyzing', 
-                            total_images=len(image_paths))
+                            total_images=total_images)
+        publish_status(session_id)
         
         # 分析图片并生成描述（实时处理）
-        analyze_images_realtime(image_paths, desc_dir, callback=lambda idx, desc: update_analysis_status(session_id, idx, desc))
+        analyze_images_realtime(pages, desc_dir,
+                                callback=lambda idx, desc, stats: update_analysis_status(session_id, idx, desc, stats),
+                                token_callback=lambda idx, delta: update_streaming_text(session_id, idx, delta),
+                                pdf_path=get_pdf_path(filepath, images_dir),
+                                render_times=timings.get('page_render_ms'),
+                                resume=resume,
+                                page_count=total_images,
+                                image_callback=lambda idx, path: update_rendered_image(session_id, idx, path))
+        
+        if image_paths is None:
+            processing_tasks[session_id]['conversion'] = {
+                key: value for key, value in timings.items() if key != 'page_render_ms'
+            }
         
         # 处理完成
         processing_tasks[session_id]['completed'] = True
+        metrics = get_task_metrics(processing_tasks[session_id])
         
         # 更新历史记录状态为完成
         update_history_record(session_id, 
                             status='completed',
                             completed=True,
-                            processed_images=len(image_paths))
+                            processed_images=total_images,
+                            metrics=metrics)
         
         # 将最终结果保存到JSON文件
         result_data = {
             'images': processing_tasks[session_id]['images'],
-            'descriptions': processing_tasks[session_id]['descriptions']
+            'descriptions': processing_tasks[session_id]['descriptions'],
+            'slide_stats': processing_tasks[session_id]['slide_stats'],
+            'metrics': metrics
         }
         
         with open(os.path.join(os.path.dirname(desc_dir), 'result.json'), 'w', encoding='utf-8') as f:
             json.dump(result_data, f, ensure_ascii=False, indent=2)
+        
+        # 全部页面分析成功时记入摘要索引，之后上传相同文件可直接复用
+        file_sha256 = processing_tasks[session_id].get('file_sha256')
+        if file_sha256 and not metrics['failed']:
+            upload_index.put(file_sha256, session_id)
+        
+        processing_tasks.release(session_id)
+        publish_status(session_id)
+        publish_stream_event(session_id, {'type': 'end'})
             
     except Exception as e:
-        processing_tasks[session_id]['error'] = str(e)
-        # 更新历史记录状态为错误
-        update_history_record(session_id, status='error', error=str(e))
-        print(f"处理文件时出错: {str(e)}")
+        fail_task(session_id, e)
+
+def recover_unfinished_sessions():
+    """启动时恢复服务重启前未完成的会话
+
+    已渲染出图片的会话直接复用 results/<id>/images 中的图片和已写入的描述文件，
+    从缺失的幻灯片继续分析；尚未渲染完全部页面的会话从上传的原始文件重新转换，
+    同样复用已写入的描述文件。恢复的会话同样交给调度器排队，不受排队上限限制。
+    """
+    for record in session_store.by_status(('queued', 'converting', 'analyzing')):
+        session_id = record['session_id']
+        if processing_tasks.is_local(session_id):
+            continue
+        
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], session_id, record.get('new_filename', ''))
+        session_results_dir = os.path.join(app.config['RESULTS_FOLDER'], session_id)
+        images_dir = os.path.join(session_results_dir, 'images')
+        desc_dir = os.path.join(session_results_dir, 'descriptions')
+        
+        image_paths = None
+        if record['status'] == 'analyzing':
+            image_paths = sorted(glob.glob(os.path.join(images_dir, '*_page_*.png')))
+            # 边渲染边分析时中断的会话可能只渲染了部分页面，需要重新渲染
+            if not image_paths or len(image_paths) < record.get('total_images', 0):
+                image_paths = None
+        
+        if image_paths is None and not os.path.isfile(filepath):
+            update_history_record(session_id, status='error', error='服务重启后无法恢复：原始文件不存在')
+            continue
+        
+        os.makedirs(images_dir, exist_ok=True)
+        os.makedirs(desc_dir, exist_ok=True)
+        task = create_task(record.get('original_filename'), record.get('new_filename'), status='queued')
+        task['file_sha256'] = record.get('file_sha256')
+        processing_tasks[session_id] = task
+        print(f"恢复未完成的会话: {record.get('original_filename', session_id)}")
+        
+        analyze = partial(process_file_background, session_id, filepath, images_dir, desc_dir, image_paths, True)
+        if image_paths is not None:
+            scheduler.submit(session_id, analyze, pages=len(image_paths))
+        else:
+            scheduler.submit(session_id, analyze,
+                             convert=partial(convert_file_background, session_id, filepath, images_dir))
+
+def start_background_services(run_id=None, workers=1):
+    """服务进程启动后恢复未完成的会话，并在后台提前启动LibreOffice进程池
+
+    run_id 标识一次服务启动，同一次启动的各个worker传入相同的值（见 gunicorn.conf.py），
+    通过会话数据库中的排他事务只由其中一个worker执行恢复；单进程运行时不传入，每次启动都恢复。
+    workers 为worker进程数，每个进程的API限流配额为配置值的 1/workers。
+    """
+    if workers > 1:
+        engine.limiter.share(workers)
+        print(f"共 {workers} 个worker进程，本进程使用 1/{workers} 的API限流配额")
+    
+    # 旧版本的任务状态表只需由一个worker清理一次
+    if config.get_state_config()['backend'] == 'sqlite' and session_store.claim('task_store_schema', 'fields'):
+        processing_tasks.migrate()
+    
+    if session_store.claim('recovery_run_id', run_id or uuid.uuid4().hex):
+        recover_unfinished_sessions()
+    
+    # 第一个PPT上传时不必等待冷启动
+    office_pool = get_office_pool()
+    if office_pool is not None:
+        threading.Thread(target=office_pool.warm_up, daemon=True).start()
+
+def publish_stream_event(session_id, event):
+    """向会话的所有订阅者推送事件"""
+    event_bus.publish(session_id, event)
+
+def publish_status(session_id):
+    """向会话的订阅者推送最新的处理状态（与 /status 返回的内容相同）"""
+    if event_bus.has_subscribers(session_id) and session_id in processing_tasks:
+        publish_stream_event(session_id, dict(get_status_payload(session_id), type='status'))
+
+def update_rendered_image(session_id, index, image_path):
+    """页面渲染完成的回调函数，页面不必等待分析完成即可显示"""
+    if session_id in processing_tasks:
+        with processing_tasks.lock:
+            processing_tasks[session_id]['images'][index] = os.path.basename(image_path)
+            processing_tasks.mark_changed(session_id, 'images', index=index)
+        publish_stream_event(session_id, {'type': 'image', 'index': index})
 
-def update_analysis_status(session_id, index, description):
-    """更新分析状态的回调函数"""
+def update_streaming_text(session_id, index, delta):
+    """模型流式输出的回调函数，delta为None表示请求将重试，丢弃已输出的文本"""
     if session_id in processing_tasks:
-        # 确保descriptions列表长度足够
-        while len(processing_tasks[session_id]['descriptions']) <= index:
-            processing_tasks[session_id]['descriptions'].append(None)
+        streaming = processing_tasks[session_id]['streaming']
+        if delta is None:
+            streaming.pop(index, None)
+            publish_stream_event(session_id, {'type': 'token_reset', 'index': index})
+            return
+        streaming[index] = streaming.get(index, '') + delta
+        publish_stream_event(session_id, {'type': 'token', 'index': index, 'delta': delta})
+
+def update_analysis_status(session_id, index, description, stats=None):
+    """更新分析状态的回调函数，分析失败时description为None，错误信息在stats['error']中"""
+    if session_id in processing_tasks:
+        with processing_tasks.lock:
+            # 确保descriptions列表长度足够
+            while len(processing_tasks[session_id]['descriptions']) <= index:
+                processing_tasks[session_id]['descriptions'].append(None)
+                processing_tasks[session_id]['slide_stats'].append(None)
+            
+            # 更新描述和进度
+            processing_tasks[session_id]['descriptions'][index] = description
+            processing_tasks[session_id]['slide_stats'][index] = stats
+            processing_tasks[session_id]['processed_images'] = index + 1
+            processing_tasks.mark_changed(session_id, 'descriptions', 'slide_stats', index=index)
+            processing_tasks.mark_changed(session_id, 'processed_images')
         
-        # 更新描述和进度
-        processing_tasks[session_id]['descriptions'][index] = description
-        processing_tasks[session_id]['processed_images'] = index + 1
+        # 幻灯片已完成，清理流式输出缓冲
+        processing_tasks[session_id]['streaming'].pop(index, None)
+        error = (stats or {}).get('error')
+        publish_stream_event(session_id, {'type': 'slide_done', 'index': index, 'error': error,
+                                          'slide': build_slide(session_id, processing_tasks[session_id], index)})
         
         # 更新历史记录进度
-        update_history_record(session_id, processed_images=index + 1)
+        if error:
+            update_history_progress(session_id, processed_images=index + 1,
+                                    failed_images=count_failed_slides(processing_tasks[session_id]))
+        else:
+            update_history_progress(session_id, processed_images=index + 1)
+        publish_status(session_id)
 
-@app.route('/status/<session_id>')
-def get_status(session_id):
-    """获取当前处理状态"""
-    if session_id not in processing_tasks:
-        return jsonify({'error': '会话不存在'}), 404
-        
-    task = processing_tasks[session_id]
-    return jsonify({
+def get_task_metrics(task):
+    """汇总会话的耗时、token和请求体积统计"""
+    return summarize_slides(task['slide_stats'], task.get('conversion'))
+
+def count_failed_slides(task):
+    """统计分析失败的幻灯片数"""
+    return sum(1 for stats in task['slide_stats'] if stats and stats.get('error'))
+
+def get_status_payload(session_id, task=None):
+    """会话的当前处理状态"""
+    task = task or processing_tasks[session_id]
+    return {
         'status': task['status'],
         'total_images': task['total_images'],
         'processed_images': task['processed_images'],
         'completed': task['completed'],
+        'failed_images': count_failed_slides(task),
+        'metrics': get_task_metrics(task),
+        'queue': scheduler.queue_info(session_id),
         'error': task.get('error')
-    })
+    }
+
+def build_slide(session_id, task, index):
+    """已完成分析或分析失败的幻灯片的展示数据，其他情况返回None"""
+    image = task['images'][index] if index < len(task['images']) else None
+    if image is None:
+        # 恢复会话时，已有分析的页面可能尚未重新渲染
+        return None
+    stats = task['slide_stats'][index] or {}
+    description = task['descriptions'][index]
+    if not description and not stats.get('error'):
+        return None
+    return {
+        'number': index + 1,
+        'image': f"/results/{session_id}/images/{image}",
+        'description': description,
+        'error': stats.get('error'),
+        'reused_from': stats.get('reused_from'),
+        'delta_of': stats.get('delta_of')
+    }
+
+@app.route('/status/<session_id>')
+def get_status(session_id):
+    """获取当前处理状态（轮询接口，实时推送见 /events/<session_id>）"""
+    if session_id not in processing_tasks:
+        return jsonify({'error': '会话不存在'}), 404
+    
+    return jsonify(get_status_payload(session_id))
+
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/events/<session_id>')
+@app.route('/stream/<session_id>')
+def session_events(session_id):
+    """以SSE推送会话的处理进度和模型实时输出
+
+    连接后先发送当前状态（status）和正在生成中的文本（token），之后推送
+    status、image、token、token_reset、slide_done 事件，处理结束时发送 end 并关闭。
+    """
+    if session_id not in processing_tasks:
+        return jsonify({'error': '会话不存在'}), 404
+    
+    task = processing_tasks[session_id]
+    if not processing_tasks.is_local(session_id) and not (task['completed'] or task.get('error')):
+        # 会话由其他worker进程处理，事件不会发布到本进程
+        return sse_response(poll_session_events(session_id, task))
+    
+    subscription = event_bus.subscribe(session_id)
+    
+    snapshot = [dict(get_status_payload(session_id), type='status')]
+    # 补发正在生成中的文本
+    snapshot += [{'type': 'token', 'index': index, 'delta': text} for index, text in list(task['streaming'].items())]
+    if task['completed'] or task.get('error'):
+        snapshot.append({'type': 'end', 'error': task.get('error')})
+    
+    return sse_response(event_bus.stream(session_id, subscription, snapshot))
+
+def poll_session_events(session_id, task, interval=1.0, keepalive=15):
+    """定时读取共享的任务状态生成 status、image、slide_done 和 end 事件，不包含模型的实时输出"""
+    # 连接时客户端会获取一次部分结果，之后只推送新的变化
+    last_status = None
+    processed = task['processed_images']
+    rendered = sum(1 for image in task['images'] if image)
+    idle = 0.0
+    while True:
+        events = []
+        status = dict(get_status_payload(session_id, task), type='status')
+        if status != last_status:
+            events.append(status)
+            last_status = status
+        
+        rendered_now = sum(1 for image in task['images'] if image)
+        if rendered_now > rendered:
+            events.append({'type': 'image', 'index': rendered_now - 1})
+            rendered = rendered_now
+        for index in range(processed, task['processed_images']):
+            slide = build_slide(session_id, task, index)
+            events.append({'type': 'slide_done', 'index': index, 'error': (slide or {}).get('error'), 'slide': slide})
+        processed = max(processed, task['processed_images'])
+        
+        if task['completed'] or task.get('error'):
+            events.append({'type': 'end', 'error': task.get('error')})
+        
+        for event in events:
+            yield format_sse(event)
+            if event['type'] == 'end':
+                return
+        
+        if events:
+            idle = 0.0
+        elif idle >= keepalive:
+            yield ": keepalive\n\n"
+            idle = 0.0
+        
+        time.sleep(interval)
+        idle += interval
+        try:
+            task = processing_tasks[session_id]
+        except KeyError:
+            return
+
+@app.route('/api/history/events')
+def history_events():
+    """以SSE推送历史记录的变化：record（新增或更新，内容与 /api/history 中的记录相同）和 delete"""
+    subscription = event_bus.subscribe(HISTORY_TOPIC)
+    return sse_response(event_bus.stream(HISTORY_TOPIC, subscription, end_types=()))
 
 @app.route('/partial-results/<session_id>')
 def get_partial_results(session_id):
-    """获取部分处理结果"""
+    """获取部分处理结果
+
+    ?since=N 只返回第 N 张之后的幻灯片（N 为客户端已有的幻灯片数，返回的 next_since 用于下一次请求）。
+    响应带有ETag（由返回内容的各项状态和响应编码计算），内容未变化时返回304；
+    已完成的会话结果不再变化，允许缓存并在客户端支持时gzip压缩，gzip响应使用不同的ETag。
+    """
     if session_id not in processing_tasks:
         return jsonify({'error': '会话不存在'}), 404
         
     task = processing_tasks[session_id]
+    since = max(0, request.args.get('since', 0, type=int))
+    rendered = sum(1 for image in task['images'] if image)
+    use_gzip = task['completed'] and 'gzip' in request.headers.get('Accept-Encoding', '')
+    
+    etag = hashlib.sha256(
+        f"{session_id}:{since}:{task['processed_images']}:{rendered}:{task['completed']}:"
+        f"{task['status']}:{task.get('error')}".encode('utf-8')
+    ).hexdigest()[:32]
+    if use_gzip:
+        etag += '-gzip'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        if task['completed']:
+            response.vary.add('Accept-Encoding')
+        return response
     
     # 构建当前已处理的幻灯片数据
     slides = []
-    for i, (image, description) in enumerate(zip(task['images'][:task['processed_images']], 
-                                             task['descriptions'][:task['processed_images']])):
-        if description:  # 只返回已完成分析的幻灯片
-            slides.append({
-                'number': i + 1,
-                'image': f"/results/{session_id}/images/{image}",
-                'description': description
-            })
+    for i in range(task['processed_images']):
+        if task['images'][i] is None:
+            # 恢复会话时，已有分析的页面可能尚未重新渲染
+            break
+        slide = build_slide(session_id, task, i)
+        if slide:  # 只返回已完成分析或分析失败的幻灯片
+            slides.append(slide)
     
-    return jsonify({
-        'slides': slides,
+    # 已渲染但尚未完成分析的页面
+    pending_images = [f"/results/{session_id}/images/{image}"
+                      for image in task['images'][task['processed_images']:] if image]
+    
+    response = jsonify({
+        'slides': slides[since:],
+        'next_since': max(since, len(slides)),
+        'pending_images': pending_images,
         'total_processed': task['processed_images'],
         'total_images': task['total_images'],
+        'status': task['status'],
+        'error': task.get('error'),
         'completed': task['completed']
     })
+    response.set_etag(etag)
+    
+    if task['completed']:
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        response.vary.add('Accept-Encoding')
+        if use_gzip:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    else:
+        # 处理中的会话每次都需要用ETag重新验证
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/view/<session_id>')
 def view_results(session_id):
@@ -378,10 +853,24 @@ def view_results(session_id):
 
 @app.route('/results/<session_id>/images/<filename>')
 def get_image(session_id, filename):
-    """获取图片文件"""
+    """获取图片文件，带 ?w=<宽度> 参数时返回缩略图"""
     # 使用send_from_directory直接提供文件，避免重定向循环
     images_dir = os.path.join(app.config['RESULTS_FOLDER'], session_id, 'images')
-    return send_from_directory(images_dir, filename)
+    max_age = thumbnail_config['browser_cache_seconds']
+    width = request.args.get('w', type=int)
+    if not width or width <= 0:
+        return send_from_directory(images_dir, filename, max_age=max_age)
+    
+    image_path = safe_join(images_dir, filename)
+    if image_path is None or not os.path.isfile(image_path):
+        return jsonify({'error': '图片不存在'}), 404
+    
+    accept_webp = 'image/webp' in request.headers.get('Accept', '')
+    thumbnail_path, mime_type = thumbnail_cache.get(image_path, width, accept_webp)
+    response = send_file(thumbnail_path, mimetype=mime_type, max_age=max_age, conditional=True)
+    response.headers['Cache-Control'] = f"public, max-age={max_age}, immutable"
+    response.vary.add('Accept')
+    return response
 
 @app.route('/check-math-engine')
 def check_math_engine():
@@ -392,50 +881,43 @@ def get_history():
     """获取历史记录列表"""
     try:
         # 按创建时间倒序排列
-        sorted_records = sorted(history_records.values(), 
-                              key=lambda x: x.get('created_at', ''), 
-                              reverse=True)
-        
-        # 更新正在处理中的记录状态
-        for record in sorted_records:
-            session_id = record['session_id']
-            if session_id in processing_tasks:
-                task = processing_tasks[session_id]
-                record.update({
-                    'status': task.get('status', record.get('status')),
-                    'total_images': task.get('total_images', record.get('total_images', 0)),
-                    'processed_images': task.get('processed_images', record.get('processed_images', 0)),
-                    'completed': task.get('completed', False),
-                    'error': task.get('error')
-                })
+        sorted_records = session_store.all()
         
         return jsonify({
             'success': True,
-            'records': sorted_records,
+            # 正在处理中的记录合并实时状态
+            'records': [get_history_view(record) for record in sorted_records],
             'max_records': app_config.get('max_history_records', 30)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """获取分析缓存统计信息"""
+    if analysis_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    return jsonify({'success': True, 'enabled': True, 'stats': analysis_cache.stats()})
+
 @app.route('/api/history/<session_id>', methods=['DELETE'])
 def delete_history_record(session_id):
     """删除历史记录"""
     try:
-        if session_id not in history_records:
+        if session_id not in session_store:
             return jsonify({'success': False, 'error': '记录不存在'}), 404
         
         # 清理相关文件
         cleanup_session_files(session_id)
         
         # 从历史记录中删除
-        del history_records[session_id]
+        session_store.delete(session_id)
         
         # 从处理任务中删除（如果存在）
         if session_id in processing_tasks:
             del processing_tasks[session_id]
         
-        # 保存历史记录
-        save_history()
+        publish_history_event(session_id)
         
         return jsonify({'success': True, 'message': '记录删除成功'})
     except Exception as e:
@@ -451,6 +933,10 @@ if __name__ == '__main__':
     print(f"服务器将运行在: http://{server_config['host']}:{server_config['port']}")
     print(f"使用模型: {config.get('api', 'model')}")
     
+    # 调试模式下只在实际提供服务的重载子进程中恢复，避免重复分析
+    if not server_config['debug'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+    
     app.run(
         debug=server_config['debug'],
         host=server_config['host'],
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+离线批处理工具
+将大量演示文稿转换为图片后，通过 Batch API 一次性提交所有待分析的幻灯片，
+完成后回填到各会话的 description_NNN.json 和 result.json，并写入历史记录
+"""
+
+import os
+import sys
+import glob
+import uuid
+import random
+import string
+import shutil
+import argparse
+import datetime
+from pathlib import Path
+
+from config_manager import config
+from utils.converter import convert_to_images, get_pdf_path
+from utils.batch import (
+    apply_batch_results, build_batch, collect_batch_results, get_batch_client,
+    load_manifest, save_manifest, submit_batch, wait_for_batch,
+)
+from utils.sessions import SessionStore
+
+# 与网页服务共用的会话数据库（WAL模式下可与运行中的服务同时读写）
+session_store = SessionStore(config.get_app_config()['session_db_path'])
+
+
+def update_history(session_id, **kwargs):
+    """更新单条历史记录"""
+    session_store.update(session_id, **kwargs)
+
+
+def collect_input_files(paths):
+    """展开输入路径，目录中的演示文稿文件全部加入"""
+    allowed_extensions = config.get_app_config()['allowed_extensions']
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for file_path in sorted(glob.glob(os.path.join(path, '*'))):
+                if Path(file_path).suffix.lower().lstrip('.') in allowed_extensions:
+                    files.append(file_path)
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"警告: 文件不存在: {path}")
+    return files
+
+
+def create_session(input_file):
+    """为单个文件创建会话目录并转换为图片"""
+    app_config = config.get_app_config()
+    session_id = str(uuid.uuid4())
+    session_upload_dir = os.path.join(os.path.abspath(app_config['upload_folder']), session_id)
+    session_results_dir = os.path.join(os.path.abspath(app_config['results_folder']), session_id)
+    session_images_dir = os.path.join(session_results_dir, 'images')
+    session_desc_dir = os.path.join(session_results_dir, 'descriptions')
+
+    os.makedirs(session_upload_dir, exist_ok=True)
+    os.makedirs(session_images_dir, exist_ok=True)
+    os.makedirs(session_desc_dir, exist_ok=True)
+
+    # 与网页上传保持一致的文件命名
+    original_filename = os.path.basename(input_file)
+    extension = Path(input_file).suffix.lower().lstrip('.')
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    new_filename = f"{timestamp}_{random_suffix}.{extension}"
+    filepath = os.path.join(session_upload_dir, new_filename)
+    shutil.copyfile(input_file, filepath)
+
+    session_store.add({
+        'session_id': session_id,
+        'original_filename': original_filename,
+        'new_filename': new_filename,
+        'created_at': datetime.datetime.now().isoformat(),
+        'status': 'converting',
+        'total_images': 0,
+        'processed_images': 0,
+    })
+
+    try:
+        timings = {}
+        processing_config = config.get_processing_config()
+        image_paths = sorted(convert_to_images(filepath, session_images_dir, timings=timings,
+                                               workers=processing_config['render_max_workers'],
+                                               batch_size=processing_config['render_batch_size']))
+    except Exception as e:
+        update_history(session_id, status='error', error=str(e))
+        print(f"转换 {original_filename} 失败: {e}")
+        return None
+
+    update_history(session_id, status='batch_pending', total_images=len(image_paths))
+    print(f"已创建会话 {session_id}: {original_filename} ({len(image_paths)} 页)")
+    return {
+        'session_id': session_id,
+        'images': image_paths,
+        'desc_dir': session_desc_dir,
+        'pdf_path': get_pdf_path(filepath, session_images_dir),
+        'render_times': timings.get('page_render_ms'),
+    }
+
+
+def finish_batch(client, manifest, batch_config):
+    """提交尚未提交的分片，等待各分片的批处理完成并回填结果"""
+    submit_batch(client, manifest, batch_config)
+
+    results = {}
+    for shard in manifest['shards']:
+        batch = wait_for_batch(client, shard['batch_id'], batch_config['poll_interval'])
+        shard['status'] = batch.status
+        save_manifest(batch_config['batch_dir'], manifest)
+        if batch.status != 'completed':
+            print(f"批处理 {batch.id} 未成功完成: {batch.status}")
+        results.update(collect_batch_results(client, batch))
+
+    summary = apply_batch_results(manifest, results)
+    for session_id, metrics in summary.items():
+        update_history(session_id, status='completed', completed=True,
+                       processed_images=metrics['slides'], metrics=metrics)
+
+    manifest['status'] = 'applied'
+    save_manifest(batch_config['batch_dir'], manifest)
+    print(f"批处理结果已回填到 {len(summary)} 个会话")
+
+
+def submit_files(paths, batch_config, client):
+    """转换文件并提交批处理，返回清单"""
+    sessions = [session for session in map(create_session, collect_input_files(paths)) if session]
+    if not sessions:
+        print("没有可处理的文件")
+        return None
+
+    manifest = build_batch(sessions, batch_config)
+    # 先保存清单，提交中断后可以用 resume 继续提交剩余分片
+    manifest_path = save_manifest(batch_config['batch_dir'], manifest)
+    submit_batch(client, manifest, batch_config)
+    print(f"批处理清单: {manifest_path}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PPT-Study-Agent 离线批处理工具')
+    subparsers = parser.add_subparsers(dest='command', help='可用命令')
+
+    run_parser = subparsers.add_parser('run', help='提交批处理并等待完成')
+    run_parser.add_argument('paths', nargs='+', help='演示文稿文件或目录')
+
+    submit_parser = subparsers.add_parser('submit', help='只提交批处理，不等待完成')
+    submit_parser.add_argument('paths', nargs='+', help='演示文稿文件或目录')
+
+    resume_parser = subparsers.add_parser('resume', help='继续轮询已提交的批处理并回填结果')
+    resume_parser.add_argument('manifest', help='批处理清单文件路径')
+
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        return
+
+    batch_config = config.get_batch_config()
+    client = get_batch_client(batch_config)
+
+    if args.command == 'run':
+        manifest = submit_files(args.paths, batch_config, client)
+        if manifest:
+            finish_batch(client, manifest, batch_config)
+    elif args.command == 'submit':
+        if not submit_files(args.paths, batch_config, client):
+            sys.exit(1)
+    elif args.command == 'resume':
+        finish_batch(client, load_manifest(args.manifest), batch_config)
+
+
+if __name__ == '__main__':
+    main()
@@ -44,6 +44,7 @@ model = gemini-2.0-flash
 temperature = 0.2
 max_retries = 3
 timeout = 30
+stream = true
 
 [server]
 # Flask 服务器配置
@@ -58,12 +59,115 @@ upload_folder = uploads
 results_folder = results
 allowed_extensions = ppt,pptx,pdf
 max_file_size = 100MB
+reuse_identical_uploads = true
+progress_flush_seconds = 2
+
+[state]
+# 处理任务状态存储
+backend = memory
+sync_interval = 0.5
 
 [processing]
 # 处理配置
 max_context_slides = 5
+context_token_budget = 600
+context_mode = digest
 image_detail = high
 concurrent_processing = false
+max_workers = 4
+pack_size = 1
+render_batch_size = 4
+render_queue_size = 8
+render_max_workers = 8
+
+[scheduler]
+# 会话调度配置（同时转换/分析的会话数和排队上限）
+conversion_workers = 2
+analysis_workers = 2
+max_queue = 20
+estimated_seconds_per_page = 10
+estimated_seconds_per_conversion = 5
+aging_pages_per_minute = 10
+
+[image]
+# 图像预处理配置（上传前缩放、裁边和重新编码）
+max_long_edge = 1600
+format = jpeg
+quality = 85
+trim_border = true
+
+[thumbnail]
+# 网页显示用的缩略图配置（按需生成，缓存在磁盘上）
+widths = 320,960
+format = webp
+quality = 80
+cache_max_size_mb = 1024
+browser_cache_seconds = 31536000
+
+[classifier]
+# 结构性页面（封面/目录/结束页）本地预判配置
+enabled = false
+edge_pages = 1
+edge_max_text_chars = 80
+title_max_text_chars = 20
+keyword_max_text_chars = 120
+max_entropy = 5.0
+max_graphics_ratio = 0.002
+keywords = 目录,contents,outline,agenda,谢谢,致谢,thank you,thanks,q&a,questions,the end
+
+[text_layer]
+# PDF文本层快速路径：文字足够多的页面发送文本和低清晰度图像
+enabled = false
+min_text_chars = 200
+max_text_chars = 4000
+max_long_edge = 768
+
+[dedup]
+# 动画递进页（近似重复页）检测配置
+enabled = false
+max_distance = 4
+mode = reuse
+
+[cache]
+# 分析结果缓存配置
+enabled = true
+max_size_mb = 500
+skip_context = false
+
+[rate_limit]
+# 全局限流配置（所有会话共享，0表示不限制）
+requests_per_minute = 60
+tokens_per_minute = 0
+expected_completion_tokens = 1500
+
+[resilience]
+# 请求重试、熔断和对冲配置（重试次数见 [api] max_retries）
+retry_base_delay = 1.0
+retry_max_delay = 30
+breaker_failure_threshold = 5
+breaker_recovery_timeout = 30
+hedge_enabled = false
+hedge_percentile = 95
+hedge_min_samples = 10
+
+[office]
+# LibreOffice常驻进程池配置（PPT/PPTX转PDF，需要系统包python3-uno，不可用时每次启动soffice命令行转换）
+pool_enabled = true
+pool_size = 2
+base_port = 2002
+job_timeout = 120
+max_jobs_per_worker = 50
+startup_timeout = 30
+
+[batch]
+# 离线批处理配置（batch_process.py）
+# base_url / api_key 留空时使用 [api] 中的配置，可指向本地替身服务进行测试
+base_url =
+api_key =
+poll_interval = 60
+completion_window = 24h
+max_file_requests = 50000
+max_file_mb = 190
 
 [ui]
 # 用户界面配置
@@ -188,6 +292,10 @@ enable_console_log = true
         except ValueError:
             errors.append("端口号配置无效")
         
+        state_backend = self.get('state', 'backend', 'memory').lower()
+        if state_backend not in ('memory', 'sqlite'):
+            errors.append(f"不支持的任务状态存储: {state_backend}（可选 memory、sqlite）")
+        
         # 检查文件夹权限
         upload_folder = self.get('app', 'upload_folder', 'uploads')
         results_folder = self.get('app', 'results_folder', 'results')
@@ -216,6 +324,7 @@ enable_console_log = true
             'temperature': self.get_float('api', 'temperature', 0.2),
             'max_retries': self.get_int('api', 'max_retries', 3),
             'timeout': self.get_int('api', 'timeout', 30),
+            'stream': self.get_bool('api', 'stream', True),
         }
     
     def get_server_config(self) -> dict:
@@ -234,14 +343,160 @@ enable_console_log = true
             'results_folder': self.get('app', 'results_folder', 'results'),
             'allowed_extensions': set(self.get_list('app', 'allowed_extensions', fallback=['ppt', 'pptx', 'pdf'])),
             'max_file_size_bytes': self.get_int('app', 'max_file_size_bytes', 100 * 1024 * 1024),
+            'reuse_identical_uploads': self.get_bool('app', 'reuse_identical_uploads', True),
+            'upload_index_path': self.get('app', 'upload_index_path',
+                                          os.path.join(self.get('app', 'results_folder', 'results'),
+                                                       'upload_index.sqlite3')),
+            'session_db_path': self.get('app', 'session_db_path',
+                                        os.path.join(self.get('app', 'results_folder', 'results'),
+                                                     'sessions.sqlite3')),
+            'progress_flush_seconds': self.get_float('app', 'progress_flush_seconds', 2.0),
         }
     
     def get_processing_config(self) -> dict:
         """获取处理配置"""
         return {
             'max_context_slides': self.get_int('processing', 'max_context_slides', 5),
+            'context_token_budget': self.get_int('processing', 'context_token_budget', 600),
+            'context_mode': self.get('processing', 'context_mode', 'digest'),
             'image_detail': self.get('processing', 'image_detail', 'high'),
             'concurrent_processing': self.get_bool('processing', 'concurrent_processing', False),
+            'max_workers': self.get_int('processing', 'max_workers', 4),
+            'pack_size': self.get_int('processing', 'pack_size', 1),
+            'render_batch_size': self.get_int('processing', 'render_batch_size', 4),
+            'render_queue_size': self.get_int('processing', 'render_queue_size', 8),
+            'render_max_workers': self.get_int('processing', 'render_max_workers', 8),
+        }
+    
+    def get_state_config(self) -> dict:
+        """获取处理任务状态存储配置"""
+        return {
+            'backend': self.get('state', 'backend', 'memory').lower(),
+            'db_path': self.get('state', 'db_path',
+                                os.path.join(self.get('app', 'results_folder', 'results'), 'state.sqlite3')),
+            'sync_interval': self.get_float('state', 'sync_interval', 0.5),
+        }
+    
+    def get_scheduler_config(self) -> dict:
+        """获取会话调度配置"""
+        return {
+            'conversion_workers': self.get_int('scheduler', 'conversion_workers', 2),
+            'analysis_workers': self.get_int('scheduler', 'analysis_workers', 2),
+            'max_queue': self.get_int('scheduler', 'max_queue', 20),
+            'estimated_seconds_per_page': self.get_float('scheduler', 'estimated_seconds_per_page', 10.0),
+            'estimated_seconds_per_conversion': self.get_float('scheduler', 'estimated_seconds_per_conversion', 5.0),
+            'aging_pages_per_minute': self.get_float('scheduler', 'aging_pages_per_minute', 10.0),
+        }
+    
+    def get_image_config(self) -> dict:
+        """获取图像预处理配置"""
+        return {
+            'max_long_edge': self.get_int('image', 'max_long_edge', 1600),
+            'format': self.get('image', 'format', 'jpeg'),
+            'quality': self.get_int('image', 'quality', 85),
+            'trim_border': self.get_bool('image', 'trim_border', True),
+            'image_detail': self.get('processing', 'image_detail', 'high'),
+        }
+    
+    def get_thumbnail_config(self) -> dict:
+        """获取缩略图配置"""
+        results_folder = self.get('app', 'results_folder', 'results')
+        return {
+            'widths': [int(width) for width in self.get_list('thumbnail', 'widths', fallback=['320', '960'])],
+            'format': self.get('thumbnail', 'format', 'webp'),
+            'quality': self.get_int('thumbnail', 'quality', 80),
+            'cache_dir': self.get('thumbnail', 'cache_dir', os.path.join(results_folder, 'thumbnails')),
+            'cache_max_size_bytes': self.get_int('thumbnail', 'cache_max_size_mb', 1024) * 1024 * 1024,
+            'browser_cache_seconds': self.get_int('thumbnail', 'browser_cache_seconds', 31536000),
+        }
+    
+    def get_classifier_config(self) -> dict:
+        """获取结构性页面预判配置"""
+        return {
+            'enabled': self.get_bool('classifier', 'enabled', False),
+            'edge_pages': self.get_int('classifier', 'edge_pages', 1),
+            'edge_max_text_chars': self.get_int('classifier', 'edge_max_text_chars', 80),
+            'title_max_text_chars': self.get_int('classifier', 'title_max_text_chars', 20),
+            'keyword_max_text_chars': self.get_int('classifier', 'keyword_max_text_chars', 120),
+            'max_entropy': self.get_float('classifier', 'max_entropy', 5.0),
+            'max_graphics_ratio': self.get_float('classifier', 'max_graphics_ratio', 0.002),
+            'keywords': self.get_list('classifier', 'keywords', fallback=[
+                '目录', 'contents', 'outline', 'agenda', '谢谢', '致谢',
+                'thank you', 'thanks', 'q&a', 'questions', 'the end',
+            ]),
+        }
+    
+    def get_text_layer_config(self) -> dict:
+        """获取PDF文本层快速路径配置"""
+        return {
+            'enabled': self.get_bool('text_layer', 'enabled', False),
+            'min_text_chars': self.get_int('text_layer', 'min_text_chars', 200),
+            'max_text_chars': self.get_int('text_layer', 'max_text_chars', 4000),
+            'max_long_edge': self.get_int('text_layer', 'max_long_edge', 768),
+        }
+    
+    def get_dedup_config(self) -> dict:
+        """获取近似重复页检测配置"""
+        return {
+            'enabled': self.get_bool('dedup', 'enabled', False),
+            'max_distance': self.get_int('dedup', 'max_distance', 4),
+            'mode': self.get('dedup', 'mode', 'reuse'),
+        }
+    
+    def get_rate_limit_config(self) -> dict:
+        """获取全局限流配置"""
+        return {
+            'requests_per_minute': self.get_int('rate_limit', 'requests_per_minute', 60),
+            'tokens_per_minute': self.get_int('rate_limit', 'tokens_per_minute', 0),
+            'expected_completion_tokens': self.get_int('rate_limit', 'expected_completion_tokens', 1500),
+        }
+    
+    def get_resilience_config(self) -> dict:
+        """获取请求重试、熔断和对冲配置"""
+        return {
+            'retry_base_delay': self.get_float('resilience', 'retry_base_delay', 1.0),
+            'retry_max_delay': self.get_float('resilience', 'retry_max_delay', 30.0),
+            'breaker_failure_threshold': self.get_int('resilience', 'breaker_failure_threshold', 5),
+            'breaker_recovery_timeout': self.get_float('resilience', 'breaker_recovery_timeout', 30.0),
+            'hedge_enabled': self.get_bool('resilience', 'hedge_enabled', False),
+            'hedge_percentile': self.get_float('resilience', 'hedge_percentile', 95.0),
+            'hedge_min_samples': self.get_int('resilience', 'hedge_min_samples', 10),
+        }
+    
+    def get_batch_config(self) -> dict:
+        """获取离线批处理配置"""
+        results_folder = self.get('app', 'results_folder', 'results')
+        return {
+            'base_url': self.get('batch', 'base_url', '') or self.get('api', 'base_url', 'https://api.openai.com/v1'),
+            'api_key': self.get('batch', 'api_key', '') or self.get('api', 'api_key', 'your_api_key_here'),
+            'poll_interval': self.get_int('batch', 'poll_interval', 60),
+            'completion_window': self.get('batch', 'completion_window', '24h'),
+            'max_file_requests': self.get_int('batch', 'max_file_requests', 50000),
+            'max_file_mb': self.get_int('batch', 'max_file_mb', 190),
+            'batch_dir': self.get('batch', 'batch_dir', os.path.join(results_folder, 'batches')),
+        }
+    
+    def get_office_config(self) -> dict:
+        """获取LibreOffice进程池配置"""
+        results_folder = self.get('app', 'results_folder', 'results')
+        return {
+            'pool_enabled': self.get_bool('office', 'pool_enabled', True),
+            'pool_size': self.get_int('office', 'pool_size', 2),
+            'base_port': self.get_int('office', 'base_port', 2002),
+            'job_timeout': self.get_int('office', 'job_timeout', 120),
+            'max_jobs_per_worker': self.get_int('office', 'max_jobs_per_worker', 50),
+            'startup_timeout': self.get_int('office', 'startup_timeout', 30),
+            'profile_dir': self.get('office', 'profile_dir', os.path.join(results_folder, 'office_profiles')),
+        }
+    
+    def get_cache_config(self) -> dict:
+        """获取分析缓存配置"""
+        results_folder = self.get('app', 'results_folder', 'results')
+        return {
+            'enabled': self.get_bool('cache', 'enabled', True),
+            'db_path': self.get('cache', 'db_path', os.path.join(results_folder, 'analysis_cache.sqlite3')),
+            'max_size_bytes': self.get_int('cache', 'max_size_mb', 500) * 1024 * 1024,
+            'skip_context': self.get_bool('cache', 'skip_context', False),
         }
 
 # 全局配置实例
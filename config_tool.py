@@ -20,6 +20,7 @@ def show_config():
     print(f"  温度: {api_config['temperature']}")
     print(f"  重试次数: {api_config['max_retries']}")
     print(f"  超时时间: {api_config['timeout']}秒")
+    print(f"  流式输出: {api_config['stream']}")
     
     print("\n[服务器配置]")
     server_config = config.get_server_config()
@@ -33,12 +34,111 @@ def show_config():
     print(f"  结果文件夹: {app_config['results_folder']}")
     print(f"  允许的文件类型: {', '.join(app_config['allowed_extensions'])}")
     print(f"  最大文件大小: {app_config['max_file_size_bytes'] / (1024*1024):.0f}MB")
+    print(f"  复用相同文件的结果: {'启用' if app_config['reuse_identical_uploads'] else '禁用'}")
+    print(f"  会话数据库: {app_config['session_db_path']}")
+    print(f"  进度写入间隔: {app_config['progress_flush_seconds']}秒")
+    
+    print("\n[任务状态存储配置]")
+    state_config = config.get_state_config()
+    print(f"  存储后端: {state_config['backend']}")
+    if state_config['backend'] == 'sqlite':
+        print(f"  数据库: {state_config['db_path']}")
+        print(f"  同步间隔: {state_config['sync_interval']}秒")
     
     print("\n[处理配置]")
     processing_config = config.get_processing_config()
     print(f"  上下文幻灯片数: {processing_config['max_context_slides']}")
+    print(f"  上下文token预算: {processing_config['context_token_budget']}")
+    print(f"  上下文模式: {processing_config['context_mode']}")
     print(f"  图像详细度: {processing_config['image_detail']}")
     print(f"  并发处理: {processing_config['concurrent_processing']}")
+    print(f"  并发线程数: {processing_config['max_workers']}")
+    print(f"  打包页数: {processing_config['pack_size']}")
+    print(f"  每批渲染页数: {processing_config['render_batch_size']}")
+    print(f"  渲染队列长度: {processing_config['render_queue_size']}")
+    print(f"  最大渲染进程数: {processing_config['render_max_workers']}")
+    
+    print("\n[会话调度配置]")
+    scheduler_config = config.get_scheduler_config()
+    print(f"  同时转换的会话数: {scheduler_config['conversion_workers']}")
+    print(f"  同时分析的会话数: {scheduler_config['analysis_workers']}")
+    print(f"  排队上限: {scheduler_config['max_queue'] or '不限制'}")
+    
+    print("\n[图像预处理配置]")
+    image_config = config.get_image_config()
+    print(f"  最长边: {image_config['max_long_edge'] or '不缩放'}")
+    print(f"  编码格式: {image_config['format']}")
+    print(f"  编码质量: {image_config['quality']}")
+    print(f"  裁剪空白边框: {image_config['trim_border']}")
+    
+    print("\n[缩略图配置]")
+    thumbnail_config = config.get_thumbnail_config()
+    print(f"  宽度档位: {', '.join(str(width) for width in thumbnail_config['widths'])}")
+    print(f"  编码格式: {thumbnail_config['format']}")
+    print(f"  缓存目录: {thumbnail_config['cache_dir']}")
+    print(f"  缓存上限: {thumbnail_config['cache_max_size_bytes'] / (1024*1024):.0f}MB")
+    
+    print("\n[结构性页面预判配置]")
+    classifier_config = config.get_classifier_config()
+    print(f"  启用预判: {classifier_config['enabled']}")
+    print(f"  首尾页数: {classifier_config['edge_pages']}")
+    print(f"  首尾页字数上限: {classifier_config['edge_max_text_chars']}")
+    print(f"  标题页字数上限: {classifier_config['title_max_text_chars']}")
+    print(f"  关键词页字数上限: {classifier_config['keyword_max_text_chars']}")
+    print(f"  图像熵上限: {classifier_config['max_entropy']}")
+    print(f"  图形比例上限: {classifier_config['max_graphics_ratio']}")
+    print(f"  关键词: {', '.join(classifier_config['keywords'])}")
+    
+    print("\n[文本层快速路径配置]")
+    text_layer_config = config.get_text_layer_config()
+    print(f"  启用快速路径: {text_layer_config['enabled']}")
+    print(f"  最少文字数: {text_layer_config['min_text_chars']}")
+    print(f"  最大文字数: {text_layer_config['max_text_chars']}")
+    print(f"  图片长边: {text_layer_config['max_long_edge']} 像素")
+    
+    print("\n[近似重复页检测配置]")
+    dedup_config = config.get_dedup_config()
+    print(f"  启用检测: {dedup_config['enabled']}")
+    print(f"  最大汉明距离: {dedup_config['max_distance']}")
+    print(f"  处理方式: {dedup_config['mode']}")
+    
+    print("\n[缓存配置]")
+    cache_config = config.get_cache_config()
+    print(f"  启用缓存: {cache_config['enabled']}")
+    print(f"  缓存文件: {cache_config['db_path']}")
+    print(f"  容量上限: {cache_config['max_size_bytes'] / (1024*1024):.0f}MB")
+    print(f"  忽略上下文: {cache_config['skip_context']}")
+    
+    print("\n[限流配置]")
+    rate_limit_config = config.get_rate_limit_config()
+    print(f"  每分钟请求数: {rate_limit_config['requests_per_minute'] or '不限制'}")
+    print(f"  每分钟token数: {rate_limit_config['tokens_per_minute'] or '不限制'}")
+    print(f"  预估输出token数: {rate_limit_config['expected_completion_tokens']}")
+    
+    print("\n[重试与熔断配置]")
+    resilience_config = config.get_resilience_config()
+    print(f"  退避基础时间: {resilience_config['retry_base_delay']} 秒")
+    print(f"  退避最长时间: {resilience_config['retry_max_delay']} 秒")
+    print(f"  熔断阈值: {resilience_config['breaker_failure_threshold'] or '不熔断'}")
+    print(f"  熔断恢复时间: {resilience_config['breaker_recovery_timeout']} 秒")
+    print(f"  对冲请求: {'启用' if resilience_config['hedge_enabled'] else '禁用'} (P{resilience_config['hedge_percentile']:g})")
+    
+    print("\n[LibreOffice进程池配置]")
+    office_config = config.get_office_config()
+    print(f"  进程池: {'启用' if office_config['pool_enabled'] else '禁用'}")
+    print(f"  进程数: {office_config['pool_size']}")
+    print(f"  起始端口: {office_config['base_port']}")
+    print(f"  转换超时: {office_config['job_timeout']} 秒")
+    print(f"  重启前任务数: {office_config['max_jobs_per_worker'] or '不重启'}")
+    print(f"  配置目录: {office_config['profile_dir']}")
+    
+    print("\n[批处理配置]")
+    batch_config = config.get_batch_config()
+    print(f"  批处理接口: {batch_config['base_url']}")
+    print(f"  轮询间隔: {batch_config['poll_interval']}秒")
+    print(f"  完成时限: {batch_config['completion_window']}")
+    print(f"  分片上限: {batch_config['max_file_requests']}条请求 / {batch_config['max_file_mb']}MB")
+    print(f"  清单目录: {batch_config['batch_dir']}")
 
 def validate_config():
     """验证配置"""
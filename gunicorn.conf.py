@@ -0,0 +1,18 @@
+"""
+gunicorn 配置，在项目目录中运行 gunicorn 时自动加载（也可用 -c gunicorn.conf.py 指定）
+用法: gunicorn -w 4 -k gthread --threads 8 app:app
+
+不要使用 --preload：任务状态数据库连接、调度线程和LibreOffice进程池都需要在各个worker中创建。
+"""
+
+import uuid
+
+# 本次服务启动的标识，在master进程中生成，所有worker（包括之后被重启的worker）继承同一个值
+_run_id = uuid.uuid4().hex
+
+
+def post_worker_init(worker):
+    """worker加载应用后按worker数划分API限流配额，恢复未完成的会话（同一次启动只由一个worker执行）
+    并预热LibreOffice进程池"""
+    from app import start_background_services
+    start_background_services(_run_id, worker.cfg.workers)
@@ -3,26 +3,19 @@
 导入现有会话到历史记录
 """
 
-import os
 import json
 import datetime
 from pathlib import Path
 
+from config_manager import config
+from utils.sessions import SessionStore
+
 def import_existing_sessions():
     """导入现有的会话到历史记录"""
     results_dir = Path('results')
     uploads_dir = Path('uploads')
-    history_file = 'history.json'
-    
-    # 加载现有历史记录
-    try:
-        if os.path.exists(history_file):
-            with open(history_file, 'r', encoding='utf-8') as f:
-                history_records = json.load(f)
-        else:
-            history_records = {}
-    except:
-        history_records = {}
+    session_store = SessionStore(config.get_app_config()['session_db_path'])
+    history_records = {}
     
     # 遍历results目录中的会话
     for session_dir in results_dir.iterdir():
@@ -30,7 +23,7 @@ def import_existing_sessions():
             session_id = session_dir.name
             
             # 如果已经在历史记录中，跳过
-            if session_id in history_records:
+            if session_id in session_store:
                 continue
             
             # 检查result.json是否存在
@@ -78,11 +71,10 @@ def import_existing_sessions():
             except Exception as e:
                 print(f"导入会话 {session_id} 时出错: {e}")
     
-    # 保存历史记录
+    # 在一个事务中写入所有导入的记录
     try:
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history_records, f, ensure_ascii=False, indent=2)
-        print(f"成功导入 {len(history_records)} 条历史记录")
+        session_store.add_many(list(history_records.values()))
+        print(f"成功导入 {len(history_records)} 条历史记录，共 {len(session_store)} 条")
     except Exception as e:
         print(f"保存历史记录失败: {e}")
 
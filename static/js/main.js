@@ -1,5 +1,8 @@
 // 全局变量
 let uploadingSessions = new Set();
+let historyRecords = [];
+let maxHistoryRecords = 0;
+let historyPollInterval = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     // 获取元素
@@ -9,11 +12,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const successMessage = document.getElementById('success-message');
     const errorMessage = document.getElementById('error-message');
     
-    // 加载历史记录
+    // 加载历史记录，之后通过实时推送更新进度
     loadHistory();
-    
-    // 每5秒刷新一次历史记录以更新进度
-    setInterval(loadHistory, 5000);
+    subscribeHistory();
     
     // 显示选择的文件名
     fileInput.addEventListener('change', function() {
@@ -62,7 +63,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 form.reset();
                 fileName.textContent = '未选择文件';
                 
-                showSuccess('文件上传成功，正在后台处理...');
+                showSuccess(data.message || '文件上传成功，正在后台处理...');
             } else {
                 throw new Error(data.error || '上传失败');
             }
@@ -83,14 +84,65 @@ function loadHistory() {
     fetch('/api/history')
         .then(response => response.json())
         .then(data => {
-            displayHistory(data.records);
-            updateHistoryCount(data.records.length, data.max_records);
+            historyRecords = data.records;
+            maxHistoryRecords = data.max_records;
+            renderHistory();
         })
         .catch(error => {
             console.error('加载历史记录失败:', error);
         });
 }
 
+function renderHistory() {
+    displayHistory(historyRecords);
+    updateHistoryCount(historyRecords.length, maxHistoryRecords);
+}
+
+// 订阅历史记录变化，推送不可用时每5秒轮询一次
+function subscribeHistory() {
+    if (!window.EventSource) {
+        startHistoryPolling();
+        return;
+    }
+    
+    const source = new EventSource('/api/history/events');
+    source.onopen = function() {
+        // （重新）连接后先同步一次，补齐断开期间的变化
+        stopHistoryPolling();
+        loadHistory();
+    };
+    source.onmessage = function(e) {
+        const event = JSON.parse(e.data);
+        if (event.type === 'record') {
+            const index = historyRecords.findIndex(record => record.session_id === event.record.session_id);
+            if (index >= 0) {
+                historyRecords[index] = event.record;
+            } else {
+                historyRecords.unshift(event.record);
+            }
+            renderHistory();
+        } else if (event.type === 'delete') {
+            historyRecords = historyRecords.filter(record => record.session_id !== event.session_id);
+            renderHistory();
+        }
+    };
+    source.onerror = function() {
+        console.warn('历史记录推送连接中断，暂时改为轮询');
+        startHistoryPolling();
+    };
+}
+
+function startHistoryPolling() {
+    if (!historyPollInterval) {
+        historyPollInterval = setInterval(loadHistory, 5000);
+    }
+}
+
+function stopHistoryPolling() {
+    clearInterval(historyPollInterval);
+    historyPollInterval = null;
+}
+
 // 显示历史记录
 function displayHistory(records) {
     const historyList = document.getElementById('history-list');
@@ -110,7 +162,8 @@ function displayHistory(records) {
                            isError ? 'error' : 'processing';
         
         const statusText = isCompleted ? '已完成' :
-                          isError ? '处理失败' : '处理中';
+                          isError ? '处理失败' :
+                          record.status === 'queued' ? '排队中' : '处理中';
         
         const statusBadgeClass = isCompleted ? 'status-completed' :
                                 isError ? 'status-error' : 'status-processing';
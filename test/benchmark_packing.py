@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+打包分析基准测试 - 比较不同打包页数下每页的token用量和耗时
+用法: python3 test/benchmark_packing.py <PDF或图片目录> [--sizes 1,2,4]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import config
+
+
+def set_option(section, key, value):
+    """临时覆盖配置项（不写回配置文件）"""
+    if not config.config.has_section(section):
+        config.config.add_section(section)
+    config.config.set(section, key, str(value))
+
+
+def collect_images(source, work_dir):
+    """获取待分析的图片，PDF/PPT先转换为图片"""
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, '*.png')) + glob.glob(os.path.join(source, '*.jpg')))
+
+    from utils.converter import convert_to_images
+    processing_config = config.get_processing_config()
+    return convert_to_images(source, os.path.join(work_dir, 'images'), workers=processing_config['render_max_workers'],
+                             batch_size=processing_config['render_batch_size'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较不同打包页数下每页的token用量和耗时')
+    parser.add_argument('source', help='PDF/PPT文件或图片目录')
+    parser.add_argument('--sizes', default='1,2,4', help='要比较的打包页数，逗号分隔（默认 1,2,4）')
+    parser.add_argument('--keep-skips', action='store_true', help='保留结构性页面预判和近似页检测（默认关闭以只比较打包效果）')
+    args = parser.parse_args()
+
+    # 关闭缓存，避免后一轮直接命中前一轮的结果
+    set_option('cache', 'enabled', 'false')
+    if not args.keep_skips:
+        set_option('classifier', 'enabled', 'false')
+        set_option('dedup', 'enabled', 'false')
+
+    from utils.analyzer import analyze_images_realtime
+    from utils.metrics import summarize_slides
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    rows = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_paths = collect_images(args.source, work_dir)
+        if not image_paths:
+            print("没有找到可分析的图片")
+            sys.exit(1)
+
+        for size in sizes:
+            set_option('processing', 'pack_size', size)
+            slide_stats = []
+            started = time.perf_counter()
+            analyze_images_realtime(image_paths, os.path.join(work_dir, f"descriptions_k{size}"),
+                                    callback=lambda index, description, stats: slide_stats.append(stats))
+            elapsed = time.perf_counter() - started
+
+            summary = summarize_slides(slide_stats)
+            slides = max(1, summary['slides'])
+            rows.append({
+                'size': size,
+                'slides': summary['slides'],
+                'api_calls': summary['api_calls'],
+                'prompt': summary['prompt_tokens'] / slides,
+                'completion': summary['completion_tokens'] / slides,
+                'seconds': elapsed / slides,
+                'fallbacks': sum(1 for stats in slide_stats if stats.get('pack_fallback')),
+                'failed': summary['failed'],
+            })
+
+    print()
+    print(f"{'K':>3} {'页数':>5} {'请求数':>6} {'输入tok/页':>11} {'输出tok/页':>11} {'秒/页':>7} {'退回逐张':>8} {'失败':>4}")
+    for row in rows:
+        print(f"{row['size']:>3} {row['slides']:>5} {row['api_calls']:>6} {row['prompt']:>11.0f} "
+              f"{row['completion']:>11.0f} {row['seconds']:>7.2f} {row['fallbacks']:>8} {row['failed']:>4}")
+
+
+if __name__ == '__main__':
+    main()
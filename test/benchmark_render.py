@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+渲染基准测试 - 比较不同渲染进程数下每秒渲染的页数
+用法: python3 test/benchmark_render.py <PDF或PPT文件> [--workers 1,2,4,8] [--batch-size 4] [--dpi 150]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.converter import convert_pdf_to_images, get_render_workers, prepare_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较不同渲染进程数下每秒渲染的页数')
+    parser.add_argument('source', help='PDF/PPT文件')
+    parser.add_argument('--workers', default=None,
+                        help='要比较的进程数，逗号分隔（默认 1,2,4,... 直到CPU核数）')
+    parser.add_argument('--batch-size', type=int, default=4, help='每个进程每次渲染的页数（默认 4）')
+    parser.add_argument('--dpi', type=int, default=150, help='渲染分辨率（默认 150）')
+    args = parser.parse_args()
+
+    if args.workers:
+        worker_counts = [int(count) for count in args.workers.split(',') if count.strip()]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= get_render_workers(os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_path = prepare_pdf(args.source, work_dir)
+
+        for workers in worker_counts:
+            output_dir = os.path.join(work_dir, f"images_w{workers}")
+            timings = {}
+            started = time.perf_counter()
+            image_paths = convert_pdf_to_images(pdf_path, output_dir, args.dpi, timings=timings, workers=workers,
+                                                batch_size=args.batch_size)
+            elapsed = time.perf_counter() - started
+
+            render_seconds = max(timings.get('render_ms', 0), 1) / 1000
+            rows.append({
+                'workers': timings.get('workers', workers),
+                'pages': len(image_paths),
+                'render': render_seconds,
+                'total': elapsed,
+                'pages_per_second': len(image_paths) / render_seconds,
+            })
+
+    baseline = rows[0]['pages_per_second'] if rows else 1
+    print()
+    print(f"{'进程数':>6} {'页数':>5} {'渲染秒':>8} {'总秒数':>8} {'页/秒':>8} {'加速比':>6}")
+    for row in rows:
+        print(f"{row['workers']:>6} {row['pages']:>5} {row['render']:>8.2f} {row['total']:>8.2f} "
+              f"{row['pages_per_second']:>8.1f} {row['pages_per_second'] / baseline:>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入分析模块时需要API密钥，测试中不会真正调用API
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from config_manager import config
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """分析模块，测试期间不读写分析缓存
+
+    首次导入前关闭缓存配置，不会在工作目录中创建缓存数据库；测试结束后恢复配置。
+    模块已被导入时同样把其中的缓存替换为None，结果与测试的执行顺序无关。
+    """
+    monkeypatch.setitem(config.config['cache'], 'enabled', 'false')
+    from utils import analyzer, batch
+    monkeypatch.setattr(analyzer, 'analysis_cache', None)
+    monkeypatch.setattr(batch, 'analysis_cache', None)
+    return analyzer
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """Flask应用模块，上传、结果和数据库都放在临时目录中
+
+    应用模块只导入一次，导入时在临时目录中运行，不会读取工作目录中的 history.json；
+    测试会话结束后恢复配置。
+    """
+    root = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setitem(config.config['cache'], 'enabled', 'false')
+        monkeypatch.setitem(config.config['app'], 'upload_folder', str(root / 'uploads'))
+        monkeypatch.setitem(config.config['app'], 'results_folder', str(root / 'results'))
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            import app
+        finally:
+            os.chdir(cwd)
+        yield app
@@ -0,0 +1,168 @@
+"""
+应用接口测试：排队已满时拒绝上传，相同文件复用已完成会话的结果，部分结果的增量获取和条件请求
+运行: python3 -m pytest test/test_app.py
+"""
+
+import io
+import os
+import gzip
+import json
+import uuid
+import hashlib
+
+
+def upload(app_module, data, **form):
+    return app_module.app.test_client().post(
+        '/upload', data=dict(form, file=(io.BytesIO(data), 'deck.pdf')), content_type='multipart/form-data')
+
+
+def make_completed_session(app_module, data):
+    """生成一个已完整分析的会话并登记上传文件的摘要"""
+    source_id = str(uuid.uuid4())
+    results_dir = os.path.join(app_module.app.config['RESULTS_FOLDER'], source_id)
+    os.makedirs(os.path.join(results_dir, 'images'))
+    with open(os.path.join(results_dir, 'images', 'p1.png'), 'wb') as f:
+        f.write(b'png')
+    with open(os.path.join(results_dir, 'result.json'), 'w', encoding='utf-8') as f:
+        json.dump({'images': ['p1.png'], 'descriptions': ['第一页'], 'slide_stats': [{}]}, f)
+
+    app_module.add_history_record(source_id, 'deck.pdf', 'source.pdf', status='completed')
+    digest = hashlib.sha256(data).hexdigest()
+    app_module.upload_index.put(digest, source_id)
+    return source_id, digest
+
+
+def test_upload_rejected_before_saving_when_queue_is_full(app_module, monkeypatch):
+    upload_folder = app_module.app.config['UPLOAD_FOLDER']
+    before = set(os.listdir(upload_folder))
+
+    def fail_save(stream, path):
+        raise AssertionError('队列已满时不应写入上传的文件')
+
+    monkeypatch.setattr(app_module.scheduler, 'is_full', lambda: True)
+    monkeypatch.setattr(app_module, 'save_and_hash', fail_save)
+
+    response = upload(app_module, b'%PDF-1.4')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(response.get_json()['retry_after'])
+    assert set(os.listdir(upload_folder)) == before
+
+
+def test_identical_upload_reuses_completed_session(app_module):
+    data = os.urandom(64)
+    source_id, _ = make_completed_session(app_module, data)
+
+    response = upload(app_module, data)
+    body = response.get_json()
+
+    assert body['reused_from'] == source_id
+    task = app_module.processing_tasks[body['session_id']]
+    assert task['completed'] and task['descriptions'] == ['第一页']
+    results_folder = app_module.app.config['RESULTS_FOLDER']
+    assert os.path.samefile(os.path.join(results_folder, source_id, 'images', 'p1.png'),
+                            os.path.join(results_folder, body['session_id'], 'images', 'p1.png'))
+
+
+def test_upload_with_missing_source_is_analyzed_again(app_module, monkeypatch):
+    data = os.urandom(64)
+    source_id, digest = make_completed_session(app_module, data)
+    app_module.session_store.delete(source_id)
+    submitted = []
+    monkeypatch.setattr(app_module.scheduler, 'submit', lambda session_id, analyze, convert=None: submitted.append(session_id))
+
+    body = upload(app_module, data).get_json()
+
+    assert 'reused_from' not in body
+    assert submitted == [body['session_id']]
+    assert app_module.upload_index.get(digest) is None
+
+
+def test_forced_upload_skips_reuse(app_module, monkeypatch):
+    data = os.urandom(64)
+    make_completed_session(app_module, data)
+    submitted = []
+    monkeypatch.setattr(app_module.scheduler, 'submit', lambda session_id, analyze, convert=None: submitted.append(session_id))
+
+    body = upload(app_module, data, force='1').get_json()
+
+    assert 'reused_from' not in body
+    assert submitted == [body['session_id']]
+
+
+def make_task(app_module, processed, total=3, completed=False):
+    session_id = str(uuid.uuid4())
+    task = app_module.create_task('deck.pdf', 'deck.pdf', status='completed' if completed else 'analyzing')
+    task.update({
+        'total_images': total,
+        'processed_images': processed,
+        'images': [f"p{i+1}.png" for i in range(total)],
+        'descriptions': [f"第{i+1}页" for i in range(processed)],
+        'slide_stats': [{} for _ in range(processed)],
+        'completed': completed,
+    })
+    app_module.processing_tasks[session_id] = task
+    return session_id, task
+
+
+def test_partial_results_returns_slides_after_since(app_module):
+    session_id, task = make_task(app_module, processed=2)
+    client = app_module.app.test_client()
+
+    body = client.get(f"/partial-results/{session_id}").get_json()
+    assert [slide['number'] for slide in body['slides']] == [1, 2]
+    assert body['next_since'] == 2
+    assert body['pending_images'] == [f"/results/{session_id}/images/p3.png"]
+
+    task['descriptions'].append('第3页')
+    task['slide_stats'].append({})
+    task['processed_images'] = 3
+    body = client.get(f"/partial-results/{session_id}?since=2").get_json()
+    assert [slide['number'] for slide in body['slides']] == [3]
+    assert body['next_since'] == 3
+    assert body['pending_images'] == []
+
+
+def test_partial_results_not_modified_until_progress(app_module):
+    session_id, task = make_task(app_module, processed=1)
+    client = app_module.app.test_client()
+
+    response = client.get(f"/partial-results/{session_id}?since=1")
+    etag = response.headers['ETag']
+    assert response.get_json()['slides'] == []
+
+    cached = client.get(f"/partial-results/{session_id}?since=1", headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    # since不同的请求内容不同，不能复用ETag
+    assert client.get(f"/partial-results/{session_id}?since=0", headers={'If-None-Match': etag}).status_code == 200
+
+    task['descriptions'].append('第2页')
+    task['slide_stats'].append({})
+    task['processed_images'] = 2
+    response = client.get(f"/partial-results/{session_id}?since=1", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [slide['number'] for slide in response.get_json()['slides']] == [2]
+
+
+def test_completed_partial_results_are_cacheable_and_gzipped(app_module):
+    session_id, _ = make_task(app_module, processed=3, completed=True)
+    client = app_module.app.test_client()
+
+    plain = client.get(f"/partial-results/{session_id}")
+    compressed = client.get(f"/partial-results/{session_id}", headers={'Accept-Encoding': 'gzip'})
+
+    assert plain.headers['Cache-Control'] == 'private, max-age=3600'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+
+    cached = client.get(f"/partial-results/{session_id}",
+                        headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_partial_results_unknown_session(app_module):
+    assert app_module.app.test_client().get('/partial-results/missing').status_code == 404
@@ -0,0 +1,86 @@
+"""
+批处理分片测试：请求按单文件请求数和大小上限拆分，每个分片提交为一个批处理任务
+运行: python3 -m pytest test/test_batch.py
+"""
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def batch(analyzer):
+    """批处理模块依赖分析模块，在关闭分析缓存后导入"""
+    from utils import batch
+    return batch
+
+
+def make_request(i, size=100):
+    return {'custom_id': f"s-{i:03d}", 'body': {'data': 'x' * size}}
+
+
+def test_shards_split_by_request_count(tmp_path, batch):
+    writer = batch.ShardWriter(str(tmp_path), 'batch', max_requests=3, max_bytes=10 ** 9)
+    assert [writer.write(make_request(i)) for i in range(7)] == [0, 0, 0, 1, 1, 1, 2]
+    writer.close()
+
+    assert [shard['request_count'] for shard in writer.shards] == [3, 3, 1]
+    for shard in writer.shards:
+        with open(shard['input_path'], 'r', encoding='utf-8') as f:
+            assert len(f.read().splitlines()) == shard['request_count']
+
+
+def test_shards_split_by_size(tmp_path, batch):
+    line_bytes = len(json.dumps(make_request(0)) + '\n')
+    writer = batch.ShardWriter(str(tmp_path), 'batch', max_requests=50000, max_bytes=line_bytes * 2 + 10)
+    for i in range(5):
+        writer.write(make_request(i))
+    writer.close()
+
+    assert [shard['request_count'] for shard in writer.shards] == [2, 2, 1]
+    assert all(os.path.getsize(shard['input_path']) <= line_bytes * 2 + 10 for shard in writer.shards)
+
+
+class FakeClient:
+    def __init__(self):
+        self.created = []
+        self.files = SimpleNamespace(create=self.create_file)
+        self.batches = SimpleNamespace(create=self.create_batch)
+
+    def create_file(self, file, purpose):
+        return SimpleNamespace(id=f"file-{os.path.basename(file.name)}")
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        self.created.append(input_file_id)
+        return SimpleNamespace(id=f"batch-{len(self.created)}", status='validating')
+
+
+def test_submit_batch_submits_each_pending_shard(tmp_path, batch):
+    writer = batch.ShardWriter(str(tmp_path), 'batch', max_requests=2, max_bytes=10 ** 9)
+    for i in range(5):
+        writer.write(make_request(i))
+    writer.close()
+    writer.shards[0].update(batch_id='batch-old', status='in_progress')
+    manifest = {'name': 'batch', 'status': 'pending', 'request_count': 5, 'shards': writer.shards, 'sessions': {}}
+
+    client = FakeClient()
+    batch.submit_batch(client, manifest, {'batch_dir': str(tmp_path), 'completion_window': '24h'})
+
+    assert client.created == ['file-batch_002.jsonl', 'file-batch_003.jsonl']
+    saved = batch.load_manifest(str(tmp_path / 'batch.json'))
+    assert [shard['batch_id'] for shard in saved['shards']] == ['batch-old', 'batch-1', 'batch-2']
+
+
+def test_legacy_manifest_becomes_single_shard(tmp_path, batch):
+    batch.save_manifest(str(tmp_path), {'name': 'old', 'status': 'in_progress', 'request_count': 4,
+                                        'input_path': 'old.jsonl', 'batch_id': 'batch-1', 'sessions': {}})
+
+    manifest = batch.load_manifest(str(tmp_path / 'old.json'))
+    assert manifest['shards'] == [{'input_path': 'old.jsonl', 'batch_id': 'batch-1',
+                                   'request_count': 4, 'status': 'in_progress'}]
+    assert 'batch_id' not in manifest
@@ -0,0 +1,62 @@
+"""
+分析缓存测试：超出容量时淘汰最久未访问的条目，统计命中和未命中次数
+运行: python3 -m pytest test/test_cache.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import cache as cache_module
+from utils.cache import AnalysisCache, make_cache_key
+
+
+def test_evicts_least_recently_used_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(cache_module.time, 'time', tick)
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite3'), max_size_bytes=30)
+    cache.put('a', 'x' * 10)
+    cache.put('b', 'y' * 10)
+    cache.put('c', 'z' * 10)
+
+    # 访问a后b成为最久未使用的条目
+    assert cache.get('a') == 'x' * 10
+    cache.put('d', 'w' * 10)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) is not None for key in 'acd'] == [True, True, True]
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['size_bytes'] == 30
+
+
+def test_entry_larger_than_capacity_is_not_kept(tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite3'), max_size_bytes=10)
+    cache.put('a', 'x' * 5)
+    cache.put('b', '字' * 10)
+
+    assert cache.stats()['entries'] == 0
+
+
+def test_stats_count_hits_and_misses(tmp_path):
+    cache = AnalysisCache(str(tmp_path / 'cache.sqlite3'), max_size_bytes=10 ** 6)
+    cache.put('a', 'description')
+    cache.get('a')
+    cache.get('a')
+    cache.get('missing')
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    assert stats['hit_rate'] == 0.6667
+
+
+def test_cache_key_depends_on_context_and_variant():
+    key = make_cache_key('hash', 'v1', 'model', 0.3)
+    assert key == make_cache_key('hash', 'v1', 'model', 0.3, context='')
+    assert key != make_cache_key('hash', 'v1', 'model', 0.3, context='上一页摘要')
+    assert key != make_cache_key('hash', 'v1', 'model', 0.3, variant='text')
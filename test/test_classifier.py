@@ -0,0 +1,103 @@
+"""
+结构性页面预判测试：低熵的线条示意图和以关键词开头的正文页不能被跳过
+运行: python3 -m pytest test/test_classifier.py
+"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import config
+from utils.classifier import classify_structural_page, image_content
+
+OPTIONS = dict(config.get_classifier_config(), enabled=True)
+SIZE = (1920, 1080)
+
+
+def new_slide(title, title_size=72):
+    image = Image.new('RGB', SIZE, 'white')
+    draw = ImageDraw.Draw(image)
+    draw.text((160, 100), title, fill='black', font=ImageFont.load_default(size=title_size))
+    return image, draw
+
+
+def save(image, tmp_path, name):
+    path = str(tmp_path / f"{name}.png")
+    image.save(path)
+    return path
+
+
+def draw_rc_circuit(draw):
+    """白底黑线的RC电路：电源、电阻（折线）、电容，整体熵很低"""
+    left, top, right, bottom = 500, 350, 1400, 850
+    draw.line([(left, top), (800, top)], fill='black', width=4)
+    zigzag = [(800 + i * 25, top + (-30 if i % 2 else 30)) for i in range(1, 12)]
+    draw.line([(800, top)] + zigzag + [(1100, top)], fill='black', width=4)
+    draw.line([(1100, top), (right, top), (right, 560)], fill='black', width=4)
+    draw.line([(right - 80, 560), (right + 80, 560)], fill='black', width=6)
+    draw.line([(right - 80, 600), (right + 80, 600)], fill='black', width=6)
+    draw.line([(right, 600), (right, bottom), (left, bottom), (left, 640)], fill='black', width=4)
+    draw.line([(left - 60, 640), (left + 60, 640)], fill='black', width=6)
+    draw.line([(left - 30, 560), (left + 30, 560)], fill='black', width=6)
+    draw.line([(left, 560), (left, top)], fill='black', width=4)
+
+
+def test_rc_circuit_diagram_is_not_title_only(tmp_path):
+    image, draw = new_slide('RC Circuit')
+    draw_rc_circuit(draw)
+    path = save(image, tmp_path, 'rc')
+
+    entropy, graphics = image_content(path)
+    assert entropy < OPTIONS['max_entropy']
+    assert graphics > OPTIONS['max_graphics_ratio']
+    assert classify_structural_page(path, 5, 20, 'RC Circuit', OPTIONS) is None
+
+
+def test_line_chart_on_edge_page_is_analyzed(tmp_path):
+    image, draw = new_slide('Results')
+    draw.line([(300, 900), (1700, 900)], fill='black', width=3)
+    draw.line([(300, 900), (300, 250)], fill='black', width=3)
+    draw.line([(300, 850), (700, 600), (1100, 650), (1600, 300)], fill='gray', width=3)
+    path = save(image, tmp_path, 'chart')
+
+    assert classify_structural_page(path, 20, 20, 'Results', OPTIONS) is None
+
+
+def test_plain_title_slide_is_structural(tmp_path):
+    image, _ = new_slide('Chapter 3', title_size=96)
+    path = save(image, tmp_path, 'title')
+
+    result = classify_structural_page(path, 5, 20, 'Chapter 3', OPTIONS)
+    assert result is not None and result['reason'] == 'title_only'
+
+
+@pytest.mark.parametrize('first_line', ['Outline of the proof', 'Questions about convergence'])
+def test_keyword_prefix_does_not_match(tmp_path, first_line):
+    image, draw = new_slide(first_line, title_size=56)
+    draw.text((160, 260), 'Assume f is continuous on [a, b].', fill='black', font=ImageFont.load_default(size=40))
+    path = save(image, tmp_path, 'outline')
+
+    page_text = f"{first_line}\nAssume f is continuous on [a, b].\nThen f attains its maximum."
+    assert classify_structural_page(path, 5, 20, page_text, OPTIONS) is None
+
+
+def test_contents_page_matches_whole_first_line(tmp_path):
+    image, draw = new_slide('Contents:')
+    for i, item in enumerate(['1. Basics', '2. Circuits', '3. Filters']):
+        draw.text((200, 300 + i * 90), item, fill='black', font=ImageFont.load_default(size=48))
+    path = save(image, tmp_path, 'contents')
+
+    result = classify_structural_page(path, 2, 20, 'Contents:\n1. Basics\n2. Circuits\n3. Filters', OPTIONS)
+    assert result is not None and result['reason'] == 'keyword'
+
+
+def test_keyword_page_with_diagram_is_analyzed(tmp_path):
+    image, draw = new_slide('Agenda')
+    draw_rc_circuit(draw)
+    path = save(image, tmp_path, 'agenda_diagram')
+
+    assert classify_structural_page(path, 2, 20, 'Agenda', OPTIONS) is None
@@ -0,0 +1,64 @@
+"""
+滚动上下文测试：从最近的幻灯片开始拼接摘要，总token数不超过预算
+运行: python3 -m pytest test/test_context.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.classifier import STRUCTURAL_RESPONSE
+from utils.context import ContextManager, count_tokens, extract_digest
+
+
+def entry(index, text):
+    return f"幻灯片 {index+1}: {text}"
+
+
+def test_build_keeps_most_recent_slides_within_budget():
+    texts = ['电容的定义和单位', '电容器的充电过程', '时间常数的物理意义', 'RC电路的放电曲线']
+    budget = count_tokens(entry(2, texts[2])) + count_tokens(entry(3, texts[3]))
+    manager = ContextManager(budget, max_slides=10, mode='full')
+    for i, text in enumerate(texts):
+        manager.add(i, text)
+
+    assert manager.build(4) == "\n\n".join([entry(2, texts[2]), entry(3, texts[3])])
+    # 只使用index之前的幻灯片
+    assert manager.build(1) == entry(0, texts[0])
+
+
+def test_build_limits_slide_count():
+    manager = ContextManager(10 ** 6, max_slides=2, mode='full')
+    for i in range(5):
+        manager.add(i, f"第{i+1}页内容")
+
+    assert manager.build(5) == "\n\n".join([entry(3, '第4页内容'), entry(4, '第5页内容')])
+
+
+def test_most_recent_slide_over_budget_is_truncated():
+    manager = ContextManager(20, max_slides=3, mode='full')
+    manager.add(0, '短摘要')
+    manager.add(1, '非常长的幻灯片描述' * 50)
+
+    context = manager.build(2)
+    assert context.startswith(entry(1, '非常长'))
+    assert context.endswith('...')
+    assert count_tokens(context[:-3]) <= 20
+    assert '短摘要' not in context
+
+
+def test_digest_mode_and_structural_pages():
+    description = "【页面内容】\n电路图\n\n【核心知识点提炼】\n**τ = RC 决定充放电快慢**\n\n---\n其他"
+    assert extract_digest(description) == 'τ = RC 决定充放电快慢'
+
+    manager = ContextManager(10 ** 6, max_slides=5)
+    manager.add(0, STRUCTURAL_RESPONSE)
+    manager.add(1, description)
+    assert manager.build(2) == entry(1, 'τ = RC 决定充放电快慢')
+
+
+def test_disabled_context_is_empty():
+    manager = ContextManager(0, max_slides=5)
+    manager.add(0, '内容')
+    assert manager.build(1) == ''
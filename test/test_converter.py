@@ -0,0 +1,29 @@
+"""
+分批渲染测试：render_batch_size 决定每次调用 pdftocairo 渲染的页码范围
+运行: python3 -m pytest test/test_converter.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import converter
+
+
+def test_convert_to_images_renders_in_batches(tmp_path, monkeypatch):
+    ranges = []
+
+    def fake_render_page_range(pdf_path, output_dir, first_page, last_page, dpi=150, format='png'):
+        ranges.append((first_page, last_page))
+        return [converter.get_page_image_path(output_dir, 'deck', n, format) for n in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(converter, 'prepare_pdf', lambda input_file, output_dir, timings=None: input_file)
+    monkeypatch.setattr(converter, 'get_pdf_page_count', lambda pdf_path: 10)
+    monkeypatch.setattr(converter, 'extract_pdf_text', lambda pdf_path, image_paths: None)
+    monkeypatch.setattr(converter, 'render_page_range', fake_render_page_range)
+
+    image_paths = converter.convert_to_images(str(tmp_path / 'deck.pdf'), str(tmp_path / 'images'), batch_size=3)
+
+    assert ranges == [(1, 3), (4, 6), (7, 9), (10, 10)]
+    assert len(image_paths) == 10
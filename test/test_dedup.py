@@ -0,0 +1,88 @@
+"""
+动画递进页测试：reuse模式下近似页复用上一页的分析，每页算出哈希后立即提交分析
+运行: python3 -m pytest test/test_dedup.py
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import config
+from utils.dedup import PageHashIndex
+
+BULLETS = ['Charge: q(t) = CV(1 - e^(-t/RC))', 'Time constant: tau = RC']
+
+
+def build_deck(tmp_path):
+    """第1-3页为逐条出现要点的递进页，第4页是另一张幻灯片"""
+    font = ImageFont.load_default(size=40)
+    paths = []
+    for step in range(len(BULLETS) + 1):
+        image = Image.new('RGB', (1920, 1080), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, 1920, 160], fill='navy')
+        draw.text((100, 40), 'Charging a capacitor', fill='white', font=ImageFont.load_default(size=64))
+        for i, bullet in enumerate(BULLETS[:step]):
+            draw.text((160, 300 + i * 80), bullet, fill='black', font=font)
+        paths.append(str(tmp_path / f"p{step + 1}.png"))
+        image.save(paths[-1])
+
+    image = Image.new('RGB', (1920, 1080), 'black')
+    ImageDraw.Draw(image).ellipse([600, 200, 1300, 900], fill='orange')
+    paths.append(str(tmp_path / 'p4.png'))
+    image.save(paths[-1])
+    return paths
+
+
+def test_index_links_build_steps_to_previous_page(tmp_path):
+    paths = build_deck(tmp_path)
+    index = PageHashIndex(config.get_dedup_config()['max_distance'])
+    matches = [index.add(i, path) for i, path in enumerate(paths)]
+
+    assert [match and match[0] for match in matches] == [None, 0, 1, None]
+    assert [index.root_of(i) for i in range(len(paths))] == [0, 0, 0, 3]
+
+
+@pytest.mark.parametrize('pack_size', [1, 2])
+def test_realtime_reuse_uses_previous_page(tmp_path, monkeypatch, analyzer, pack_size):
+    paths = build_deck(tmp_path)
+    analyzed = []
+    first_done = threading.Event()
+
+    def fake_analyze_image(image_path, context=None, stats=None, on_token=None, previous_description=None,
+                           on_retry=None, page_text=None):
+        analyzed.append(os.path.basename(image_path))
+        first_done.set()
+        return f"analysis of {os.path.basename(image_path)}"
+
+    def slow_pages():
+        """模拟渲染较慢：第一页分析完成后才产出后续页面，第一页不能等到递进链结束才提交"""
+        yield paths[0]
+        if pack_size > 1:
+            yield paths[1]
+        assert first_done.wait(5)
+        yield from paths[pack_size:]
+
+    processing_config = config.get_processing_config()
+    monkeypatch.setattr(config, 'get_processing_config', lambda: dict(
+        processing_config, concurrent_processing=True, max_workers=2, pack_size=pack_size))
+    monkeypatch.setattr(analyzer, 'analyze_image', fake_analyze_image)
+    monkeypatch.setitem(analyzer.dedup_config, 'enabled', True)
+    monkeypatch.setitem(analyzer.dedup_config, 'mode', 'reuse')
+    monkeypatch.setitem(analyzer.classifier_config, 'enabled', False)
+    monkeypatch.setitem(analyzer.text_layer_config, 'enabled', False)
+
+    order = []
+    descriptions = analyzer.analyze_images_realtime(
+        slow_pages(), str(tmp_path / 'desc'), page_count=len(paths),
+        callback=lambda i, description, stats: order.append((i, stats.get('reused_from'))))
+
+    assert sorted(analyzed) == ['p1.png', 'p4.png']
+    assert descriptions[:3] == ['analysis of p1.png'] * 3
+    assert descriptions[3] == 'analysis of p4.png'
+    assert order == [(0, None), (1, 1), (2, 2), (3, None)]
@@ -0,0 +1,117 @@
+"""
+分析引擎测试：令牌桶按时间补充，限流器按预估扣除令牌并按实际用量修正，多个worker平分配额
+运行: python3 -m pytest test/test_engine.py
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import engine as engine_module
+from utils.engine import AnalysisEngine, RateLimiter, TokenBucket
+
+API_CONFIG = {'api_key': 'test', 'base_url': 'http://127.0.0.1:9/v1', 'timeout': 5, 'max_retries': 3}
+RESILIENCE_CONFIG = {
+    'retry_base_delay': 0.01, 'retry_max_delay': 0.01,
+    'breaker_failure_threshold': 1, 'breaker_recovery_timeout': 0.05,
+    'hedge_enabled': False, 'hedge_percentile': 95.0, 'hedge_min_samples': 10,
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(engine_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_refills_at_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.now += 30
+    assert bucket.wait_time(30) == 0.0
+    assert bucket.wait_time(31) == pytest.approx(1.0)
+
+    # 补充不超过容量
+    clock.now += 3600
+    bucket.take(0)
+    assert bucket.tokens == 60
+
+
+def test_limiter_charges_estimate_and_reconciles_usage(clock):
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=6000)
+    asyncio.run(limiter.acquire(2000))
+    assert limiter.token_bucket.tokens == 4000
+    assert limiter.request_bucket is None
+
+    # 实际只用了500个token，归还多扣的部分
+    limiter.reconcile(2000, 500)
+    assert limiter.token_bucket.tokens == 5500
+
+    # 实际用量超过预估时追加扣除
+    limiter.reconcile(1000, 4000)
+    assert limiter.token_bucket.tokens == 2500
+
+    # 上游返回429时清空令牌
+    limiter.penalize()
+    assert limiter.token_bucket.tokens <= 0
+
+
+def test_limiter_waits_for_request_quota(clock, monkeypatch):
+    limiter = RateLimiter(requests_per_minute=2)
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(engine_module.asyncio, 'sleep', fake_sleep)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire(0)
+
+    asyncio.run(run())
+    assert sleeps == [pytest.approx(30.0)]
+
+
+def test_limiter_error_is_not_masked():
+    engine = AnalysisEngine(API_CONFIG, {'requests_per_minute': 0, 'tokens_per_minute': 0,
+                                         'expected_completion_tokens': 0}, RESILIENCE_CONFIG)
+
+    async def failing_acquire(estimated_tokens):
+        raise TimeoutError('limiter timeout')
+
+    engine.limiter.acquire = failing_acquire
+    with pytest.raises(TimeoutError):
+        engine.submit(engine.chat_async([])).result(timeout=5)
+
+
+def test_limiter_share_divides_quota_between_workers(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=40000)
+    limiter.share(4)
+
+    assert limiter.request_bucket.capacity == 15
+    assert limiter.token_bucket.capacity == 10000
+    limiter.request_bucket.take(15)
+    assert limiter.request_bucket.wait_time(1) == pytest.approx(4.0)
+
+    # 未限制的配额仍不限制
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=6000)
+    limiter.share(3)
+    assert limiter.request_bucket is None
+    assert limiter.token_bucket.capacity == 2000
@@ -0,0 +1,71 @@
+"""
+事件总线测试：慢速订阅者积压溢出时不阻塞发布方，其连接结束后由客户端重连重新同步
+运行: python3 -m pytest test/test_events.py
+"""
+
+import os
+import sys
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.events import EventBus, format_sse
+
+
+def parse(message):
+    assert message.startswith('data: ')
+    return json.loads(message[len('data: '):])
+
+
+def test_overflow_marks_only_slow_subscriber():
+    bus = EventBus(max_pending=2)
+    slow = bus.subscribe('s1')
+    fast = bus.subscribe('s1')
+    other = bus.subscribe('s2')
+
+    for i in range(2):
+        bus.publish('s1', {'type': 'token', 'i': i})
+        assert fast.events.get_nowait()['i'] == i
+    # 队列已满时发布不阻塞，只标记溢出
+    bus.publish('s1', {'type': 'token', 'i': 2})
+
+    assert slow.overflowed
+    assert slow.events.qsize() == 2
+    assert not fast.overflowed and fast.events.get_nowait()['i'] == 2
+    assert not other.overflowed and other.events.empty()
+
+
+def test_overflowed_stream_ends_and_unsubscribes():
+    bus = EventBus(max_pending=1)
+    subscription = bus.subscribe('s1')
+    bus.publish('s1', {'type': 'token', 'i': 0})
+    bus.publish('s1', {'type': 'token', 'i': 1})
+
+    messages = list(bus.stream('s1', subscription, initial_events=[{'type': 'status', 'processed': 3}]))
+
+    assert [parse(message) for message in messages] == [{'type': 'status', 'processed': 3}]
+    assert not bus.has_subscribers('s1')
+
+
+def test_stream_forwards_events_until_end():
+    bus = EventBus()
+    subscription = bus.subscribe('s1')
+    bus.publish('s1', {'type': 'token', 'text': '电容'})
+    bus.publish('s1', {'type': 'end'})
+    bus.publish('s1', {'type': 'token', 'text': '之后的事件'})
+
+    messages = list(bus.stream('s1', subscription, keepalive=0.01))
+
+    assert [parse(message)['type'] for message in messages] == ['token', 'end']
+    assert messages[0] == format_sse({'type': 'token', 'text': '电容'})
+    assert not bus.has_subscribers('s1')
+
+
+def test_stream_sends_keepalive_while_idle():
+    bus = EventBus()
+    subscription = bus.subscribe('s1')
+    stream = bus.stream('s1', subscription, keepalive=0.01)
+
+    assert next(stream) == ": keepalive\n\n"
+    stream.close()
+    assert not bus.has_subscribers('s1')
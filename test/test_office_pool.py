@@ -0,0 +1,50 @@
+"""
+LibreOffice进程池测试：多个服务进程占用不同的槽位，端口和用户配置目录互不重叠
+运行: python3 -m pytest test/test_office_pool.py
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import office_pool
+from utils.office_pool import OfficePool, claim_pool_slot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.skipif(office_pool.fcntl is None, reason='需要文件锁')
+def test_processes_claim_distinct_slots(tmp_path):
+    profile_dir = str(tmp_path / 'profiles')
+    # 另一个进程占用第0个槽位直到被关闭
+    holder = subprocess.Popen(
+        [sys.executable, '-c', 'import sys; from utils.office_pool import claim_pool_slot; '
+                               'slot, lock = claim_pool_slot(sys.argv[1]); print(slot, flush=True); sys.stdin.read()',
+         profile_dir],
+        cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == '0'
+        slot, lock_file = claim_pool_slot(profile_dir)
+        assert slot == 1
+        lock_file.close()
+    finally:
+        holder.communicate('')
+
+    # 进程退出后槽位被释放
+    slot, lock_file = claim_pool_slot(profile_dir)
+    assert slot == 0
+    lock_file.close()
+
+
+def test_slots_use_separate_ports_and_profiles(tmp_path):
+    pools = [OfficePool(2, 2002, str(tmp_path), slot=slot) for slot in range(2)]
+    ports = [worker.port for pool in pools for worker in pool.workers]
+    profiles = [worker.profile_dir for pool in pools for worker in pool.workers]
+
+    assert ports == [2002, 2003, 2004, 2005]
+    assert len(set(profiles)) == 4
+    assert profiles[2] == os.path.join(str(tmp_path), 'slot_1', 'worker_0')
@@ -0,0 +1,72 @@
+"""
+打包分析测试：打包请求中的每张幻灯片都记录图像路径和所属的打包请求
+运行: python3 -m pytest test/test_packing.py
+"""
+
+import os
+import re
+import sys
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import config
+from utils.metrics import summarize_slides
+
+
+def build_deck(tmp_path, count):
+    paths = []
+    for i in range(count):
+        image = Image.new('RGB', (640, 360), 'white')
+        ImageDraw.Draw(image).rectangle([40 + i * 50, 60, 120 + i * 50, 300], fill='navy')
+        paths.append(str(tmp_path / f"p{i + 1}.png"))
+        image.save(paths[-1])
+    return paths
+
+
+def test_packed_slides_record_image_path(tmp_path, monkeypatch, analyzer):
+    paths = build_deck(tmp_path, 9)
+
+    def fake_chat(messages, estimated_prompt_tokens=0, on_token=None, on_retry=None, **kwargs):
+        pages = [int(n) for n in re.findall(r'第 (\d+) 页：', str(messages[1]['content']))]
+        content = '\n'.join(f"<<<PAGE {n}>>>\nanalysis of page {n}" for n in pages)
+        return {'content': content, 'usage': None, 'retries': 0, 'hedged': False,
+                'timing': {'wait_ms': 0, 'latency_ms': 1, 'ttfb_ms': 1}}
+
+    def fail_analyze_image(*args, **kwargs):
+        raise AssertionError('打包请求不应回退为逐页分析')
+
+    processing_config = config.get_processing_config()
+    monkeypatch.setattr(config, 'get_processing_config', lambda: dict(
+        processing_config, concurrent_processing=True, max_workers=2, pack_size=3))
+    monkeypatch.setattr(analyzer.engine, 'chat', fake_chat)
+    monkeypatch.setattr(analyzer, 'analyze_image', fail_analyze_image)
+    monkeypatch.setitem(analyzer.dedup_config, 'enabled', False)
+    monkeypatch.setitem(analyzer.classifier_config, 'enabled', False)
+    monkeypatch.setitem(analyzer.text_layer_config, 'enabled', False)
+
+    slide_stats = {}
+    descriptions = analyzer.analyze_images_realtime(
+        iter(paths), str(tmp_path / 'desc'), page_count=len(paths),
+        callback=lambda i, description, stats: slide_stats.__setitem__(i, stats))
+
+    assert descriptions == [f"analysis of page {n}" for n in range(1, 10)]
+    stats = [slide_stats[i] for i in range(len(paths))]
+    assert [s['input_path'] for s in stats] == ['image'] * 9
+    assert [s['pack']['id'] for s in stats] == ['pack-001'] * 3 + ['pack-004'] * 3 + ['pack-007'] * 3
+
+    metrics = summarize_slides(stats)
+    assert metrics['image_path'] == 9
+    assert metrics['text_path'] == 0
+
+
+def test_pack_fallback_tokens_do_not_double_count_cached_tokens():
+    usage = {'prompt_tokens': 3000, 'completion_tokens': 800, 'cached_tokens': 1200}
+    retry_usage = {'prompt_tokens': 1500, 'completion_tokens': 400, 'cached_tokens': 600}
+    stats = [
+        {'pack_fallback': {'pages': [1, 2], 'usage': usage}, 'usage': retry_usage},
+        {'pack_fallback': True},
+        {'pack_fallback': {'pages': [3, 4], 'usage': None}},
+    ]
+    assert summarize_slides(stats)['pack_fallback_tokens'] == 3800
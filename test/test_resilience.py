@@ -0,0 +1,80 @@
+"""
+熔断器测试：半开状态的探测请求无论结果如何都要结束探测，不能让后续请求一直等待
+运行: python3 -m pytest test/test_resilience.py
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from openai import BadRequestError, RateLimitError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.engine import AnalysisEngine
+from utils.resilience import CircuitBreaker
+
+API_CONFIG = {'api_key': 'test', 'base_url': 'http://127.0.0.1:9/v1', 'timeout': 5, 'max_retries': 3}
+RATE_LIMIT_CONFIG = {'requests_per_minute': 0, 'tokens_per_minute': 0, 'expected_completion_tokens': 0}
+RESILIENCE_CONFIG = {
+    'retry_base_delay': 0.01, 'retry_max_delay': 0.01,
+    'breaker_failure_threshold': 1, 'breaker_recovery_timeout': 0.05,
+    'hedge_enabled': False, 'hedge_percentile': 95.0, 'hedge_min_samples': 10,
+}
+
+
+def status_error(error_class, status_code):
+    response = SimpleNamespace(status_code=status_code, headers={}, request=None)
+    return error_class('error', response=response, body=None)
+
+
+def make_engine(outcomes):
+    """按顺序抛出outcomes中的异常，用完后返回成功结果"""
+    engine = AnalysisEngine(API_CONFIG, RATE_LIMIT_CONFIG, RESILIENCE_CONFIG)
+    calls = []
+
+    async def fake_hedged_chat(messages, estimated_tokens, on_token, **kwargs):
+        calls.append(engine.breaker.state)
+        if len(calls) <= len(outcomes):
+            raise outcomes[len(calls) - 1]
+        return {'content': 'ok', 'usage': None, 'ttfb': 0.0, 'hedged': False}
+
+    engine._hedged_chat = fake_hedged_chat
+    return engine, calls
+
+
+def test_rate_limited_probe_releases_half_open():
+    engine, calls = make_engine([ConnectionError('reset'), status_error(RateLimitError, 429)])
+
+    # 修复前探测请求遇到429后熔断器停留在半开状态，重试的请求永远等待
+    result = engine.submit(engine.chat_async([])).result(timeout=5)
+
+    assert result['content'] == 'ok'
+    assert calls == ['closed', 'half_open', 'half_open']
+    assert engine.breaker.state == 'closed'
+
+
+def test_rejected_probe_does_not_block_later_requests():
+    engine, _ = make_engine([ConnectionError('reset'), status_error(BadRequestError, 400)])
+
+    with pytest.raises(BadRequestError):
+        engine.submit(engine.chat_async([])).result(timeout=5)
+
+    assert engine.breaker.state == 'open'
+    assert engine.submit(engine.chat_async([])).result(timeout=5)['content'] == 'ok'
+    assert engine.breaker.state == 'closed'
+
+
+def test_cancelled_probe_releases_slot():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+
+    async def run():
+        breaker.record_failure()
+        assert await breaker.acquire() is True
+        breaker.release_probe()
+        return await asyncio.wait_for(breaker.acquire(), timeout=1)
+
+    assert asyncio.run(run()) is True
+    assert breaker.state == 'half_open'
@@ -0,0 +1,77 @@
+"""
+会话调度测试：分析队列按页数短作业优先，排队时间越长优先级越高
+运行: python3 -m pytest test/test_scheduler.py
+"""
+
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import scheduler as scheduler_module
+from utils.scheduler import JobScheduler
+
+
+def run_in_order(scheduler, submit_jobs):
+    """占住唯一的分析槽位，提交任务后放行，返回任务实际运行的顺序"""
+    gate = threading.Event()
+    started = threading.Event()
+    order = []
+    done = threading.Event()
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit('blocker', blocker, pages=1)
+    assert started.wait(5)
+
+    submit_jobs(order)
+    scheduler.submit('last', done.set, pages=10 ** 6)
+    gate.set()
+    assert done.wait(5)
+    return order
+
+
+def test_analysis_queue_runs_shortest_job_first(monkeypatch):
+    monkeypatch.setattr(scheduler_module.time, 'time', lambda: 0.0)
+    scheduler = JobScheduler(1, 1, max_queue=0, aging_pages_per_minute=10)
+
+    def submit_jobs(order):
+        for job_id, pages in [('big', 80), ('small', 5), ('medium', 20)]:
+            scheduler.submit(job_id, lambda job_id=job_id: order.append(job_id), pages=pages)
+        assert [scheduler.queue_info(job_id)['position'] for job_id in ('small', 'medium', 'big')] == [1, 2, 3]
+
+    assert run_in_order(scheduler, submit_jobs) == ['small', 'medium', 'big']
+
+
+def test_waiting_job_ages_ahead_of_later_smaller_job(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(scheduler_module.time, 'time', lambda: now[0])
+    scheduler = JobScheduler(1, 1, max_queue=0, aging_pages_per_minute=10)
+
+    def submit_jobs(order):
+        scheduler.submit('big', lambda: order.append('big'), pages=150)
+        # 10分钟后提交的60页文件优先级为 60 + 100，已排队的150页文件先运行
+        now[0] += 600
+        scheduler.submit('small', lambda: order.append('small'), pages=60)
+        # 刚提交的更小文件仍然优先
+        scheduler.submit('tiny', lambda: order.append('tiny'), pages=30)
+
+    assert run_in_order(scheduler, submit_jobs) == ['tiny', 'big', 'small']
+
+
+def test_full_queue_counts_only_waiting_sessions():
+    scheduler = JobScheduler(1, 1, max_queue=2)
+    gate = threading.Event()
+    started = threading.Event()
+    scheduler.submit('running', lambda: started.set() or gate.wait(5), pages=1)
+    assert started.wait(5)
+    try:
+        scheduler.submit('a', lambda: None, pages=1)
+        assert not scheduler.is_full()
+        scheduler.submit('b', lambda: None, pages=1)
+        assert scheduler.is_full()
+    finally:
+        gate.set()
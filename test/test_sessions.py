@@ -0,0 +1,89 @@
+"""
+会话存储测试：逐页进度暂存在内存中，按间隔合并写入，读取时合并尚未写入的进度
+运行: python3 -m pytest test/test_sessions.py
+"""
+
+import os
+import sys
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import sessions as sessions_module
+from utils.sessions import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_record(session_id, created_at='2026-01-01T00:00:00'):
+    return {'session_id': session_id, 'original_filename': 'deck.pdf', 'new_filename': 'deck.pdf',
+            'created_at': created_at, 'status': 'analyzing', 'total_images': 10, 'processed_images': 0}
+
+
+def stored_progress(store, session_id):
+    """直接从数据库读取已写入的进度，不合并内存中暂存的进度"""
+    row = store._conn.execute('SELECT processed_images, extra FROM sessions WHERE session_id = ?',
+                              (session_id,)).fetchone()
+    return row['processed_images'], json.loads(row['extra'])
+
+
+def test_progress_is_batched_until_flush_interval(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sessions_module.time, 'monotonic', clock)
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'), flush_interval=2.0)
+    store.add(new_record('s1'))
+
+    for processed in range(1, 4):
+        clock.now += 0.5
+        assert store.update_progress('s1', processed_images=processed, eta_seconds=30 - processed)
+
+    # 尚未写入数据库，读取时合并暂存的进度
+    assert stored_progress(store, 's1') == (0, {})
+    assert store.get('s1')['processed_images'] == 3
+    assert store.all()[0]['eta_seconds'] == 27
+
+    clock.now += 0.5
+    store.update_progress('s1', processed_images=4)
+    assert stored_progress(store, 's1') == (4, {'eta_seconds': 27})
+    assert store._pending == {}
+
+
+def test_flush_writes_pending_progress_in_one_pass(tmp_path):
+    db_path = str(tmp_path / 'sessions.sqlite3')
+    store = SessionStore(db_path, flush_interval=3600)
+    store.add_many([new_record('s1'), new_record('s2', '2026-01-02T00:00:00')])
+    store.update_progress('s1', processed_images=5)
+    store.update_progress('s2', processed_images=7)
+
+    reader = SessionStore(db_path, flush_interval=3600)
+    assert [record['processed_images'] for record in reader.all()] == [0, 0]
+
+    store.flush()
+    assert [record['processed_images'] for record in reader.all()] == [7, 5]
+
+
+def test_immediate_update_includes_pending_progress(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'), flush_interval=3600)
+    store.add(new_record('s1'))
+    store.update_progress('s1', processed_images=9)
+
+    assert store.update('s1', status='completed')
+    assert stored_progress(store, 's1')[0] == 9
+    assert store._pending == {}
+
+
+def test_progress_for_missing_or_deleted_session(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'), flush_interval=3600)
+    assert not store.update_progress('missing', processed_images=1)
+
+    store.add(new_record('s1'))
+    store.update_progress('s1', processed_images=2)
+    store.delete('s1')
+    store.flush()
+    assert store.get('s1') is None
@@ -0,0 +1,158 @@
+"""
+任务状态存储测试：SQLite后端只写入被修改的字段和列表项，写入的是 mark_changed 时的快照，其他进程读取到合并后的任务
+运行: python3 -m pytest test/test_state.py
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.state import SqliteTaskStore
+
+
+def new_task(total):
+    return {'status': 'analyzing', 'total_images': total, 'processed_images': 0, 'images': [None] * total,
+            'descriptions': [], 'slide_stats': [], 'streaming': {}, 'completed': False}
+
+
+def finish_slide(store, session_id, index, description):
+    task = store[session_id]
+    with store.lock:
+        while len(task['descriptions']) <= index:
+            task['descriptions'].append(None)
+            task['slide_stats'].append(None)
+        task['descriptions'][index] = description
+        task['slide_stats'][index] = {'index': index}
+        task['processed_images'] = index + 1
+        store.mark_changed(session_id, 'descriptions', 'slide_stats', index=index)
+        store.mark_changed(session_id, 'processed_images')
+
+
+def test_other_process_sees_synced_fields(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    writer = SqliteTaskStore(db_path, sync_interval=60)
+    reader = SqliteTaskStore(db_path, sync_interval=60)
+
+    writer['s1'] = new_task(3)
+    writer['s1']['images'][1] = 'p2.png'
+    writer.mark_changed('s1', 'images', index=1)
+    finish_slide(writer, 's1', 0, '第一页')
+    finish_slide(writer, 's1', 1, '第二页')
+    writer.sync()
+
+    task = reader['s1']
+    assert task['images'] == [None, 'p2.png', None]
+    assert task['descriptions'] == ['第一页', '第二页']
+    assert task['slide_stats'] == [{'index': 0}, {'index': 1}]
+    assert task['processed_images'] == 2
+    assert task['streaming'] == {}
+    assert not reader.is_local('s1')
+
+
+def test_sync_writes_only_changed_items(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    store = SqliteTaskStore(db_path, sync_interval=60)
+    store['s1'] = new_task(2)
+    finish_slide(store, 's1', 0, 'first')
+    store.sync()
+
+    # 直接修改库中已写入的第一页，之后只同步第二页时不应覆盖它
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE task_fields SET value = '\"untouched\"' "
+                     "WHERE session_id = 's1' AND field = 'descriptions' AND item = 0")
+    finish_slide(store, 's1', 1, 'second')
+    store.sync()
+
+    reader = SqliteTaskStore(db_path, sync_interval=60)
+    assert reader['s1']['descriptions'] == ['untouched', 'second']
+
+    # 任务结束时重写整个任务
+    store['s1']['completed'] = True
+    store.release('s1')
+    assert reader['s1']['descriptions'] == ['first', 'second']
+    assert reader['s1']['completed'] is True
+
+
+def test_deleted_session_is_not_rewritten(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    store = SqliteTaskStore(db_path, sync_interval=60)
+    other = SqliteTaskStore(db_path, sync_interval=60)
+    store['s1'] = new_task(1)
+    del other['s1']
+
+    finish_slide(store, 's1', 0, 'first')
+    store.sync()
+    assert 's1' not in other
+
+
+def test_sync_writes_values_from_mark_changed(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    store = SqliteTaskStore(db_path, sync_interval=60)
+    store['s1'] = new_task(2)
+    finish_slide(store, 's1', 0, 'first')
+
+    # 之后未标记的修改不会被同步线程读取
+    store['s1']['descriptions'][0] = 'unmarked'
+    store['s1']['slide_stats'][0]['index'] = 99
+    store.sync()
+
+    reader = SqliteTaskStore(db_path, sync_interval=60)
+    assert reader['s1']['descriptions'] == ['first']
+    assert reader['s1']['slide_stats'] == [{'index': 0}]
+
+
+def test_item_change_after_pending_whole_field(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    store = SqliteTaskStore(db_path, sync_interval=60)
+    store['s1'] = new_task(3)
+    task = store['s1']
+    task['images'] = ['p1.png', None, None]
+    store.mark_changed('s1', 'images')
+    task['images'][2] = 'p3.png'
+    store.mark_changed('s1', 'images', index=2)
+    store.sync()
+
+    assert SqliteTaskStore(db_path, sync_interval=60)['s1']['images'] == ['p1.png', None, 'p3.png']
+
+
+def test_concurrent_sync_sees_consistent_snapshots(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    store = SqliteTaskStore(db_path, sync_interval=0.001)
+    store['s1'] = new_task(200)
+    task = store['s1']
+
+    def render():
+        for i in range(200):
+            with store.lock:
+                task['images'][i] = f"p{i+1}.png"
+                store.mark_changed('s1', 'images', index=i)
+
+    renderer = threading.Thread(target=render)
+    renderer.start()
+    for i in range(200):
+        finish_slide(store, 's1', i, f"slide {i+1}")
+    renderer.join()
+    store.sync()
+
+    reader = SqliteTaskStore(db_path, sync_interval=60)['s1']
+    assert reader['images'] == [f"p{i+1}.png" for i in range(200)]
+    assert reader['descriptions'] == [f"slide {i+1}" for i in range(200)]
+    assert reader['processed_images'] == 200
+
+
+def test_migrate_drops_legacy_table(tmp_path):
+    db_path = str(tmp_path / 'state.sqlite3')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE tasks (session_id TEXT PRIMARY KEY, data TEXT)')
+
+    store = SqliteTaskStore(db_path, sync_interval=60)
+    tables = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tasks'"
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(tables).fetchone() is not None
+
+    store.migrate()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(tables).fetchone() is None
@@ -0,0 +1,66 @@
+"""
+缩略图缓存测试：请求宽度对齐到配置档位，超出容量时删除最久未访问的缩略图
+运行: python3 -m pytest test/test_thumbnails.py
+"""
+
+import os
+import sys
+
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.thumbnails import ThumbnailCache, snap_width
+
+WIDTHS = [320, 640, 1280]
+
+
+def make_slide(path, color):
+    image = Image.effect_noise((960, 540), 64).convert('RGB')
+    image.paste(Image.new('RGB', (200, 200), color), (50, 50))
+    image.save(path)
+    return str(path)
+
+
+def test_snap_width_uses_smallest_width_not_below_request():
+    assert snap_width(1, WIDTHS) == 320
+    assert snap_width(320, WIDTHS) == 320
+    assert snap_width(321, WIDTHS) == 640
+    assert snap_width(5000, WIDTHS) == 1280
+
+
+def test_requests_share_the_snapped_thumbnail(tmp_path):
+    slide = make_slide(tmp_path / 'p1.png', 'red')
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'), 10 ** 9, WIDTHS, format='jpeg')
+
+    path, mime = cache.get(slide, 500)
+    assert mime == 'image/jpeg'
+    with Image.open(path) as thumbnail:
+        assert thumbnail.size == (640, 360)
+    assert cache.get(slide, 600) == (path, mime)
+
+    # 不小于原图宽度时直接返回原图
+    small = str(tmp_path / 'small.png')
+    Image.new('RGB', (200, 100), 'white').save(small)
+    assert cache.get(small, 300) == (small, 'image/png')
+
+
+def test_evicts_least_recently_used_thumbnails(tmp_path):
+    slides = [make_slide(tmp_path / f"p{i}.png", color) for i, color in enumerate(['red', 'green', 'blue'])]
+    probe = ThumbnailCache(str(tmp_path / 'probe'), 10 ** 9, WIDTHS, format='jpeg')
+    size = max(os.path.getsize(probe.get(slide, 320)[0]) for slide in slides)
+
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'), int(size * 2.5), WIDTHS, format='jpeg')
+    first, _ = cache.get(slides[0], 320)
+    second, _ = cache.get(slides[1], 320)
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+
+    # 再次访问第一张后，第二张成为最久未访问的缩略图
+    assert cache.get(slides[0], 320)[0] == first
+    third, _ = cache.get(slides[2], 320)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(third)
+    assert cache._total_bytes == os.path.getsize(first) + os.path.getsize(third)
@@ -0,0 +1,52 @@
+"""
+上传复用测试：写入上传文件时计算摘要，相同摘要指向第一个完整分析该文件的会话
+运行: python3 -m pytest test/test_uploads.py
+"""
+
+import io
+import os
+import sys
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.uploads import UploadIndex, link_tree, save_and_hash
+
+
+def test_save_and_hash_streams_file(tmp_path):
+    data = os.urandom(3 * 1024 + 5)
+    digest = save_and_hash(io.BytesIO(data), str(tmp_path / 'deck.pdf'), chunk_size=1024)
+
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / 'deck.pdf').read_bytes() == data
+
+
+def test_index_keeps_first_session_per_digest(tmp_path):
+    db_path = str(tmp_path / 'uploads.sqlite3')
+    index = UploadIndex(db_path)
+    index.put('digest-a', 's1')
+    index.put('digest-a', 's2')
+    index.put('digest-b', 's1')
+
+    assert index.get('digest-a') == 's1'
+    assert UploadIndex(db_path).get('digest-b') == 's1'
+    assert index.get('digest-c') is None
+
+    # 会话删除后，指向它的摘要都不再复用
+    index.remove_session('s1')
+    assert index.get('digest-a') is None
+    assert index.get('digest-b') is None
+    index.put('digest-a', 's2')
+    assert index.get('digest-a') == 's2'
+
+
+def test_link_tree_hard_links_files(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'images').mkdir(parents=True)
+    (source / 'images' / 'p1.png').write_bytes(b'png')
+    (source / 'result.json').write_text('{}')
+
+    link_tree(str(source), str(tmp_path / 'target'))
+
+    assert (tmp_path / 'target' / 'images' / 'p1.png').read_bytes() == b'png'
+    assert os.path.samefile(source / 'result.json', tmp_path / 'target' / 'result.json')
@@ -1,14 +1,23 @@
 import os
+import re
 import json
-import base64
 import sys
-from openai import OpenAI
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import mimetypes
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config_manager import config
+from utils.cache import AnalysisCache, hash_file, make_cache_key
+from utils.engine import AnalysisEngine, estimate_text_tokens
+from utils.preprocess import prepare_image, preprocess_signature
+from utils.classifier import STRUCTURAL_RESPONSE, classify_structural_page
+from utils.converter import get_page_text
+from utils.dedup import PageHashIndex
+from utils.context import ContextManager, count_tokens
+from utils.metrics import summarize_slides
 
 mimetypes.add_type('image/png', '.png')
 mimetypes.add_type('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx')
@@ -22,26 +31,35 @@ api_config = config.get_api_config()
 if not api_config['api_key'] or api_config['api_key'] == 'your_api_key_here':
     raise ValueError("API密钥未配置，请在 config.ini 中设置 [api] api_key 或设置环境变量 OPENAI_API_KEY")
 
-# 初始化API客户端
-client = OpenAI(
-    api_key=api_config['api_key'],
-    base_url=api_config['base_url'],
-    timeout=api_config['timeout'],
-    max_retries=api_config['max_retries'],
-)
-
-def encode_image(image_path):
-    """将图像编码为base64字符串"""
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-    return encoded_string
-
-def analyze_image(image_path, context=None):
-    """分析单张图像并生成描述"""
-    base64_image = encode_image(image_path)
-    
-    # 准备提示文本
-    prompt = """
+# 初始化分析引擎（进程内所有会话共享同一个事件循环和限流器）
+engine = AnalysisEngine(api_config, config.get_rate_limit_config(), config.get_resilience_config())
+
+# 图像预处理配置
+image_config = config.get_image_config()
+
+# 结构性页面预判配置
+classifier_config = config.get_classifier_config()
+
+# PDF文本层快速路径配置
+text_layer_config = config.get_text_layer_config()
+
+# 快速路径使用的低清晰度图像预处理参数
+text_image_config = dict(image_config, image_detail='low', max_long_edge=text_layer_config['max_long_edge'])
+
+# 近似重复页检测配置
+dedup_config = config.get_dedup_config()
+
+# 单张图像的token预估值，用于限流
+IMAGE_TOKEN_ESTIMATES = {'high': 765, 'auto': 765, 'low': 85}
+
+# 初始化分析结果缓存
+cache_config = config.get_cache_config()
+analysis_cache = AnalysisCache(cache_config['db_path'], cache_config['max_size_bytes']) if cache_config['enabled'] else None
+
+# 分析提示词模板，修改模板内容时需同步递增版本号（用于缓存失效）
+PROMPT_VERSION = "2"
+
+ANALYSIS_PROMPT = """
 # PPT 幻灯片内容分析助手 (学生友好版)
 
 **任务：** 请按照以下步骤和要求，分析提供的 PPT 幻灯片内容，生成一份结构清晰、易于学生理解和学习的分析报告。
@@ -126,82 +144,685 @@ def analyze_image(image_path, context=None):
 
 """
 
-    # 如果有上下文，添加到提示中
-    if context:
-        prompt += "\n\n以下是之前幻灯片的分析，请确保分析的连贯性：\n" + context
+# 打包模式的输出格式说明，放在user消息末尾，system消息保持不变以复用前缀缓存
+PACK_INSTRUCTION = """以上 {count} 张图片依次为第 {pages} 页幻灯片。请按要求分别分析每一张幻灯片，每页的分析都要完整、独立，不要合并或省略。
+输出格式：每页分析之前单独占一行写页码标记 `<<<PAGE 页码>>>`，例如：
+<<<PAGE {first}>>>
+（第 {first} 页的分析）
+<<<PAGE {second}>>>
+（第 {second} 页的分析）
+除页码标记和各页分析外不要输出其他内容。"""
+
+PACK_MARKER = re.compile(r'^\s*`?<<<PAGE\s+(\d+)>>>`?\s*$', re.MULTILINE)
+
+# 动画递进页的差异分析提示词
+DELTA_PROMPT = """
+# PPT 动画递进页分析助手
+
+这张幻灯片与上一页几乎相同（通常是同一页动画的下一步），下面会给出之前页面的分析。
+
+*   请**只说明本页相对上一页新增或变化的内容**，并对新增内容进行简要讲解，不要重复之前的分析。
+*   如果没有实质变化，请直接回复：“本页与上一页内容相同，无新增内容。”
+*   使用 Markdown 格式和**简体中文**，数学公式使用标准 LaTeX 语法（行内 `$...$`，块级 `$$...$$`）。
+*   总字数**建议不超过 200 字**。
+
+"""
+
+def usage_stats(usage):
+    """提取token用量，包括命中服务端前缀缓存的token数（兼容SDK对象和批处理结果中的字典）"""
+    if usage is None:
+        return None
+    
+    def field(obj, name):
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        return value or 0
+    
+    details = usage.get('prompt_tokens_details') if isinstance(usage, dict) else getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': field(usage, 'prompt_tokens'),
+        'completion_tokens': field(usage, 'completion_tokens'),
+        'cached_tokens': field(details, 'cached_tokens') if details else 0,
+    }
+
+def request_payload_bytes(messages):
+    """估算请求体的字节数（消息中的文本和图像data URL），避免为统计再序列化一次请求"""
+    total = 0
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            total += len(content.encode('utf-8'))
+            continue
+        for part in content:
+            if part['type'] == 'text':
+                total += len(part['text'].encode('utf-8'))
+            else:
+                total += len(part['image_url']['url'])
+    return total
+
+def select_page_text(page_text):
+    """文本层文字足够多时返回用于快速路径的文本（超出上限时截断），否则返回None"""
+    if not text_layer_config['enabled'] or not page_text:
+        return None
+    
+    lines = [line.rstrip() for line in page_text.splitlines() if line.strip()]
+    text = '\n'.join(lines)
+    if len(''.join(text.split())) < text_layer_config['min_text_chars']:
+        return None
+    return text[:text_layer_config['max_text_chars']]
+
+def get_cache_key(image_path, context=None, delta_mode=False, pack_size=1, page_text=None):
+    """计算单张幻灯片分析结果的缓存键"""
+    if page_text:
+        variant = preprocess_signature(text_image_config) + ';text'
+    else:
+        variant = preprocess_signature(image_config)
+    variant += ';delta' if delta_mode else ''
+    if pack_size > 1:
+        variant += f';pack{pack_size}'
+    return make_cache_key(hash_file(image_path), PROMPT_VERSION,
+                          api_config['model'], api_config['temperature'], context,
+                          variant=variant)
+
+def build_messages(image_path, context=None, delta_mode=False, page_text=None):
+    """构造分析请求的消息，返回 (messages, 预估输入token数, 图像预处理统计)
+
+    静态指令放在system消息中并保持不变，便于服务端复用前缀缓存；
+    随幻灯片变化的上下文和图像放在其后的user消息中。
+    传入page_text时走文本层快速路径：附上文本层，图像改用低清晰度。
+    """
+    # 预处理图像（缩放、裁边、重新编码）
+    options = text_image_config if page_text else image_config
+    image_url, image_stats = prepare_image(image_path, options)
+    print(f"图像预处理: {os.path.basename(image_path)} {image_stats['original_bytes']} -> "
+          f"{image_stats['encoded_bytes']} 字节，节省 {image_stats['saved_bytes']} 字节")
+    
+    if delta_mode:
+        system_prompt = DELTA_PROMPT
+        context_text = "以下是之前页面的分析：\n" + context
+    else:
+        system_prompt = ANALYSIS_PROMPT
+        context_text = "以下是之前幻灯片的分析，请确保分析的连贯性：\n" + context if context else None
+    
+    user_content = []
+    if context_text:
+        user_content.append({
+            "type": "text",
+            "text": context_text,
+        })
+    text_layer = None
+    if page_text:
+        text_layer = "以下是从PDF中提取的本页文本层（可能缺少公式、图表和排版信息，请结合图片理解）：\n" + page_text
+        user_content.append({
+            "type": "text",
+            "text": text_layer,
+        })
+    user_content.append({
+        "type": "image_url",
+        "image_url": {
+            "url": image_url,
+            "detail": options['image_detail'],
+        },
+    })
+    user_content.append({
+        "type": "text",
+        "text": "请分析这张幻灯片。",
+    })
     
     # 创建消息
     messages = [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
         {
             "role": "user",
-            "content": [
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{base64_image}",
-                        "detail": "high",
-                    },
-                },
-                {
-                    "type": "text",
-                    "text": prompt,
-                },
-            ],
+            "content": user_content,
         },
     ]
     
+    estimated_tokens = (estimate_text_tokens(system_prompt) + estimate_text_tokens(context_text)
+                        + estimate_text_tokens(text_layer)
+                        + IMAGE_TOKEN_ESTIMATES.get(options['image_detail'], 765))
+    return messages, estimated_tokens, image_stats
+
+def analyze_image(image_path, context=None, stats=None, on_token=None, previous_description=None, on_retry=None,
+                  page_text=None):
+    """分析单张图像并生成描述
+
+    stats不为None时写入本次处理的统计信息；
+    传入on_token且启用 [api] stream 时以流式方式调用模型，每收到一段文本回调一次，
+    请求重试前调用 on_retry()；
+    传入previous_description时只分析相对之前页面的变化（动画递进页）；
+    传入page_text（select_page_text的结果）时发送文本层和低清晰度图像。
+    重试用尽后抛出异常，由调用方将该幻灯片标记为失败。
+    """
+    if stats is None:
+        stats = {}
+    
+    delta_mode = previous_description is not None
+    if delta_mode:
+        context = previous_description
+    stats['input_path'] = 'text' if page_text else 'image'
+    
+    # 查询缓存
+    cache_key = None
+    if analysis_cache is not None:
+        cache_key = get_cache_key(image_path, context, delta_mode, page_text=page_text)
+        cached_description = analysis_cache.get(cache_key)
+        stats['cache_hit'] = cached_description is not None
+        if cached_description is not None:
+            print(f"命中分析缓存: {image_path}")
+            return cached_description
+    
+    messages, estimated_tokens, stats['image'] = build_messages(image_path, context, delta_mode, page_text)
+    stats['request_bytes'] = request_payload_bytes(messages)
+    
     # 调用API
+    stream_callback = on_token if api_config['stream'] else None
+    result = engine.chat(messages, estimated_tokens, on_token=stream_callback,
+                         on_retry=on_retry if stream_callback else None)
+    
+    description = result['content']
+    stats['usage'] = usage_stats(result['usage'])
+    stats['retries'] = result['retries']
+    stats['hedged'] = result['hedged']
+    stats.setdefault('timing', {}).update(result['timing'])
+    
+    # 写入缓存
+    if cache_key and description:
+        analysis_cache.put(cache_key, description)
+    
+    # 返回生成的描述
+    return description
+
+def build_packed_messages(image_paths, page_numbers, context=None):
+    """构造一次分析多张幻灯片的请求消息，返回 (messages, 预估输入token数, 各图像预处理统计)"""
+    context_text = "以下是之前幻灯片的分析，请确保分析的连贯性：\n" + context if context else None
+    
+    user_content = []
+    if context_text:
+        user_content.append({
+            "type": "text",
+            "text": context_text,
+        })
+    
+    image_stats = []
+    for image_path, page_number in zip(image_paths, page_numbers):
+        image_url, stats = prepare_image(image_path, image_config)
+        image_stats.append(stats)
+        user_content.append({
+            "type": "text",
+            "text": f"第 {page_number} 页：",
+        })
+        user_content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": image_url,
+                "detail": image_config['image_detail'],
+            },
+        })
+    
+    instruction = PACK_INSTRUCTION.format(count=len(page_numbers),
+                                          pages='、'.join(str(n) for n in page_numbers),
+                                          first=page_numbers[0], second=page_numbers[1])
+    user_content.append({
+        "type": "text",
+        "text": instruction,
+    })
+    
+    messages = [
+        {
+            "role": "system",
+            "content": ANALYSIS_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": user_content,
+        },
+    ]
+    
+    estimated_tokens = (estimate_text_tokens(ANALYSIS_PROMPT) + estimate_text_tokens(context_text)
+                        + estimate_text_tokens(instruction)
+                        + len(image_paths) * IMAGE_TOKEN_ESTIMATES.get(image_config['image_detail'], 765))
+    return messages, estimated_tokens, image_stats
+
+def parse_packed_response(content, page_numbers):
+    """按页码标记拆分打包请求的回复，缺少某页或出现多余页码时返回None"""
+    parts = PACK_MARKER.split(content or '')
+    sections = {}
+    for number, text in zip(parts[1::2], parts[2::2]):
+        number = int(number)
+        if number in sections or not text.strip():
+            return None
+        sections[number] = text.strip()
+    
+    if sorted(sections) != sorted(page_numbers):
+        return None
+    return [sections[number] for number in page_numbers]
+
+def split_usage(usage, count, position):
+    """将打包请求的token用量平均分摊到各页，余数计入第一页"""
+    return {
+        key: value // count + (value % count if position == 0 else 0)
+        for key, value in usage.items()
+    }
+
+def analyze_image_pack(image_paths, page_numbers, stats_list, context=None, pack_size=None):
+    """一次请求分析多张连续的幻灯片，返回各页描述；回复无法按页码拆分时返回None
+
+    stats_list 与image_paths一一对应，写入各页的统计信息：各页都走图像路径，pack 中记录打包请求的
+    id（以第一页页码命名）和页码，token用量平均分摊，请求体积、耗时和重试次数只记录在第一页；无法拆分时本次请求的用量记录在第一页的
+    pack_fallback 中。调用失败时抛出异常。
+    """
+    count = len(image_paths)
+    pack_size = pack_size or count
+    messages, estimated_tokens, image_stats = build_packed_messages(image_paths, page_numbers, context)
+    print(f"打包分析第 {'、'.join(str(n) for n in page_numbers)} 页")
+    
+    # 回复中包含页码标记，不做流式展示；预估输出按页数累计
+    result = engine.chat(messages, estimated_tokens + (count - 1) * engine.expected_completion_tokens)
+    descriptions = parse_packed_response(result['content'], page_numbers)
+    usage = usage_stats(result['usage'])
+    if descriptions is None:
+        print(f"第 {'、'.join(str(n) for n in page_numbers)} 页的打包回复无法按页拆分")
+        stats_list[0]['pack_fallback'] = {'pages': page_numbers, 'usage': usage}
+        return None
+    
+    context_tokens = count_tokens(context)
+    pack_id = f"pack-{page_numbers[0]:03d}"
+    for position, (stats, image) in enumerate(zip(stats_list, image_stats)):
+        stats['image'] = image
+        stats['context_tokens'] = context_tokens
+        stats['input_path'] = 'image'
+        stats['pack'] = {'id': pack_id, 'size': count, 'position': position, 'pages': page_numbers}
+        stats['usage'] = split_usage(usage, count, position) if usage else None
+        if position == 0:
+            stats['request_bytes'] = request_payload_bytes(messages)
+            stats['retries'] = result['retries']
+            stats['hedged'] = result['hedged']
+            stats.setdefault('timing', {}).update(result['timing'])
+    
+    if analysis_cache is not None:
+        for image_path, description in zip(image_paths, descriptions):
+            analysis_cache.put(get_cache_key(image_path, context, pack_size=pack_size), description)
+    
+    return descriptions
+
+def save_description(output_dir, index, description, stats=None):
+    """将单张幻灯片的描述和统计信息写入 description_NNN.json
+
+    先写入临时文件再替换，进程中途退出时不会留下不完整的描述文件。
+    """
+    output_file = os.path.join(output_dir, f"description_{index+1:03d}.json")
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({"description": description, "stats": stats or {}}, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, output_file)
+
+def load_description(output_dir, index):
+    """读取已写入的 description_NNN.json，返回 (描述, 统计信息)，文件不存在或无法解析时返回None"""
+    output_file = os.path.join(output_dir, f"description_{index+1:03d}.json")
     try:
-        completion = client.chat.completions.create(
-            model=api_config['model'],
-            messages=messages,
-            temperature=api_config['temperature'],
-        )
-        
-        # 返回生成的描述
-        return completion.choices[0].message.content
-    except Exception as e:
-        print(f"调用API出错: {str(e)}")
-        return f"分析失败: {str(e)}"
-
-def analyze_images_realtime(image_paths, output_dir, callback=None):
-    """分析多张图像并生成描述，同时保持上下文连贯性，支持实时回调"""
+        with open(output_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        return saved['description'], saved.get('stats') or {}
+    except (OSError, ValueError, KeyError):
+        return None
+
+def analyze_images_realtime(image_paths, output_dir, callback=None, token_callback=None, pdf_path=None,
+                            render_times=None, resume=False, page_count=None, image_callback=None):
+    """分析多张图像并生成描述，同时保持上下文连贯性，支持实时回调
+
+    启用 [processing] concurrent_processing 时最多 max_workers 张幻灯片同时分析，
+    否则逐张分析。上下文策略：每张幻灯片开始分析时，取其之前已完成分析的
+    最近 max_context_slides 张幻灯片（顺序模式下即前 N 张）的摘要，
+    总长度不超过 context_token_budget 个token。
+    callback(index, 描述, 统计信息) 始终按幻灯片顺序触发。
+
+    token_callback(index, 文本片段) 在模型流式输出时实时触发，请求重试时以 None 触发表示丢弃已输出的文本，
+    描述文件仅在整张幻灯片分析完成后写入。
+    分析失败的幻灯片描述为None，错误信息记录在统计信息的 error 字段中。
+    提供pdf_path时，会先借助文本层在本地识别结构性页面并跳过API调用。
+    启用 [dedup] 时，与上一页近似的动画递进页会复用上一页的分析或只分析差异。
+    render_times 为每页的渲染耗时（毫秒），记录到对应幻灯片的统计信息中。
+    [processing] pack_size 大于1时，每 pack_size 张连续幻灯片中需要调用模型的页面合并为一个请求，
+    回复无法按页拆分时退回逐张分析；打包请求不做流式输出。
+    resume为True时复用output_dir中已成功写入的描述文件（同样按顺序触发回调），只分析其余幻灯片。
+
+    image_paths 也可以是按页序逐页产出图片路径的迭代器（例如 converter.iter_pdf_pages），
+    此时需要通过 page_count 提供总页数：每产出一页就触发 image_callback(index, 图片路径) 并开始分析，
+    已提交但未完成的任务不超过 max_workers 的两倍，分析跟不上时暂停读取后续页面。
+    render_times 可以是随渲染进度追加的列表。
+    """
     os.makedirs(output_dir, exist_ok=True)
     
-    descriptions = []
-    context = ""
-    
     # 获取处理配置
     processing_config = config.get_processing_config()
     max_context_slides = processing_config['max_context_slides']
+    if cache_config['skip_context']:
+        # 不携带上下文以获得最高缓存命中率
+        max_context_slides = 0
+    max_workers = processing_config['max_workers'] if processing_config['concurrent_processing'] else 1
+    pack_size = max(1, processing_config['pack_size'])
+    
+    streaming = not isinstance(image_paths, (list, tuple))
+    if streaming and page_count is None:
+        image_paths = list(image_paths)
+        streaming = False
+    
+    if streaming:
+        # 页面路径在渲染完成后才写入
+        total = page_count
+        sorted_image_paths = [None] * total
+    else:
+        # 调整图像路径，确保使用统一格式
+        sorted_image_paths = sorted([os.path.abspath(p) for p in image_paths])
+        total = len(sorted_image_paths)
+    
+    descriptions = [None] * total
+    slide_stats = [None] * total
+    finished = [False] * total
+    slide_events = [threading.Event() for _ in range(total)]
+    state_lock = threading.Lock()
+    
+    # 有token预算的滚动上下文
+    context_manager = ContextManager(processing_config['context_token_budget'], max_context_slides,
+                                     processing_config['context_mode'])
+    
+    # 感知哈希索引：{index: (上一页索引, 汉明距离)}
+    hash_index = PageHashIndex(dedup_config['max_distance']) if dedup_config['enabled'] else None
+    duplicates = {}
+    
+    def analyze_duplicate(i, image_path, stats, on_token, on_retry):
+        """处理与上一页近似的动画递进页，上一页没有可用分析时返回None"""
+        previous_index, distance = duplicates[i]
+        root_index = hash_index.root_of(i)
+        slide_events[previous_index].wait()
+        with state_lock:
+            previous_description = descriptions[previous_index]
+            root_description = descriptions[root_index]
+        if not previous_description or not root_description:
+            return None
+        
+        stats['dedup'] = {
+            'previous': previous_index + 1,
+            'root': root_index + 1,
+            'distance': distance,
+            'mode': dedup_config['mode'],
+        }
+        
+        if dedup_config['mode'] == 'reuse':
+            print(f"第 {i+1} 张与第 {previous_index+1} 张近似，复用其分析")
+            stats['skipped_api'] = 'duplicate'
+            stats['reused_from'] = previous_index + 1
+            return previous_description
+        
+        # 只分析相对之前页面的变化
+        print(f"第 {i+1} 张与第 {previous_index+1} 张近似，只分析差异")
+        previous_text = root_description
+        if previous_index != root_index:
+            previous_text += "\n\n" + previous_description
+        delta = analyze_image(image_path, stats=stats, on_token=on_token, previous_description=previous_text,
+                              on_retry=on_retry)
+        stats['delta_of'] = previous_index + 1
+        return f"> 本页为第 {previous_index+1} 页的动画递进页，以下仅说明新增内容。\n\n{delta}"
+    
+    def new_stats(i):
+        stats = {}
+        if render_times and i < len(render_times):
+            stats['timing'] = {'render_ms': render_times[i]}
+        return stats
     
-    # 调整图像路径，确保使用统一格式
-    sorted_image_paths = sorted([os.path.abspath(p) for p in image_paths])
+    def load_page_text(i, image_path):
+        """读取幻灯片的文本层，结构性页面预判和文本层快速路径都未启用时不读取"""
+        if not (classifier_config['enabled'] or text_layer_config['enabled']):
+            return None
+        return get_page_text(image_path, pdf_path, i + 1)
     
-    # 按顺序处理每张图片
-    for i, image_path in enumerate(sorted_image_paths):
-        print(f"正在分析第 {i+1}/{len(sorted_image_paths)} 张图片: {image_path}")
+    def check_structural(i, image_path, stats, page_text):
+        """本地预判结构性页面，命中时返回固定回复，否则返回None"""
+        if not classifier_config['enabled']:
+            return None
+        structural = classify_structural_page(image_path, i + 1, total, page_text, classifier_config)
+        if not structural:
+            return None
+        
+        print(f"第 {i+1} 张为结构性页面，跳过API调用: {structural['reason']}")
+        stats['skipped_api'] = 'structural'
+        stats['structural'] = structural
+        return STRUCTURAL_RESPONSE
+    
+    def analyze_slide(i, image_path, stats, page_text=None):
+        """调用模型分析单张幻灯片（近似页先尝试复用或差异分析），失败时返回None并记录错误"""
+        on_token = (lambda delta: token_callback(i, delta)) if token_callback else None
+        on_retry = (lambda: token_callback(i, None)) if token_callback else None
+        
+        try:
+            description = None
+            if i in duplicates:
+                description = analyze_duplicate(i, image_path, stats, on_token, on_retry)
+            
+            if description is None:
+                # 分析图片，包含上下文
+                context = context_manager.build(i)
+                stats['context_tokens'] = count_tokens(context)
+                description = analyze_image(image_path, context, stats, on_token, on_retry=on_retry,
+                                            page_text=select_page_text(page_text))
+            return description
+        except Exception as e:
+            print(f"第 {i+1} 张分析失败: {str(e)}")
+            stats['error'] = str(e)
+            return None
+    
+    def process_slide(i, image_path):
+        """分析单张幻灯片，返回 (描述, 统计信息)"""
+        print(f"正在分析第 {i+1}/{total} 张图片: {image_path}")
         
         # 检查文件是否存在
         if not os.path.exists(image_path):
             print(f"警告: 文件不存在: {image_path}")
-            continue
+            return None, None
         
-        # 分析图片，包含上下文
-        description = analyze_image(image_path, context)
-        descriptions.append(description)
+        stats = new_stats(i)
+        try:
+            # 本地预判结构性页面，命中则跳过API调用
+            page_text = load_page_text(i, image_path)
+            description = check_structural(i, image_path, stats, page_text)
+        except Exception as e:
+            print(f"第 {i+1} 张分析失败: {str(e)}")
+            stats['error'] = str(e)
+            return None, stats
         
-        # 保存描述到文件
-        output_file = os.path.join(output_dir, f"description_{i+1:03d}.json")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({"description": description}, f, ensure_ascii=False, indent=2)
+        if description is None:
+            description = analyze_slide(i, image_path, stats, page_text)
+        return description, stats
+    
+    def finish_slide(i, description, stats):
+        """写入描述文件并记录结果，唤醒等待该页的近似页"""
+        if stats is not None:
+            save_description(output_dir, i, description, stats)
+            if 'reused_from' not in stats:
+                context_manager.add(i, description)
+        with state_lock:
+            descriptions[i] = description
+            slide_stats[i] = stats
+            finished[i] = True
+        slide_events[i].set()
+    
+    def run_slide(i, image_path):
+        try:
+            finish_slide(i, *process_slide(i, image_path))
+        finally:
+            slide_events[i].set()
+    
+    def run_pack(indices):
+        """打包模式：结构性页面、缓存命中页、近似页和走文本层快速路径的页面单独处理，
+        其余页面合并为一个请求分析"""
+        try:
+            context = context_manager.build(indices[0])
+            packed = []
+            later = []
+            
+            for i in indices:
+                image_path = sorted_image_paths[i]
+                print(f"正在分析第 {i+1}/{total} 张图片: {image_path}")
+                if not os.path.exists(image_path):
+                    print(f"警告: 文件不存在: {image_path}")
+                    finish_slide(i, None, None)
+                    continue
+                
+                stats = new_stats(i)
+                try:
+                    page_text = load_page_text(i, image_path)
+                    description = check_structural(i, image_path, stats, page_text)
+                    if description is None and (i in duplicates or select_page_text(page_text)):
+                        # 近似页的上一页可能在同一组中，文本层快速路径的页面单独请求，都在打包请求之后处理
+                        later.append((i, image_path, stats, page_text))
+                        continue
+                    if description is None and analysis_cache is not None:
+                        description = analysis_cache.get(get_cache_key(image_path, context, pack_size=pack_size))
+                        stats['cache_hit'] = description is not None
+                        if description is not None:
+                            stats['input_path'] = 'image'
+                except Exception as e:
+                    print(f"第 {i+1} 张分析失败: {str(e)}")
+                    stats['error'] = str(e)
+                    finish_slide(i, None, stats)
+                    continue
+                
+                if description is not None:
+                    finish_slide(i, description, stats)
+                else:
+                    packed.append((i, image_path, stats))
+            
+            results = None
+            if len(packed) > 1:
+                try:
+                    results = analyze_image_pack([path for _, path, _ in packed], [i + 1 for i, _, _ in packed],
+                                                 [stats for _, _, stats in packed], context, pack_size)
+                except Exception as e:
+                    print(f"打包分析失败: {str(e)}")
+            
+            if results is not None:
+                for (i, _, stats), description in zip(packed, results):
+                    finish_slide(i, description, stats)
+            else:
+                # 打包失败或只剩一页时逐张分析
+                for i, image_path, packed_stats in packed:
+                    stats = new_stats(i)
+                    if len(packed) > 1:
+                        stats['pack_fallback'] = packed_stats.get('pack_fallback', True)
+                    finish_slide(i, analyze_slide(i, image_path, stats), stats)
+            
+            for i, image_path, stats, page_text in later:
+                finish_slide(i, analyze_slide(i, image_path, stats, page_text), stats)
+        finally:
+            for i in indices:
+                slide_events[i].set()
+    
+    # 恢复中断的会话：复用已成功写入的描述文件
+    if resume:
+        for i in range(total):
+            saved = load_description(output_dir, i)
+            if saved is None or saved[0] is None:
+                continue
+            description, stats = saved
+            descriptions[i] = description
+            slide_stats[i] = stats
+            finished[i] = True
+            slide_events[i].set()
+            if 'reused_from' not in stats:
+                context_manager.add(i, description)
+        resumed_count = sum(finished)
+        if resumed_count:
+            print(f"复用已完成的 {resumed_count}/{total} 张幻灯片的分析，继续分析其余幻灯片")
+    
+    next_index = 0
+    
+    def flush_callbacks():
+        """按幻灯片顺序触发已完成幻灯片的回调"""
+        nonlocal next_index
+        while next_index < total and finished[next_index]:
+            if callback and slide_stats[next_index] is not None:
+                callback(next_index, descriptions[next_index], slide_stats[next_index])
+            next_index += 1
+    
+    def arrived_pages():
+        """按页序产出 (index, 图片路径)，流式输入时每页渲染完成后才产出"""
+        if not streaming:
+            yield from enumerate(sorted_image_paths)
+            return
+        for i, path in enumerate(image_paths):
+            if i >= total:
+                break
+            path = os.path.abspath(path)
+            sorted_image_paths[i] = path
+            if image_callback:
+                image_callback(i, path)
+            yield i, path
+    
+    # 先触发已复用幻灯片的回调
+    flush_callbacks()
+    
+    # 提交任务，按完成情况依序触发回调
+    # 线程池按提交顺序取任务，近似页开始等待时上一页必然已在处理，不会死锁
+    max_pending = max(1, max_workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = set()
+        
+        def wait_pending(limit):
+            """等待到未完成的任务不超过limit个"""
+            nonlocal pending
+            while len(pending) > limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                flush_callbacks()
+        
+        def submit(indices):
+            indices = [i for i in indices if not finished[i]]
+            if not indices:
+                return
+            wait_pending(max_pending - 1)
+            if pack_size > 1:
+                pending.add(executor.submit(run_pack, indices))
+            else:
+                pending.add(executor.submit(run_slide, indices[0], sorted_image_paths[indices[0]]))
         
-        # 更新上下文，只保留最近N张幻灯片的描述
-        context_entries = descriptions[-max_context_slides:] if len(descriptions) > max_context_slides else descriptions
-        context = "\n\n".join([f"幻灯片 {j+1}: {desc}" for j, desc in enumerate(context_entries, i-len(context_entries)+1)])
+        group = []
+        for i, path in arrived_pages():
+            if hash_index is not None and os.path.exists(path):
+                match = hash_index.add(i, path)
+                if match:
+                    duplicates[i] = match
+            group.append(i)
+            if len(group) == pack_size:
+                submit(group)
+                group = []
+        if group:
+            submit(group)
         
-        # 调用回调函数通知进度更新
-        if callback:
-            callback(i, description)
+        wait_pending(0)
     
-    return descriptions
+    saved_bytes = sum(stats['image']['saved_bytes'] for stats in slide_stats if stats and 'image' in stats)
+    print(f"图像预处理共节省 {saved_bytes} 字节")
+    structural_count = sum(1 for stats in slide_stats if stats and stats.get('skipped_api') == 'structural')
+    print(f"结构性页面预判跳过了 {structural_count}/{total} 次API调用")
+    text_path_count = sum(1 for stats in slide_stats if stats and stats.get('input_path') == 'text')
+    image_path_count = sum(1 for stats in slide_stats if stats and stats.get('input_path') == 'image')
+    print(f"文本层快速路径 {text_path_count} 张，高清图像路径 {image_path_count} 张")
+    failed_count = sum(1 for stats in slide_stats if stats and 'error' in stats)
+    if failed_count:
+        print(f"{failed_count}/{total} 张幻灯片分析失败")
+    duplicate_count = sum(1 for stats in slide_stats if stats and 'dedup' in stats)
+    print(f"检测到 {duplicate_count}/{total} 张动画递进页")
+    usages = [stats['usage'] for stats in slide_stats if stats and stats.get('usage')]
+    prompt_tokens = sum(usage['prompt_tokens'] for usage in usages)
+    cached_tokens = sum(usage['cached_tokens'] for usage in usages)
+    if prompt_tokens:
+        print(f"输入token {prompt_tokens}，命中前缀缓存 {cached_tokens} ({cached_tokens / prompt_tokens:.1%})")
+    if analysis_cache is not None:
+        print(f"分析缓存统计: {analysis_cache.stats()}")
+    print(f"耗时与用量统计: {summarize_slides(slide_stats)}")
+    
+    return [desc for desc in descriptions if desc is not None]
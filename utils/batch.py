@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import datetime
+
+from openai import OpenAI
+
+from utils.analyzer import (
+    analysis_cache, api_config, build_messages, classifier_config,
+    dedup_config, get_cache_key, request_payload_bytes, save_description, select_page_text,
+    text_layer_config, usage_stats,
+)
+from utils.classifier import STRUCTURAL_RESPONSE, classify_structural_page
+from utils.converter import get_page_text
+from utils.dedup import PageHashIndex
+from utils.metrics import summarize_slides
+
+# 批处理任务的终止状态
+BATCH_FINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def get_batch_client(batch_config):
+    """创建批处理接口客户端，base_url可指向本地替身服务用于测试"""
+    return OpenAI(
+        api_key=batch_config['api_key'],
+        base_url=batch_config['base_url'],
+        timeout=api_config['timeout'],
+        max_retries=api_config['max_retries'],
+    )
+
+
+def save_manifest(batch_dir, manifest):
+    """保存批处理清单，用于中断后继续轮询"""
+    os.makedirs(batch_dir, exist_ok=True)
+    manifest_path = os.path.join(batch_dir, f"{manifest['name']}.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+
+def load_manifest(manifest_path):
+    """读取批处理清单，旧版只有单个批处理任务的清单转换为一个分片"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if 'shards' not in manifest:
+        shard = {key: manifest.pop(key) for key in ('input_path', 'batch_id', 'input_file_id') if key in manifest}
+        shard.update(request_count=manifest['request_count'], status=manifest['status'])
+        manifest['shards'] = [shard] if shard.get('input_path') else []
+    return manifest
+
+
+class ShardWriter:
+    """把请求写入多个JSONL分片，每个分片不超过批处理接口的单文件请求数和大小限制"""
+
+    def __init__(self, batch_dir, name, max_requests, max_bytes):
+        self.batch_dir = batch_dir
+        self.name = name
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.shards = []
+        self._file = None
+        self._bytes = 0
+
+    def write(self, request):
+        """写入一条请求，返回其所在分片的序号"""
+        line = (json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8')
+        shard = self.shards[-1] if self.shards else None
+        if shard is None or shard['request_count'] >= self.max_requests or self._bytes + len(line) > self.max_bytes:
+            self._open_next()
+            shard = self.shards[-1]
+        self._file.write(line)
+        self._bytes += len(line)
+        shard['request_count'] += 1
+        return len(self.shards) - 1
+
+    def _open_next(self):
+        self.close()
+        input_path = os.path.join(self.batch_dir, f"{self.name}_{len(self.shards) + 1:03d}.jsonl")
+        self._file = open(input_path, 'wb')
+        self._bytes = 0
+        self.shards.append({'input_path': input_path, 'request_count': 0, 'status': 'pending'})
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def build_batch(sessions, batch_config):
+    """为待处理的幻灯片生成 Batch 格式的 JSONL 请求文件
+
+    sessions 为 [{'session_id', 'images', 'desc_dir', 'pdf_path', 'render_times'}]。
+    结构性页面、命中缓存的页面直接写入描述文件；递进链前面的页面在回填时复用链中最后一页的结果；
+    其余页面各生成一条请求。批处理中各幻灯片相互独立，不携带滚动上下文。
+    请求按 max_file_requests / max_file_mb 拆分为多个分片，每个分片提交为一个批处理任务，
+    分片记录在清单的 shards 中。返回清单。
+    """
+    batch_dir = batch_config['batch_dir']
+    os.makedirs(batch_dir, exist_ok=True)
+    name = f"batch_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    writer = ShardWriter(batch_dir, name, batch_config['max_file_requests'],
+                         batch_config['max_file_mb'] * 1024 * 1024)
+    manifest = {
+        'name': name,
+        'created_at': datetime.datetime.now().isoformat(),
+        'status': 'pending',
+        'request_count': 0,
+        'shards': writer.shards,
+        'sessions': {},
+    }
+
+    try:
+        for session in sessions:
+            session_id = session['session_id']
+            images = session['images']
+            hash_index = PageHashIndex(dedup_config['max_distance']) if dedup_config['enabled'] else None
+            slides = []
+
+            render_times = session.get('render_times') or []
+            for i, image_path in enumerate(images):
+                plan = {}
+                timing = {'render_ms': render_times[i]} if i < len(render_times) else {}
+
+                page_text = None
+                if classifier_config['enabled'] or text_layer_config['enabled']:
+                    page_text = get_page_text(image_path, session.get('pdf_path'), i + 1)
+
+                structural = None
+                if classifier_config['enabled']:
+                    structural = classify_structural_page(image_path, i + 1, len(images), page_text, classifier_config)
+
+                duplicate = hash_index.add(i, image_path) if hash_index is not None else None
+
+                if structural:
+                    save_description(session['desc_dir'], i, STRUCTURAL_RESPONSE,
+                                     {'skipped_api': 'structural', 'structural': structural, 'timing': timing})
+                    plan['done'] = True
+                elif duplicate and dedup_config['mode'] == 'reuse':
+                    plan['reused_from'] = duplicate[0] + 1
+                    plan['distance'] = duplicate[1]
+                    plan['timing'] = timing
+                else:
+                    fast_text = select_page_text(page_text)
+                    cache_key = get_cache_key(image_path, page_text=fast_text) if analysis_cache is not None else None
+                    cached_description = analysis_cache.get(cache_key) if cache_key else None
+                    if cached_description is not None:
+                        save_description(session['desc_dir'], i, cached_description,
+                                         {'cache_hit': True, 'timing': timing})
+                        plan['done'] = True
+                    else:
+                        messages, _, image_stats = build_messages(image_path, page_text=fast_text)
+                        custom_id = f"{session_id}-{i+1:03d}"
+                        request = {
+                            'custom_id': custom_id,
+                            'method': 'POST',
+                            'url': '/v1/chat/completions',
+                            'body': {
+                                'model': api_config['model'],
+                                'messages': messages,
+                                'temperature': api_config['temperature'],
+                            },
+                        }
+                        plan.update(custom_id=custom_id, shard=writer.write(request),
+                                    cache_key=cache_key, image=image_stats,
+                                    request_bytes=request_payload_bytes(messages), timing=timing,
+                                    input_path='text' if fast_text else 'image')
+                        manifest['request_count'] += 1
+
+                slides.append(plan)
+
+            manifest['sessions'][session_id] = {
+                'images': [os.path.basename(image_path) for image_path in images],
+                'desc_dir': session['desc_dir'],
+                'slides': slides,
+            }
+    finally:
+        writer.close()
+
+    print(f"批处理 {name}: 共 {manifest['request_count']} 条请求，{len(manifest['shards'])} 个分片")
+    return manifest
+
+
+def submit_batch(client, manifest, batch_config):
+    """上传各分片的请求文件并创建批处理任务，已提交的分片跳过
+
+    每提交一个分片保存一次清单，提交中断后可以继续提交剩余分片。
+    """
+    for shard in manifest['shards']:
+        if shard.get('batch_id'):
+            continue
+        with open(shard['input_path'], 'rb') as f:
+            input_file = client.files.create(file=f, purpose='batch')
+
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window=batch_config['completion_window'],
+        )
+        shard.update(batch_id=batch.id, input_file_id=input_file.id, status=batch.status)
+        manifest['status'] = 'submitted'
+        save_manifest(batch_config['batch_dir'], manifest)
+        print(f"已提交批处理任务: {batch.id} ({shard['request_count']} 条请求)")
+
+
+def wait_for_batch(client, batch_id, poll_interval):
+    """轮询批处理任务直到结束"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts:
+            print(f"批处理 {batch_id} 状态: {batch.status} ({counts.completed}/{counts.total} 完成, {counts.failed} 失败)")
+        else:
+            print(f"批处理 {batch_id} 状态: {batch.status}")
+
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def collect_batch_results(client, batch):
+    """下载批处理结果，返回 {custom_id: {'content', 'usage'} 或 {'error'}}"""
+    results = {}
+
+    for file_id in [batch.output_file_id, batch.error_file_id]:
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get('response') or {}
+            body = response.get('body') or {}
+            if item.get('error') or response.get('status_code', 200) != 200 or not body.get('choices'):
+                error = item.get('error') or body.get('error') or f"HTTP {response.get('status_code')}"
+                results[item['custom_id']] = {'error': str(error)}
+            else:
+                results[item['custom_id']] = {
+                    'content': body['choices'][0]['message']['content'],
+                    'usage': body.get('usage'),
+                }
+
+    return results
+
+
+def apply_batch_results(manifest, results):
+    """将批处理结果回填到各会话的 description_NNN.json 和 result.json
+
+    返回 {session_id: 整份演示文稿的统计汇总}
+    """
+    summary = {}
+
+    for session_id, session in manifest['sessions'].items():
+        desc_dir = session['desc_dir']
+        descriptions = []
+        slide_stats = []
+
+        for i, plan in enumerate(session['slides']):
+            if plan.get('custom_id'):
+                result = results.get(plan['custom_id'], {'error': '批处理结果缺失'})
+                shard = manifest['shards'][plan.get('shard', 0)]
+                stats = {'batch_id': shard.get('batch_id'), 'image': plan.get('image'),
+                         'request_bytes': plan.get('request_bytes'), 'timing': plan.get('timing'),
+                         'input_path': plan.get('input_path')}
+                if 'error' in result:
+                    description = None
+                    stats['error'] = result['error']
+                else:
+                    description = result['content']
+                    stats['usage'] = usage_stats(result.get('usage'))
+                    if plan.get('cache_key') and description:
+                        analysis_cache.put(plan['cache_key'], description)
+                save_description(desc_dir, i, description, stats)
+            elif plan.get('reused_from'):
+                description = descriptions[plan['reused_from'] - 1]
+                stats = {
+                    'skipped_api': 'duplicate',
+                    'reused_from': plan['reused_from'],
+                    'timing': plan.get('timing'),
+                    'dedup': {'previous': plan['reused_from'], 'distance': plan['distance'], 'mode': 'reuse'},
+                }
+                if description is None:
+                    stats['error'] = f"第 {plan['reused_from']} 页分析失败，无法复用"
+                save_description(desc_dir, i, description, stats)
+            else:
+                with open(os.path.join(desc_dir, f"description_{i+1:03d}.json"), 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                description, stats = saved['description'], saved['stats']
+            descriptions.append(description)
+            slide_stats.append(stats)
+
+        result_data = {
+            'images': session['images'],
+            'descriptions': descriptions,
+            'slide_stats': slide_stats,
+            'metrics': summarize_slides(slide_stats),
+        }
+        with open(os.path.join(os.path.dirname(desc_dir), 'result.json'), 'w', encoding='utf-8') as f:
+            json.dump(result_data, f, ensure_ascii=False, indent=2)
+
+        summary[session_id] = result_data['metrics']
+
+    return summary
@@ -0,0 +1,111 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """计算文件的SHA-256摘要"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(image_hash, prompt_version, model, temperature, context=None, variant=''):
+    """根据图像摘要、提示词版本、模型、温度和上下文生成缓存键，variant用于区分请求构造方式"""
+    context_hash = hashlib.sha256((context or '').encode('utf-8')).hexdigest()
+    raw = '\n'.join([image_hash, str(prompt_version), str(model), repr(float(temperature)), context_hash, variant])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """基于SQLite的分析结果缓存，超出容量时按最近访问时间(LRU)淘汰"""
+
+    def __init__(self, db_path, max_size_bytes):
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                cache_key TEXT PRIMARY KEY,
+                description TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache (last_access)')
+        self._conn.commit()
+
+    def get(self, cache_key):
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT description FROM analysis_cache WHERE cache_key = ?', (cache_key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                'UPDATE analysis_cache SET last_access = ? WHERE cache_key = ?', (time.time(), cache_key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, cache_key, description):
+        """写入缓存并在超出容量时淘汰最久未使用的条目"""
+        size = len(description.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (cache_key, description, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (cache_key, description, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        rows = self._conn.execute('SELECT cache_key, size FROM analysis_cache ORDER BY last_access ASC').fetchall()
+        evicted = []
+        for cache_key, size in rows:
+            if total <= self.max_size_bytes:
+                break
+            evicted.append((cache_key,))
+            total -= size
+        self._conn.executemany('DELETE FROM analysis_cache WHERE cache_key = ?', evicted)
+        print(f"分析缓存超出容量，淘汰了 {len(evicted)} 条记录")
+
+    def stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+            'max_size_bytes': self.max_size_bytes,
+        }
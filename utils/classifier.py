@@ -0,0 +1,105 @@
+import math
+
+from PIL import Image
+
+# 结构性页面的固定回复，与分析提示词第一步中的回复保持一致
+STRUCTURAL_RESPONSE = "这张幻灯片属于结构性页面（封面/标题/目录/结束页），主要起组织结构作用，无需进行详细内容分析。"
+
+
+def image_entropy(gray):
+    """计算灰度图的香农熵，画面越简单熵越低"""
+    histogram = gray.histogram()
+    total = sum(histogram)
+    entropy = 0.0
+    for count in histogram:
+        if count:
+            p = count / total
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def long_run_pixels(mask, min_run):
+    """统计二值图中每行长度不小于min_run的连续前景像素数"""
+    width, height = mask.size
+    data = mask.tobytes()
+    pixels = 0
+    for row in range(height):
+        for run in data[row * width:(row + 1) * width].split(b'\x00'):
+            if len(run) >= min_run:
+                pixels += len(run)
+    return pixels
+
+
+def graphics_ratio(gray, ink_threshold=48, min_run_ratio=(0.1, 0.15)):
+    """估算非文字图形（线条、坐标轴、色块、图片）占画面的比例
+
+    与背景色（出现最多的灰度）相差超过ink_threshold的像素视为前景，
+    水平方向长于宽度10%或垂直方向长于高度15%的连续前景属于图形：
+    正常字号的文字笔画远短于这个长度，线条图即使熵很低也能识别出来。
+    """
+    histogram = gray.histogram()
+    background = histogram.index(max(histogram))
+    mask = gray.point(lambda value: 255 if abs(value - background) > ink_threshold else 0)
+
+    width, height = mask.size
+    pixels = long_run_pixels(mask, max(2, round(width * min_run_ratio[0])))
+    pixels += long_run_pixels(mask.transpose(Image.Transpose.TRANSPOSE), max(2, round(height * min_run_ratio[1])))
+    return pixels / (width * height)
+
+
+def image_content(image_path, size=320):
+    """返回幻灯片的 (灰度熵, 非文字图形比例)"""
+    with Image.open(image_path) as image:
+        gray = image.convert('L')
+        # BOX缩放保留细线条的灰度，不会被抗锯齿滤掉
+        gray.thumbnail((size, size), Image.BOX)
+    return image_entropy(gray), graphics_ratio(gray)
+
+
+def normalize_heading(line):
+    """去掉标题行的编号、项目符号和结尾标点，用于与关键词整体比较"""
+    return line.strip().lower().lstrip('0123456789.、)）-•·* ').rstrip(':：.。!！ ').strip()
+
+
+def classify_structural_page(image_path, page_num, total_pages, page_text, options):
+    """判断幻灯片是否为封面/标题/目录/结束页等结构性页面
+
+    先检查画面：熵较高或含有明显的非文字图形（示意图、图表、图片）的页面一律交给模型分析；
+    之后依据文本层字数、页面位置和首行是否恰好是关键词进行判断。
+    是结构性页面时返回判断依据，否则返回None。
+    没有文本层时无法可靠判断，一律交给模型分析。
+    """
+    if page_text is None:
+        return None
+
+    lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+    text_chars = sum(len(''.join(line.split())) for line in lines)
+    entropy, graphics = image_content(image_path)
+    evidence = {
+        'text_chars': text_chars,
+        'entropy': round(entropy, 3),
+        'graphics_ratio': round(graphics, 4),
+        'page_num': page_num,
+    }
+
+    if entropy > options['max_entropy'] or graphics > options['max_graphics_ratio']:
+        return None
+
+    # 目录页、致谢页：首行整行就是关键词（如“目录”“Thank you!”）且文字不多
+    if lines and text_chars <= options['keyword_max_text_chars']:
+        first_line = normalize_heading(lines[0])
+        for keyword in options['keywords']:
+            if first_line == keyword.lower():
+                return dict(evidence, reason='keyword', keyword=keyword)
+
+    # 首尾页：文字较少的封面或结束页
+    edge_pages = options['edge_pages']
+    is_edge_page = page_num <= edge_pages or page_num > total_pages - edge_pages
+    if is_edge_page and text_chars <= options['edge_max_text_chars']:
+        return dict(evidence, reason='edge_page')
+
+    # 中间页：只有一个标题的章节页
+    if text_chars <= options['title_max_text_chars']:
+        return dict(evidence, reason='title_only')
+
+    return None
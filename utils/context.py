@@ -0,0 +1,103 @@
+import re
+import threading
+
+from utils.engine import estimate_text_tokens
+from utils.classifier import STRUCTURAL_RESPONSE
+
+# tiktoken为可选依赖，未安装或无法加载编码表时退回到粗略估算
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+DIGEST_SECTION = '【核心知识点提炼】'
+
+
+def count_tokens(text):
+    """统计文本的token数"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return estimate_text_tokens(text)
+
+
+def extract_digest(description, fallback_chars=200):
+    """从分析结果中提取【核心知识点提炼】部分作为摘要，找不到时截取开头部分"""
+    if not description:
+        return ''
+
+    start = description.find(DIGEST_SECTION)
+    if start >= 0:
+        body = description[start + len(DIGEST_SECTION):]
+        # 截止到下一个分隔线或下一个【】标题
+        end = re.search(r'\n\s*(---|\*{0,2}【)', body)
+        if end:
+            body = body[:end.start()]
+        body = body.strip().strip('*').strip()
+        if body:
+            return body
+
+    text = description.strip()
+    return text[:fallback_chars] + ('...' if len(text) > fallback_chars else '')
+
+
+def truncate_to_tokens(text, max_tokens):
+    """按token上限截断文本"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens]) + '...'
+
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_text_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + '...'
+
+
+class ContextManager:
+    """有token预算的滚动上下文：保存每张幻灯片的精简摘要，按预算从最近的幻灯片开始拼接"""
+
+    def __init__(self, token_budget, max_slides, mode='digest'):
+        self.token_budget = token_budget
+        self.max_slides = max_slides
+        self.mode = mode
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, index, description):
+        """记录已完成幻灯片的摘要，结构性页面不计入上下文"""
+        if not description or description == STRUCTURAL_RESPONSE:
+            return
+
+        text = extract_digest(description) if self.mode == 'digest' else description
+        entry = f"幻灯片 {index+1}: {text}"
+        with self._lock:
+            self._entries[index] = (entry, count_tokens(entry))
+
+    def build(self, index):
+        """构建index之前已完成幻灯片的上下文，总token数不超过预算"""
+        if self.max_slides <= 0 or self.token_budget <= 0:
+            return ''
+
+        with self._lock:
+            candidates = sorted((j for j in self._entries if j < index), reverse=True)[:self.max_slides]
+            entries = [self._entries[j] for j in candidates]
+
+        selected = []
+        used = 0
+        for entry, tokens in entries:
+            if used + tokens > self.token_budget:
+                if not selected:
+                    # 最近一张幻灯片单独超出预算时截断保留
+                    selected.append(truncate_to_tokens(entry, self.token_budget))
+                break
+            selected.append(entry)
+            used += tokens
+
+        return "\n\n".join(reversed(selected))
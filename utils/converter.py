@@ -1,9 +1,17 @@
 import os
-import sys
+import queue
+import shutil
 import subprocess
+import threading
+import time
 import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from pdf2image import convert_from_path
+from pdf2image import pdfinfo_from_path
+
+from utils.office_pool import convert_with_cli, get_office_pool
 
 
 def install_basic_fonts():
@@ -30,39 +38,212 @@ def install_basic_fonts():
         return False
 
 
-def convert_pdf_to_images(pdf_path, output_dir, dpi=150, format='png'):
-    """将PDF文件转换为图片"""
+def get_pdf_page_count(pdf_path):
+    """使用pdfinfo获取PDF页数"""
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+
+def get_page_image_path(output_dir, file_name, page_num, format='png'):
+    """第page_num页图片的保存路径"""
+    return os.path.join(output_dir, f"{file_name}_page_{page_num:03d}.{format}")
+
+
+def get_render_workers(max_workers):
+    """并行渲染的进程数：CPU核数，不超过max_workers"""
+    return max(1, min(os.cpu_count() or 1, max_workers))
+
+
+def render_page_range(pdf_path, output_dir, first_page, last_page, dpi=150, format='png'):
+    """用一个pdftocairo进程渲染 first_page 到 last_page 页，返回按页序排列的图片路径
+
+    先输出到临时目录再重命名为 {文件名}_page_NNN 格式，多个进程同时渲染不会互相覆盖。
+    """
+    file_name = Path(pdf_path).stem
+    temp_dir = tempfile.mkdtemp(prefix='.render_', dir=output_dir)
+    try:
+        subprocess.run([
+            'pdftocairo', f"-{'jpeg' if format in ('jpg', 'jpeg') else format}",
+            '-r', str(dpi),
+            '-f', str(first_page),
+            '-l', str(last_page),
+            pdf_path,
+            os.path.join(temp_dir, 'page')
+        ], check=True, capture_output=True)
+
+        # pdftocairo输出 page-N.png（按总页数补零），按页码重命名
+        image_paths = []
+        for name in os.listdir(temp_dir):
+            page_num = int(Path(name).stem.rsplit('-', 1)[1])
+            output_file = get_page_image_path(output_dir, file_name, page_num, format)
+            os.replace(os.path.join(temp_dir, name), output_file)
+            image_paths.append((page_num, output_file))
+        return [path for _, path in sorted(image_paths)]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def iter_pdf_pages(pdf_path, output_dir, dpi=150, format='png', batch_size=4, workers=1, timings=None):
+    """分批渲染PDF页面的生成器，按页序产出每页图片的路径
+
+    每batch_size页为一批，由最多workers个pdftocairo进程并行渲染（进程数不超过CPU核数），
+    渲染结果直接写入磁盘；只在调用方取走前面的页面后才提交新的批次，领先的批次数不超过进程数。
+    渲染前先一次性提取整个PDF的文本层，保存为与各页图片同名的 .txt 文件。
+    传入timings字典时记录 pages（总页数）、workers（渲染进程数）、text_ms、
+    render_ms（从开始渲染到最后一页完成的时间）和 page_render_ms（每批渲染时间按页均摊，随渲染进度追加）。
+    """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
     # 获取文件名（不含扩展名）用于输出文件命名
     file_name = Path(pdf_path).stem
 
-    # 转换PDF为图片
-    image_paths = []
+    def render_batch(first_page, last_page):
+        started = time.perf_counter()
+        image_paths = render_page_range(pdf_path, output_dir, first_page, last_page, dpi, format)
+        return image_paths, (time.perf_counter() - started) * 1000
 
     try:
-        # 转换所有页面
-        images = convert_from_path(
-            pdf_path,
-            dpi=dpi,
-            use_pdftocairo=True,
-            thread_count=2
-        )
+        page_count = get_pdf_page_count(pdf_path)
+        batches = [(first_page, min(first_page + batch_size - 1, page_count))
+                   for first_page in range(1, page_count + 1, batch_size)]
+        workers = min(get_render_workers(workers), max(1, len(batches)))
+        if timings is not None:
+            timings['pages'] = page_count
+            timings['workers'] = workers
+            timings.setdefault('page_render_ms', [])
+
+        # 提取文本层
+        text_started = time.perf_counter()
+        extract_pdf_text(pdf_path, [get_page_image_path(output_dir, file_name, n, format)
+                                    for n in range(1, page_count + 1)])
+        if timings is not None:
+            timings['text_ms'] = round((time.perf_counter() - text_started) * 1000)
 
-        # 保存图片
-        for i, image in enumerate(images):
-            page_num = i + 1
-            output_file = os.path.join(output_dir, f"{file_name}_page_{page_num:03d}.{format}")
-            image.save(output_file, format.upper())
-            image_paths.append(output_file)
+        render_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_batch = iter(batches)
+            for batch in islice(next_batch, workers):
+                pending.append(executor.submit(render_batch, *batch))
 
-        return image_paths
+            while pending:
+                image_paths, render_ms = pending.popleft().result()
+                for batch in islice(next_batch, 1):
+                    pending.append(executor.submit(render_batch, *batch))
+
+                for output_file in image_paths:
+                    if timings is not None:
+                        timings['page_render_ms'].append(round(render_ms / len(image_paths), 1))
+                        timings['render_ms'] = round((time.perf_counter() - render_started) * 1000)
+                    yield output_file
     except Exception as e:
         print(f"PDF转图片出错: {e}")
         raise
 
 
+def convert_pdf_to_images(pdf_path, output_dir, dpi=150, format='png', timings=None, workers=1, batch_size=4):
+    """将PDF文件转换为图片，返回全部图片路径（每次调用pdftocairo渲染batch_size页）"""
+    return list(iter_pdf_pages(pdf_path, output_dir, dpi, format, batch_size=batch_size, workers=workers,
+                               timings=timings))
+
+
+def prefetch(items, queue_size):
+    """在后台线程中消费生成器，通过有界队列交给调用方
+
+    队列满时生产者暂停（例如渲染领先分析太多时暂停渲染），生产者的异常在调用方重新抛出。
+    调用方提前停止迭代时生产者随之退出。
+    """
+    buffer = queue.Queue(maxsize=max(1, queue_size))
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+
+    threading.Thread(target=produce, name='page-prefetch', daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def extract_page_text(pdf_path, page_num):
+    """使用pdftotext提取PDF单页的文本层，提取失败时返回None"""
+    try:
+        result = subprocess.run(
+            ['pdftotext', '-f', str(page_num), '-l', str(page_num), '-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=30
+        )
+        return result.stdout.decode('utf-8', errors='ignore')
+    except Exception as e:
+        print(f"提取第 {page_num} 页文本出错: {e}")
+        return None
+
+
+def get_text_path(image_path):
+    """幻灯片图片对应的文本层文件路径"""
+    return os.path.splitext(image_path)[0] + '.txt'
+
+
+def extract_pdf_text(pdf_path, image_paths):
+    """使用pdftotext一次性提取整个PDF的文本层，按页写入与各页图片同名的 .txt 文件
+
+    pdftotext以换页符分隔各页，提取失败时不写入任何文件。
+    """
+    try:
+        result = subprocess.run(
+            ['pdftotext', '-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=120
+        )
+    except Exception as e:
+        print(f"提取PDF文本层出错: {e}")
+        return
+
+    pages = result.stdout.decode('utf-8', errors='ignore').split('\f')
+    for image_path, text in zip(image_paths, pages):
+        with open(get_text_path(image_path), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def get_page_text(image_path, pdf_path=None, page_num=None):
+    """获取幻灯片的文本层，优先读取渲染时保存的 .txt 文件，没有时从PDF中提取，都不可用时返回None"""
+    text_path = get_text_path(image_path)
+    if os.path.exists(text_path):
+        with open(text_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    if pdf_path and page_num:
+        return extract_page_text(pdf_path, page_num)
+    return None
+
+
+def get_pdf_path(input_file, output_dir):
+    """获取演示文稿对应的PDF文件路径（PPT/PPTX为转换后生成的PDF）"""
+    if Path(input_file).suffix.lower() == '.pdf':
+        return input_file
+    return os.path.join(output_dir, f"{Path(input_file).stem}.pdf")
+
+
 def convert_ppt_to_pdf(ppt_path, output_dir):
     """使用多种方法尝试将PPT/PPTX转换为PDF"""
     # 确保输出目录存在
@@ -72,17 +253,21 @@ def convert_ppt_to_pdf(ppt_path, output_dir):
     file_name = Path(ppt_path).stem
     output_pdf = os.path.join(output_dir, f"{file_name}.pdf")
 
-    # 方法1: 直接使用LibreOffice转换
+    # 方法1: 交给常驻的LibreOffice进程池转换
+    pool = get_office_pool()
+    if pool is not None:
+        try:
+            print("正在使用LibreOffice进程池转换PPT/PPTX为PDF...")
+            output_pdf = pool.convert(ppt_path, output_dir)
+            print(f"成功生成PDF: {output_pdf}")
+            return output_pdf
+        except Exception as e:
+            print(f"进程池转换失败: {e}，改用命令行转换...")
+
+    # 方法2: 启动独立的LibreOffice进程转换
     try:
         print("正在使用LibreOffice转换PPT/PPTX为PDF...")
-        cmd = [
-            'soffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', output_dir,
-            ppt_path
-        ]
-        subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
+        convert_with_cli(ppt_path, output_dir)
 
         if os.path.exists(output_pdf):
             print(f"成功生成PDF: {output_pdf}")
@@ -93,14 +278,7 @@ def convert_ppt_to_pdf(ppt_path, output_dir):
 
     # 再次尝试直接转换
     try:
-        cmd = [
-            'soffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', output_dir,
-            ppt_path
-        ]
-        subprocess.run(cmd, check=True)
+        convert_with_cli(ppt_path, output_dir)
 
         if os.path.exists(output_pdf):
             print(f"成功生成PDF: {output_pdf}")
@@ -108,7 +286,7 @@ def convert_ppt_to_pdf(ppt_path, output_dir):
     except:
         print("直接转换仍然失败，尝试使用unoconv...")
 
-    # 方法2: 使用unoconv
+    # 方法3: 使用unoconv
     try:
         # 检查是否安装了unoconv
         subprocess.run(['unoconv', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -133,8 +311,11 @@ def convert_ppt_to_pdf(ppt_path, output_dir):
         raise Exception("所有转换方法均失败")
 
 
-def convert_to_images(input_file, output_dir, dpi=150):
-    """将演示文稿（PPT、PPTX或PDF）转换为图片"""
+def prepare_pdf(input_file, output_dir, timings=None):
+    """返回演示文稿对应的PDF路径，PPT/PPTX先用LibreOffice转换为PDF
+
+    传入timings字典时记录 office_ms（PPT转PDF耗时）。
+    """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
@@ -142,16 +323,26 @@ def convert_to_images(input_file, output_dir, dpi=150):
     file_ext = Path(input_file).suffix.lower()
 
     if file_ext in ['.pdf']:
-        # 直接转换PDF为图片
-        return convert_pdf_to_images(input_file, output_dir, dpi)
+        return input_file
 
     elif file_ext in ['.ppt', '.pptx']:
-        # 先将PPT/PPTX转换为PDF，再转换为图片
+        started = time.perf_counter()
         pdf_path = convert_ppt_to_pdf(input_file, output_dir)
+        if timings is not None:
+            timings['office_ms'] = round((time.perf_counter() - started) * 1000)
         if pdf_path:
-            return convert_pdf_to_images(pdf_path, output_dir, dpi)
+            return pdf_path
         else:
             raise Exception("无法转换PPT为PDF")
 
     else:
         raise Exception(f"不支持的文件类型: {file_ext}")
+
+
+def convert_to_images(input_file, output_dir, dpi=150, timings=None, workers=1, batch_size=4):
+    """将演示文稿（PPT、PPTX或PDF）转换为图片
+
+    传入timings字典时记录各阶段耗时：office_ms（PPT转PDF）、render_ms、page_render_ms 和 text_ms（提取文本层）。
+    """
+    pdf_path = prepare_pdf(input_file, output_dir, timings)
+    return convert_pdf_to_images(pdf_path, output_dir, dpi, timings=timings, workers=workers, batch_size=batch_size)
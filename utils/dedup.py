@@ -0,0 +1,52 @@
+from PIL import Image
+
+
+def dhash(image_path, hash_size=8):
+    """计算图像的差异哈希(dHash)，返回 hash_size*hash_size 位整数"""
+    with Image.open(image_path) as image:
+        gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+        # L模式每个像素一个字节
+        pixels = gray.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+    return value
+
+
+def hamming_distance(a, b):
+    """两个哈希值之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+class PageHashIndex:
+    """按页顺序建立的感知哈希索引，用于识别动画递进产生的近似重复页"""
+
+    def __init__(self, max_distance, hash_size=8):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.hashes = {}
+        # 重复链的根页面索引 {index: root_index}
+        self.roots = {}
+
+    def add(self, index, image_path):
+        """加入一页，与上一页近似时返回 (上一页索引, 距离)，否则返回None"""
+        page_hash = dhash(image_path, self.hash_size)
+        self.hashes[index] = page_hash
+
+        previous = self.hashes.get(index - 1)
+        if previous is not None:
+            distance = hamming_distance(page_hash, previous)
+            if distance <= self.max_distance:
+                self.roots[index] = self.roots.get(index - 1, index - 1)
+                return index - 1, distance
+
+        self.roots[index] = index
+        return None
+
+    def root_of(self, index):
+        """获取重复链中第一张非重复页的索引"""
+        return self.roots.get(index, index)
+
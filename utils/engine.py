@@ -0,0 +1,332 @@
+import re
+import time
+import asyncio
+import threading
+
+from openai import AsyncOpenAI, RateLimitError
+
+from utils.resilience import (
+    CircuitBreaker, LatencyTracker, is_retryable, is_upstream_failure, retry_delay,
+)
+
+
+def estimate_text_tokens(text):
+    """粗略估算文本的token数（中日韩字符约1字1token，其余约4字符1token）"""
+    if not text:
+        return 0
+    cjk_chars = len(re.findall(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]', text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+
+class TokenBucket:
+    """令牌桶，容量为每分钟配额，按秒匀速补充"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """获取满足amount所需的等待秒数，为0表示可立即获取"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """归还(正数)或追加扣除(负数)令牌"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+    def drain(self):
+        """清空令牌，用于上游返回429时让所有请求一起退避"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """进程级请求数/令牌数限流器，所有会话共享，只能在引擎事件循环中使用"""
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = None
+
+    def share(self, workers):
+        """多个worker进程各自限流时，每个进程只使用配额的 1/workers，合计不超过配置的配额
+
+        需在发出请求之前调用（worker启动时）。
+        """
+        workers = max(1, workers)
+        if self.requests_per_minute > 0:
+            self.request_bucket = TokenBucket(self.requests_per_minute / workers)
+        if self.tokens_per_minute > 0:
+            self.token_bucket = TokenBucket(self.tokens_per_minute / workers)
+
+    async def acquire(self, estimated_tokens):
+        """按FIFO顺序等待，直到请求数和令牌数配额都满足"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                wait = 0.0
+                if self.request_bucket:
+                    wait = max(wait, self.request_bucket.wait_time(1))
+                if self.token_bucket:
+                    wait = max(wait, self.token_bucket.wait_time(estimated_tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.request_bucket:
+                self.request_bucket.take(1)
+            if self.token_bucket:
+                self.token_bucket.take(estimated_tokens)
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        """根据实际用量修正预估扣除的令牌"""
+        if self.token_bucket and actual_tokens:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+
+    def penalize(self):
+        """上游限流时清空配额"""
+        if self.request_bucket:
+            self.request_bucket.drain()
+        if self.token_bucket:
+            self.token_bucket.drain()
+
+
+class AnalysisEngine:
+    """基于AsyncOpenAI的分析引擎：所有会话的API请求都在同一个事件循环中执行并共享限流器和熔断器"""
+
+    def __init__(self, api_config, rate_limit_config, resilience_config):
+        self.api_config = api_config
+        self.resilience_config = resilience_config
+        self.expected_completion_tokens = rate_limit_config['expected_completion_tokens']
+        self.limiter = RateLimiter(rate_limit_config['requests_per_minute'],
+                                   rate_limit_config['tokens_per_minute'])
+        self.breaker = CircuitBreaker(resilience_config['breaker_failure_threshold'],
+                                      resilience_config['breaker_recovery_timeout'])
+        # 非流式请求记录完整耗时，流式请求记录首个token的耗时
+        self.latency = {
+            'complete': LatencyTracker(min_samples=resilience_config['hedge_min_samples']),
+            'first_token': LatencyTracker(min_samples=resilience_config['hedge_min_samples']),
+        }
+        self._client = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='analysis-engine', daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self.api_config['api_key'],
+                base_url=self.api_config['base_url'],
+                timeout=self.api_config['timeout'],
+                # 重试由引擎统一处理
+                max_retries=0,
+            )
+        return self._client
+
+    def submit(self, coro):
+        """从任意线程向引擎提交协程，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def chat(self, messages, estimated_prompt_tokens=0, on_token=None, on_retry=None, **kwargs):
+        """阻塞调用对话接口，供同步代码使用"""
+        return self.submit(self.chat_async(messages, estimated_prompt_tokens, on_token, on_retry, **kwargs)).result()
+
+    async def chat_async(self, messages, estimated_prompt_tokens=0, on_token=None, on_retry=None, **kwargs):
+        """经过熔断器和限流器调用对话接口，返回 {'content', 'usage', 'retries', 'hedged', 'timing'}
+
+        timing 中 wait_ms 为等待熔断器、限流器和重试退避的时间，latency_ms 为各次请求的耗时之和，
+        ttfb_ms 为最后一次请求收到首个数据的耗时。
+
+        传入on_token时使用流式输出，每收到一段文本就调用 on_token(片段)；
+        可重试的错误按带抖动的指数退避重试，重试前调用 on_retry() 以便丢弃已输出的文本。
+        重试次数用尽或遇到不可重试的错误时抛出异常。
+        """
+        estimated_tokens = estimated_prompt_tokens + self.expected_completion_tokens
+        max_retries = self.api_config['max_retries']
+        attempt = 0
+        waited = 0.0
+        elapsed = 0.0
+
+        while True:
+            wait_started = time.monotonic()
+            probe = await self.breaker.acquire()
+            request_started = None
+            try:
+                await self.limiter.acquire(estimated_tokens)
+                request_started = time.monotonic()
+                waited += request_started - wait_started
+                result = await self._hedged_chat(messages, estimated_tokens, on_token, **kwargs)
+            except Exception as e:
+                if request_started is None:
+                    # 还没有发出请求（等待限流时出错），不计入耗时和熔断
+                    if probe:
+                        self.breaker.release_probe()
+                    raise
+                elapsed += time.monotonic() - request_started
+                if isinstance(e, RateLimitError):
+                    self.limiter.penalize()
+                if is_upstream_failure(e):
+                    self.breaker.record_failure()
+                elif probe:
+                    self.breaker.release_probe()
+                if not is_retryable(e) or attempt >= max_retries:
+                    raise
+
+                delay = retry_delay(e, attempt, self.resilience_config['retry_base_delay'],
+                                    self.resilience_config['retry_max_delay'])
+                attempt += 1
+                print(f"请求失败({type(e).__name__}: {e})，{delay:.1f} 秒后进行第 {attempt}/{max_retries} 次重试")
+                if on_retry:
+                    on_retry()
+                await asyncio.sleep(delay)
+                waited += delay
+                continue
+            except BaseException:
+                # 被取消时同样要让出探测名额，否则熔断器一直停留在半开状态
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            elapsed += time.monotonic() - request_started
+            self.breaker.record_success()
+            usage = result['usage']
+            self.limiter.reconcile(estimated_tokens, getattr(usage, 'total_tokens', 0) if usage else 0)
+            result['retries'] = attempt
+            result['timing'] = {
+                'wait_ms': round(waited * 1000),
+                'latency_ms': round(elapsed * 1000),
+                'ttfb_ms': round(result.pop('ttfb') * 1000),
+            }
+            return result
+
+    async def _hedged_chat(self, messages, estimated_tokens, on_token, **kwargs):
+        """发送一次请求；启用对冲时，超过近期延迟的百分位数仍未返回则补发一个相同请求，取先完成者
+
+        流式请求以首个token的到达时间为准，先输出token的请求胜出，另一个立即取消。
+        """
+        tracker = self.latency['first_token' if on_token else 'complete']
+        hedge_delay = None
+        if self.resilience_config['hedge_enabled']:
+            hedge_delay = tracker.percentile(self.resilience_config['hedge_percentile'])
+
+        tasks = []
+        winner = []
+
+        def gated_callback(task_index, started):
+            def emit(delta):
+                if not winner:
+                    winner.append(task_index)
+                    tracker.record(time.monotonic() - started)
+                    for j, task in enumerate(tasks):
+                        if j != task_index:
+                            task.cancel()
+                if winner[0] == task_index:
+                    on_token(delta)
+            return emit
+
+        async def request(task_index):
+            if task_index > 0:
+                # 对冲请求同样计入限流配额
+                await self.limiter.acquire(estimated_tokens)
+            started = time.monotonic()
+            if on_token is None:
+                result = await self._send_chat(messages, None, **kwargs)
+                tracker.record(time.monotonic() - started)
+            else:
+                result = await self._send_chat(messages, gated_callback(task_index, started), **kwargs)
+            result['hedged'] = len(tasks) > 1
+            return result
+
+        tasks.append(asyncio.ensure_future(request(0)))
+        if hedge_delay is None:
+            return await tasks[0]
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and not winner:
+                print(f"请求超过 {hedge_delay:.1f} 秒未返回，发送对冲请求")
+                tasks.append(asyncio.ensure_future(request(1)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _send_chat(self, messages, on_token, **kwargs):
+        """发送单个请求，不做重试；非流式请求的首个数据即完整响应"""
+        if on_token is not None:
+            return await self._stream_chat(messages, on_token, **kwargs)
+
+        started = time.monotonic()
+        completion = await self._get_client().chat.completions.create(
+            model=self.api_config['model'],
+            messages=messages,
+            temperature=self.api_config['temperature'],
+            **kwargs
+        )
+        return {'content': completion.choices[0].message.content, 'usage': completion.usage,
+                'ttfb': time.monotonic() - started}
+
+    async def _stream_chat(self, messages, on_token, **kwargs):
+        """流式调用对话接口并逐段回调"""
+        started = time.monotonic()
+        stream = await self._get_client().chat.completions.create(
+            model=self.api_config['model'],
+            messages=messages,
+            temperature=self.api_config['temperature'],
+            stream=True,
+            stream_options={'include_usage': True},
+            **kwargs
+        )
+
+        parts = []
+        usage = None
+        ttfb = None
+        async for chunk in stream:
+            if ttfb is None:
+                ttfb = time.monotonic() - started
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+
+        return {'content': ''.join(parts), 'usage': usage,
+                'ttfb': ttfb if ttfb is not None else time.monotonic() - started}
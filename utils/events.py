@@ -0,0 +1,79 @@
+import json
+import queue
+import threading
+
+
+def format_sse(event):
+    """把事件编码为一条SSE消息"""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    """一个订阅者的事件队列，积压超过上限时标记为溢出，由连接方断开让客户端重连后重新同步"""
+
+    def __init__(self, max_pending):
+        self.events = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+
+class EventBus:
+    """进程内的发布/订阅事件总线，按主题（会话ID或 'history'）分发事件"""
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        subscription = Subscription(self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, topic, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(topic, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(topic, None)
+
+    def publish(self, topic, event):
+        """向主题的所有订阅者推送事件，不会因为慢速订阅者而阻塞"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, []))
+        for subscription in subscribers:
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return bool(self._subscribers.get(topic))
+
+    def stream(self, topic, subscription, initial_events=(), keepalive=15, end_types=('end',)):
+        """生成SSE消息流：先发送initial_events（当前状态快照），再持续转发主题上的事件
+
+        收到end_types中的事件后结束；订阅者积压溢出时也结束，客户端重连后会重新收到快照。
+        调用方需先subscribe再生成快照，避免两者之间发布的事件丢失。
+        """
+        try:
+            for event in initial_events:
+                yield format_sse(event)
+                if event['type'] in end_types:
+                    return
+
+            while not subscription.overflowed:
+                try:
+                    event = subscription.events.get(timeout=keepalive)
+                except queue.Empty:
+                    # 保持连接
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield format_sse(event)
+                if event['type'] in end_types:
+                    return
+        finally:
+            self.unsubscribe(topic, subscription)
@@ -0,0 +1,61 @@
+def _percentile(values, percent):
+    """计算百分位数，没有数据时返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _average(values):
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def summarize_slides(slide_stats, conversion=None):
+    """汇总整份演示文稿的耗时、token和请求体积统计
+
+    slide_stats 为每张幻灯片的统计信息（description_NNN.json 中的 stats），
+    conversion 为 convert_to_images 记录的转换耗时。
+    """
+    slide_stats = [stats for stats in slide_stats if stats]
+    usages = [stats['usage'] for stats in slide_stats if stats.get('usage')]
+    timings = [stats['timing'] for stats in slide_stats if stats.get('timing')]
+    images = [stats['image'] for stats in slide_stats if stats.get('image')]
+
+    def timing_values(name):
+        return [timing[name] for timing in timings if timing.get(name) is not None]
+
+    latencies = timing_values('latency_ms')
+    summary = {
+        'slides': len(slide_stats),
+        # 打包请求只在第一页计一次调用
+        'api_calls': sum(1 for stats in slide_stats
+                         if stats.get('usage') and not (stats.get('pack') or {}).get('position')),
+        'failed': sum(1 for stats in slide_stats if stats.get('error')),
+        'cache_hits': sum(1 for stats in slide_stats if stats.get('cache_hit')),
+        'skipped': sum(1 for stats in slide_stats if stats.get('skipped_api')),
+        'text_path': sum(1 for stats in slide_stats if stats.get('input_path') == 'text'),
+        'image_path': sum(1 for stats in slide_stats if stats.get('input_path') == 'image'),
+        'retries': sum(stats.get('retries') or 0 for stats in slide_stats),
+        'hedged': sum(1 for stats in slide_stats if stats.get('hedged')),
+        'prompt_tokens': sum(usage['prompt_tokens'] for usage in usages),
+        'completion_tokens': sum(usage['completion_tokens'] for usage in usages),
+        'cached_tokens': sum(usage['cached_tokens'] for usage in usages),
+        # 无法按页拆分而作废的打包请求所用的token（cached_tokens 已包含在 prompt_tokens 中）
+        'pack_fallback_tokens': sum(
+            usage['prompt_tokens'] + usage['completion_tokens']
+            for usage in (stats['pack_fallback'].get('usage') for stats in slide_stats
+                          if isinstance(stats.get('pack_fallback'), dict))
+            if usage),
+        'request_bytes': sum(stats.get('request_bytes') or 0 for stats in slide_stats),
+        'saved_bytes': sum(image['saved_bytes'] for image in images),
+        'render_ms': round(sum(timing_values('render_ms'))),
+        'encode_ms': round(sum(image.get('encode_ms') or 0 for image in images)),
+        'wait_ms': round(sum(timing_values('wait_ms'))),
+        'api_latency_ms': round(sum(latencies)),
+        'latency_ms_avg': _average(latencies),
+        'latency_ms_p95': _percentile(latencies, 95),
+        'ttfb_ms_avg': _average(timing_values('ttfb_ms')),
+    }
+    if conversion:
+        summary['conversion'] = conversion
+    return summary
@@ -0,0 +1,275 @@
+import os
+import time
+import atexit
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+from config_manager import config
+
+# python3-uno为可选依赖（随LibreOffice安装的系统包，无法通过pip安装），不可用时退回命令行转换
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except Exception:
+    uno = None
+
+# 文件锁只在类Unix系统可用，不可用时只能以单个服务进程运行，固定使用第0个槽位
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _properties(**values):
+    """构造UNO调用所需的PropertyValue元组"""
+    properties = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        properties.append(prop)
+    return tuple(properties)
+
+
+def profile_url(profile_dir):
+    """LibreOffice -env:UserInstallation 参数使用的用户配置目录URL"""
+    return Path(os.path.abspath(profile_dir)).as_uri()
+
+
+class OfficeWorker:
+    """一个常驻的无界面LibreOffice进程，使用独立的用户配置目录，通过UNO套接字接收转换任务"""
+
+    def __init__(self, index, port, profile_dir, startup_timeout=30):
+        self.index = index
+        self.port = port
+        self.profile_dir = profile_dir
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+        self.jobs = 0
+
+    def start(self):
+        """启动soffice进程并建立UNO连接"""
+        self.stop()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.process = subprocess.Popen([
+            'soffice',
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', '--nolockcheck',
+            f"-env:UserInstallation={profile_url(self.profile_dir)}",
+            f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                # 首次启动需要初始化用户配置目录，等待监听端口就绪
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice进程 {self.index} 启动失败")
+                time.sleep(0.5)
+
+        self.desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        self.jobs = 0
+        print(f"LibreOffice进程 {self.index} 已就绪（端口 {self.port}）")
+
+    def is_healthy(self):
+        """进程仍在运行且UNO连接可以响应"""
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, input_path, output_pdf):
+        """将演示文稿转换为PDF"""
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(input_path)), '_blank', 0,
+            _properties(Hidden=True, ReadOnly=True))
+        if document is None:
+            raise RuntimeError(f"LibreOffice无法打开文件: {input_path}")
+        try:
+            document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_pdf)),
+                                _properties(FilterName='impress_pdf_Export'))
+        finally:
+            document.close(True)
+        self.jobs += 1
+
+    def kill(self):
+        """强制结束进程，用于中断超时的转换"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self):
+        """关闭进程"""
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+
+def claim_pool_slot(profile_dir):
+    """为当前服务进程占用一个进程池槽位，返回 (槽位序号, 锁文件)
+
+    多个服务进程（如多个gunicorn worker）各自占用不同的槽位，按槽位使用互不重叠的端口和用户配置目录；
+    锁文件需要在进程存活期间保持打开，进程退出时锁自动释放，槽位可由之后启动的进程复用。
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    if fcntl is None:
+        return 0, None
+
+    slot = 0
+    while True:
+        lock_file = open(os.path.join(profile_dir, f"slot_{slot}.lock"), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return slot, lock_file
+        except OSError:
+            lock_file.close()
+            slot += 1
+
+
+class OfficePool:
+    """LibreOffice常驻进程池
+
+    每个进程使用独立的用户配置目录和端口，多个转换任务可以同时进行而不会争用配置目录。
+    每个服务进程的进程池占用一个槽位（slot），第 slot 个槽位的第 i 个进程使用端口
+    base_port + slot * pool_size + i 和配置目录 profile_dir/slot_<slot>/worker_<i>，
+    多个服务进程的进程池互不干扰。
+    进程在首次使用时启动（可调用 warm_up 提前启动），之后常驻以省去每次冷启动的时间；
+    每个任务前做健康检查，处理 max_jobs_per_worker 个任务后重启进程以释放内存，
+    转换超过 job_timeout 秒时结束该进程，下次使用时重新启动。
+    """
+
+    def __init__(self, pool_size, base_port, profile_dir, job_timeout=120, max_jobs_per_worker=50,
+                 startup_timeout=30, slot=0):
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        pool_size = max(1, pool_size)
+        self.workers = [
+            OfficeWorker(i, base_port + slot * pool_size + i,
+                         os.path.join(profile_dir, f"slot_{slot}", f"worker_{i}"), startup_timeout)
+            for i in range(pool_size)
+        ]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def _ensure_ready(self, worker):
+        """确保进程可用：未启动、健康检查失败或已达到任务上限时（重新）启动"""
+        if self.max_jobs_per_worker > 0 and worker.jobs >= self.max_jobs_per_worker:
+            print(f"LibreOffice进程 {worker.index} 已处理 {worker.jobs} 个任务，重启以释放资源")
+            worker.start()
+        elif not worker.is_healthy():
+            worker.start()
+
+    def convert(self, input_path, output_dir):
+        """将PPT/PPTX转换为PDF，返回PDF路径；所有进程都忙时等待空闲进程"""
+        output_pdf = os.path.join(output_dir, f"{Path(input_path).stem}.pdf")
+        worker = self.idle.get()
+        try:
+            self._ensure_ready(worker)
+
+            # 超时后结束进程，阻塞中的UNO调用随之抛出异常
+            timer = threading.Timer(self.job_timeout, worker.kill)
+            timer.daemon = True
+            timer.start()
+            started = time.perf_counter()
+            try:
+                worker.convert(input_path, output_pdf)
+            except Exception:
+                if not timer.is_alive():
+                    raise TimeoutError(f"LibreOffice转换超过 {self.job_timeout} 秒")
+                raise
+            finally:
+                timer.cancel()
+            print(f"LibreOffice进程 {worker.index} 转换完成，用时 {time.perf_counter() - started:.2f} 秒")
+        except Exception:
+            # 出错的进程状态未知，下次使用时重新启动
+            worker.stop()
+            raise
+        finally:
+            self.idle.put(worker)
+
+        if not os.path.exists(output_pdf):
+            raise RuntimeError(f"LibreOffice未生成PDF: {output_pdf}")
+        return output_pdf
+
+    def warm_up(self):
+        """提前启动所有进程"""
+        for _ in self.workers:
+            worker = self.idle.get()
+            try:
+                self._ensure_ready(worker)
+            except Exception as e:
+                print(f"启动LibreOffice进程 {worker.index} 失败: {e}")
+            finally:
+                self.idle.put(worker)
+
+    def shutdown(self):
+        """关闭所有进程"""
+        for worker in self.workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# 本进程占用的槽位锁文件，进程存活期间保持打开
+_slot_lock_file = None
+
+
+def get_office_pool():
+    """返回本进程的LibreOffice进程池，未启用或python3-uno不可用时返回None"""
+    global _pool, _slot_lock_file
+    if uno is None:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            office_config = config.get_office_config()
+            if not office_config['pool_enabled']:
+                return None
+            slot, _slot_lock_file = claim_pool_slot(office_config['profile_dir'])
+            _pool = OfficePool(office_config['pool_size'], office_config['base_port'],
+                               office_config['profile_dir'], office_config['job_timeout'],
+                               office_config['max_jobs_per_worker'], office_config['startup_timeout'], slot)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def convert_with_cli(input_path, output_dir, timeout=None):
+    """启动一次性的soffice命令行转换，使用临时的独立用户配置目录，可与其他转换同时进行"""
+    profile_dir = tempfile.mkdtemp(prefix='soffice_profile_')
+    try:
+        subprocess.run([
+            'soffice',
+            f"-env:UserInstallation={profile_url(profile_dir)}",
+            '--headless',
+            '--convert-to', 'pdf',
+            '--outdir', output_dir,
+            input_path
+        ], check=True, stderr=subprocess.PIPE, timeout=timeout)
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    return os.path.join(output_dir, f"{Path(input_path).stem}.pdf")
@@ -0,0 +1,132 @@
+import io
+import os
+import time
+import base64
+
+from PIL import Image, ImageChops
+
+# 支持的输出格式及对应的MIME类型
+IMAGE_MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'png': 'image/png',
+}
+
+# base64分块编码的块大小，必须是3的倍数
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def preprocess_signature(options):
+    """生成预处理参数签名，预处理参数变化时缓存随之失效"""
+    return 'edge={max_long_edge};fmt={format};q={quality};trim={trim_border};detail={image_detail}'.format(**options)
+
+
+def trim_whitespace_border(image, threshold=10, padding=8):
+    """裁剪幻灯片四周接近背景色的空白边框"""
+    rgb = image.convert('RGB')
+    background = Image.new('RGB', rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert('L')
+    bbox = diff.point(lambda p: 255 if p > threshold else 0).getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    bbox = (max(0, left - padding), max(0, top - padding),
+            min(image.width, right + padding), min(image.height, bottom + padding))
+    if bbox == (0, 0, image.width, image.height):
+        return image
+    return image.crop(bbox)
+
+
+def _base64_stream(stream):
+    """分块读取二进制流并编码为base64字符串"""
+    parts = []
+    for chunk in iter(lambda: stream.read(BASE64_CHUNK_SIZE), b''):
+        parts.append(base64.b64encode(chunk).decode('ascii'))
+    return ''.join(parts)
+
+
+def _prepare_original(image_path, original_bytes):
+    """不做任何处理，直接分块编码原文件"""
+    mime_type = 'image/png' if image_path.lower().endswith('.png') else 'image/jpeg'
+    with open(image_path, 'rb') as f:
+        encoded = _base64_stream(f)
+    with Image.open(image_path) as image:
+        width, height = image.size
+    stats = {
+        'original_bytes': original_bytes,
+        'encoded_bytes': original_bytes,
+        'base64_bytes': len(encoded),
+        'saved_bytes': 0,
+        'width': width,
+        'height': height,
+    }
+    return f"data:{mime_type};base64,{encoded}", stats
+
+
+def _timed(prepared, started):
+    """在统计信息中记录预处理耗时"""
+    data_url, stats = prepared
+    stats['encode_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return data_url, stats
+
+
+def prepare_image(image_path, options):
+    """按配置对幻灯片图像进行缩放、裁边和重新编码，返回 (data_url, 统计信息)
+
+    原始文件由PIL直接从磁盘解码、重新编码结果按块转为base64后立即释放，
+    避免原始字节、编码字节和base64字符串同时驻留内存。
+    """
+    started = time.perf_counter()
+    original_bytes = os.path.getsize(image_path)
+    output_format = options['format'].lower()
+
+    if output_format == 'original':
+        return _timed(_prepare_original(image_path, original_bytes), started)
+
+    if output_format not in IMAGE_MIME_TYPES:
+        raise ValueError(f"不支持的图像格式: {output_format}")
+
+    with Image.open(image_path) as source:
+        image = source
+        if options['trim_border']:
+            image = trim_whitespace_border(image)
+
+        max_long_edge = options['max_long_edge']
+        if max_long_edge and max(image.size) > max_long_edge:
+            scale = max_long_edge / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS)
+
+        if output_format == 'jpeg' and image.mode != 'RGB':
+            # JPEG不支持透明通道，合成到白色背景上
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.split()[3])
+
+        width, height = image.size
+        buffer = io.BytesIO()
+        save_kwargs = {'optimize': True}
+        if output_format in ('jpeg', 'webp'):
+            save_kwargs['quality'] = options['quality']
+        image.save(buffer, output_format.upper(), **save_kwargs)
+
+    encoded_bytes = buffer.tell()
+    if encoded_bytes >= original_bytes:
+        # 重新编码后反而更大（如内容简单的小PNG），直接上传原文件
+        buffer.close()
+        return _timed(_prepare_original(image_path, original_bytes), started)
+
+    buffer.seek(0)
+    encoded = _base64_stream(buffer)
+    buffer.close()
+
+    stats = {
+        'original_bytes': original_bytes,
+        'encoded_bytes': encoded_bytes,
+        'base64_bytes': len(encoded),
+        'saved_bytes': original_bytes - encoded_bytes,
+        'width': width,
+        'height': height,
+    }
+    return _timed((f"data:{IMAGE_MIME_TYPES[output_format]};base64,{encoded}", stats), started)
@@ -0,0 +1,119 @@
+import time
+import random
+import asyncio
+from collections import deque
+
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+# 可以重试的HTTP状态码，其余4xx说明请求本身有问题，重试没有意义
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+def is_retryable(error):
+    """判断一次失败的请求是否值得重试"""
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    if isinstance(error, (APIConnectionError, ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # 流式读取中途断开时，底层HTTP库的异常不会被SDK包装
+    return type(error).__module__.split('.')[0].startswith('httpx')
+
+
+def is_upstream_failure(error):
+    """判断失败是否说明上游服务不可用（限流说明服务仍然在线，不计入熔断）"""
+    return is_retryable(error) and not isinstance(error, RateLimitError)
+
+
+def retry_delay(error, attempt, base_delay, max_delay):
+    """计算第attempt次重试前的等待秒数
+
+    上游通过Retry-After指明等待时间时优先采用，
+    否则使用带完全抖动的指数退避，避免大量请求同时重试。
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return min(max_delay, float(headers['retry-after-ms']) / 1000)
+            if headers.get('retry-after'):
+                return min(max_delay, float(headers['retry-after']))
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """熔断器，所有会话共享，只能在引擎事件循环中使用
+
+    连续失败达到阈值后进入断开状态，暂停所有请求 recovery_timeout 秒；
+    之后放行一个探测请求（半开状态），成功则恢复，上游失败则继续断开，
+    其他结果（限流、请求本身的错误、被取消）让出探测名额，由下一个请求重新探测。
+    """
+
+    def __init__(self, failure_threshold, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+
+    async def acquire(self):
+        """等待直到允许发送请求，当前请求是探测请求时返回True"""
+        if self.failure_threshold <= 0:
+            return False
+
+        while True:
+            if self.state == 'closed':
+                return False
+            if self.state == 'open':
+                remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+                if remaining <= 0:
+                    # 由当前请求充当探测请求
+                    self.state = 'half_open'
+                    return True
+                await asyncio.sleep(remaining)
+            else:
+                # 探测请求尚未返回
+                await asyncio.sleep(1)
+
+    def record_success(self):
+        if self.state != 'closed':
+            print("上游服务已恢复，熔断器闭合")
+        self.state = 'closed'
+        self.failures = 0
+
+    def release_probe(self):
+        """探测请求的结果不能说明上游是否可用，让出探测名额"""
+        if self.state == 'half_open':
+            self.state = 'open'
+            self.opened_at = time.monotonic() - self.recovery_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                print(f"上游服务连续失败 {self.failures} 次，暂停请求 {self.recovery_timeout} 秒")
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """记录最近一段时间的请求延迟，用于计算对冲请求的触发时机"""
+
+    def __init__(self, window=200, min_samples=10):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """返回延迟的百分位数，样本不足时返回None"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
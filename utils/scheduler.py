@@ -0,0 +1,136 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+class JobQueue:
+    """有并发上限的任务队列：最多max_workers个任务同时运行，其余按优先级排队
+
+    优先级数值小的先运行，相同时先提交的先运行。每个任务带有预估耗时，
+    用于估算排队任务的开始时间；任务完成后用实际耗时修正每单位工作量的耗时（指数移动平均）。
+    """
+
+    def __init__(self, name, max_workers, seconds_per_unit):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.seconds_per_unit = seconds_per_unit
+        self._pending = []
+        self._running = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, job_id, func, priority=0, units=1):
+        """提交任务，units为工作量（如页数），用于估算耗时"""
+        with self._condition:
+            heapq.heappush(self._pending, (priority, next(self._sequence), job_id, func, units))
+            self._condition.notify()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                _, _, job_id, func, units = heapq.heappop(self._pending)
+                started = time.monotonic()
+                self._running[job_id] = (started, units)
+
+            try:
+                func()
+            except Exception as e:
+                print(f"{self.name} 任务 {job_id} 出错: {e}")
+            finally:
+                elapsed = time.monotonic() - started
+                with self._condition:
+                    self._running.pop(job_id, None)
+                    if units > 0:
+                        self.seconds_per_unit = 0.8 * self.seconds_per_unit + 0.2 * elapsed / units
+
+    def estimate(self):
+        """估算排队任务的位置和开始时间 {job_id: (位置, 预计多少秒后开始)}，调用方需持有锁"""
+        now = time.monotonic()
+        # 每个运行槽位预计空闲的时间
+        slots = [max(0.0, started + units * self.seconds_per_unit - now)
+                 for started, units in self._running.values()]
+        slots += [0.0] * (self.max_workers - len(slots))
+        heapq.heapify(slots)
+
+        estimates = {}
+        for position, (_, _, job_id, _, units) in enumerate(sorted(self._pending), 1):
+            start = heapq.heappop(slots)
+            estimates[job_id] = (position, start)
+            heapq.heappush(slots, start + units * self.seconds_per_unit)
+        return estimates
+
+    def queue_info(self, job_id):
+        """返回排队信息，任务不在排队时返回None"""
+        with self._condition:
+            estimate = self.estimate().get(job_id)
+        if estimate is None:
+            return None
+        position, start = estimate
+        return {'stage': self.name, 'position': position, 'estimated_start_seconds': round(start)}
+
+    def next_start(self):
+        """排在最前面的任务预计多少秒后开始，没有排队任务时返回0"""
+        with self._condition:
+            estimates = self.estimate()
+        return min((start for _, start in estimates.values()), default=0)
+
+
+class JobScheduler:
+    """会话处理调度器
+
+    每个会话先进入转换队列（PPT/PPTX转PDF并读取页数，按提交顺序），
+    再进入分析队列（逐页渲染和分析），分析队列按页数短作业优先，
+    排队时间每过一分钟优先级提高 aging_pages_per_minute 页，避免大文件一直排不上。
+    两个队列中排队（未开始运行）的会话总数达到 max_queue 时拒绝新的会话。
+    """
+
+    def __init__(self, conversion_workers, analysis_workers, max_queue, seconds_per_page=10.0,
+                 seconds_per_conversion=5.0, aging_pages_per_minute=10):
+        self.conversion = JobQueue('conversion', conversion_workers, seconds_per_conversion)
+        self.analysis = JobQueue('analysis', analysis_workers, seconds_per_page)
+        self.max_queue = max_queue
+        self.aging_pages_per_minute = aging_pages_per_minute
+
+    def is_full(self):
+        return self.max_queue > 0 and len(self.conversion) + len(self.analysis) >= self.max_queue
+
+    def retry_after(self):
+        """队列已满时建议客户端等待的秒数：最早有排队任务开始运行的时间"""
+        waits = [queue.next_start() for queue in (self.conversion, self.analysis) if len(queue)]
+        return max(1, min(600, round(min(waits, default=1))))
+
+    def submit(self, job_id, analyze, convert=None, pages=None):
+        """提交会话
+
+        convert 返回页数，返回None表示转换失败，不再进入分析队列；
+        不需要转换时（如恢复已渲染的会话）直接传入pages，跳过转换队列。
+        """
+        if convert is None:
+            self._submit_analysis(job_id, analyze, pages or 1)
+            return
+
+        def run_conversion():
+            page_count = convert()
+            if page_count is not None:
+                self._submit_analysis(job_id, analyze, page_count)
+
+        self.conversion.submit(job_id, run_conversion)
+
+    def _submit_analysis(self, job_id, analyze, pages):
+        # 优先级随排队时间线性提高，等价于把提交时间折算为页数加到优先级上
+        priority = pages + time.time() / 60 * self.aging_pages_per_minute
+        self.analysis.submit(job_id, analyze, priority, units=pages)
+
+    def queue_info(self, job_id):
+        """返回会话的排队信息（所在队列、位置和预计开始时间），未在排队时返回None"""
+        return self.conversion.queue_info(job_id) or self.analysis.queue_info(job_id)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# 有独立列（可查询、可建索引）的字段，其余字段序列化为JSON保存在extra列中
+COLUMNS = ('session_id', 'original_filename', 'new_filename', 'created_at', 'status',
+           'total_images', 'processed_images')
+
+
+class SessionStore:
+    """会话（历史记录）存储，SQLite WAL模式
+
+    每条记录一行，created_at和status建有索引，用于按时间排序、淘汰最早的记录和恢复未完成的会话。
+    更新在事务中只写入对应的一行；逐张幻灯片的进度通过 update_progress 暂存在内存中，
+    每隔 flush_interval 秒合并为一个事务写入（读取时会合并尚未写入的进度），
+    状态变化等其他更新会立即写入。
+    """
+
+    def __init__(self, db_path, flush_interval=2.0):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    original_filename TEXT,
+                    new_filename TEXT,
+                    created_at TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total_images INTEGER NOT NULL DEFAULT 0,
+                    processed_images INTEGER NOT NULL DEFAULT 0,
+                    extra TEXT NOT NULL DEFAULT '{}'
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @staticmethod
+    def _to_row(record):
+        extra = {key: value for key, value in record.items() if key not in COLUMNS}
+        return (record['session_id'], record.get('original_filename'), record.get('new_filename'),
+                record.get('created_at', ''), record.get('status', ''),
+                record.get('total_images') or 0, record.get('processed_images') or 0,
+                json.dumps(extra, ensure_ascii=False))
+
+    def _to_record(self, row):
+        record = {key: row[key] for key in COLUMNS}
+        record.update(json.loads(row['extra']))
+        record.update(self._pending.get(record['session_id'], {}))
+        return record
+
+    def _write(self, records):
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO sessions ({', '.join(COLUMNS)}, extra) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+            [self._to_row(record) for record in records]
+        )
+
+    def get(self, session_id):
+        """返回一条记录，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+            return self._to_record(row) if row else None
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def all(self, newest_first=True, limit=None):
+        """按创建时间排序返回记录"""
+        order = 'DESC' if newest_first else 'ASC'
+        sql = f"SELECT * FROM sessions ORDER BY created_at {order}"
+        params = ()
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = (limit,)
+        with self._lock:
+            return [self._to_record(row) for row in self._conn.execute(sql, params)]
+
+    def by_status(self, statuses):
+        """返回处于指定状态的记录"""
+        statuses = list(statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM sessions WHERE status IN ({', '.join('?' * len(statuses))}) ORDER BY created_at",
+                statuses
+            ).fetchall()
+            return [self._to_record(row) for row in rows]
+
+    def add(self, record):
+        """新增或覆盖一条记录"""
+        with self._lock, self._conn:
+            self._pending.pop(record['session_id'], None)
+            self._write([record])
+
+    def add_many(self, records):
+        """在一个事务中写入多条记录"""
+        with self._lock, self._conn:
+            for record in records:
+                self._pending.pop(record['session_id'], None)
+            self._write(records)
+
+    def update(self, session_id, **fields):
+        """立即更新记录的字段（连同尚未写入的进度），记录不存在时返回False"""
+        with self._lock, self._conn:
+            record = self.get(session_id)
+            if record is None:
+                return False
+            self._pending.pop(session_id, None)
+            record.update(fields)
+            self._write([record])
+            return True
+
+    def update_progress(self, session_id, **fields):
+        """更新进度字段，暂存在内存中批量写入，记录不存在时返回False"""
+        with self._lock:
+            if session_id not in self._pending and session_id not in self:
+                return False
+            self._pending.setdefault(session_id, {}).update(fields)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+            return True
+
+    def flush(self):
+        """把暂存的进度在一个事务中写入数据库"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            with self._conn:
+                records = []
+                for session_id, fields in pending.items():
+                    row = self._conn.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+                    if row:
+                        record = self._to_record(row)
+                        record.update(fields)
+                        records.append(record)
+                self._write(records)
+
+    def delete(self, session_id):
+        """删除记录"""
+        with self._lock, self._conn:
+            self._pending.pop(session_id, None)
+            self._conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def import_json(self, json_path):
+        """导入旧版 history.json 中的记录，只在首次使用时导入一次，返回导入的条数"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'history_json_imported'").fetchone():
+                return 0
+            records = {}
+            if os.path.exists(json_path):
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+            new_records = [dict(record, session_id=session_id) for session_id, record in records.items()
+                           if session_id not in self]
+            with self._conn:
+                self._write(new_records)
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('history_json_imported', ?)",
+                                   (os.path.abspath(json_path),))
+            return len(new_records)
+
+    def claim(self, key, value):
+        """在排他事务中把 meta 中的 key 设为 value，已经是 value 时返回False
+
+        用于多个进程中只由一个进程执行某项操作：各进程传入相同的 value，只有第一个返回True。
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+                if row and row[0] == value:
+                    self._conn.rollback()
+                    return False
+                self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+                self._conn.commit()
+                return True
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# 只在处理进程内使用的字段，不写入共享存储（模型流式输出只通过本进程的事件推送）
+LOCAL_FIELDS = ('streaming',)
+
+
+class TaskStore:
+    """处理任务状态存储接口，按会话ID存取 create_task 生成的任务字典
+
+    处理会话的进程持有任务字典并直接修改其中的字段，修改后调用 mark_changed，
+    由后端决定何时同步给其他进程；任务处理结束（完成或出错）后调用 release。
+    多个线程修改同一个任务时，修改字段和调用 mark_changed 都需持有 lock。
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+    def __contains__(self, session_id):
+        raise NotImplementedError
+
+    def __getitem__(self, session_id):
+        raise NotImplementedError
+
+    def __setitem__(self, session_id, task):
+        raise NotImplementedError
+
+    def __delitem__(self, session_id):
+        raise NotImplementedError
+
+    def is_local(self, session_id):
+        """任务是否由本进程处理（处理进度和实时输出的事件只在本进程内推送）"""
+        raise NotImplementedError
+
+    def mark_changed(self, session_id, *fields, index=None):
+        """本进程修改了任务的 fields 字段
+
+        index 不为None时只修改了这些列表字段中的第 index 项；不传 fields 时视为整个任务都已修改。
+        """
+
+    def release(self, session_id):
+        """任务处理结束，不会再被本进程修改"""
+
+    def sync(self):
+        """把本进程中的修改写入共享存储"""
+
+    def migrate(self):
+        """清理旧版本的存储结构，多个进程共享存储时只需由其中一个进程执行一次"""
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内存中的任务状态，只能在单个进程中使用"""
+
+    def __init__(self):
+        super().__init__()
+        self._tasks = {}
+
+    def __contains__(self, session_id):
+        return session_id in self._tasks
+
+    def __getitem__(self, session_id):
+        return self._tasks[session_id]
+
+    def __setitem__(self, session_id, task):
+        self._tasks[session_id] = task
+
+    def __delitem__(self, session_id):
+        del self._tasks[session_id]
+
+    def is_local(self, session_id):
+        return session_id in self._tasks
+
+
+class SqliteTaskStore(TaskStore):
+    """保存在SQLite（WAL模式）中的任务状态，可由多个进程（如多个gunicorn worker）共享
+
+    处理会话的进程在内存中持有任务字典，mark_changed 时立即序列化被修改的字段，
+    每隔 sync_interval 秒由后台线程把序列化后的值写入数据库（每个任务一个事务），
+    后台线程不读取处理线程正在修改的任务字典；其他进程读取时从数据库加载最新写入的状态。
+    每个字段单独一行，列表字段（图片、描述、统计）中的每一项也可以单独一行，
+    分析完一张幻灯片只写入这一页的描述和统计，不会重新序列化整个任务。
+    """
+
+    def __init__(self, db_path, sync_interval=0.5):
+        super().__init__()
+        self.db_path = db_path
+        self.sync_interval = sync_interval
+        self._local = {}
+        # {session_id: (是否重写整个任务, {(字段, 列表项序号或None): 序列化后的值})}
+        self._dirty = {}
+        self._lock = threading.RLock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # item 为 -1 时 value 是整个字段的值，否则是列表字段中第 item 项的值
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_fields (
+                    session_id TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    item INTEGER NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (session_id, field, item)
+                )
+            """)
+
+        threading.Thread(target=self._sync_loop, name='task-store-sync', daemon=True).start()
+
+    def _exists(self, session_id):
+        return self._conn.execute(
+            'SELECT 1 FROM task_sessions WHERE session_id = ?', (session_id,)
+        ).fetchone() is not None
+
+    def _load(self, session_id):
+        with self._lock:
+            if not self._exists(session_id):
+                return None
+            rows = self._conn.execute(
+                'SELECT field, item, value FROM task_fields WHERE session_id = ? ORDER BY field, item',
+                (session_id,)
+            ).fetchall()
+        task = {}
+        for field, item, value in rows:
+            if item < 0:
+                task[field] = json.loads(value)
+                continue
+            items = task.setdefault(field, [])
+            while len(items) <= item:
+                items.append(None)
+            items[item] = json.loads(value)
+        task['streaming'] = {}
+        return task
+
+    def __contains__(self, session_id):
+        if session_id in self._local:
+            return True
+        with self._lock:
+            return self._exists(session_id)
+
+    def __getitem__(self, session_id):
+        task = self._local.get(session_id)
+        if task is None:
+            task = self._load(session_id)
+        if task is None:
+            raise KeyError(session_id)
+        return task
+
+    def __setitem__(self, session_id, task):
+        with self.lock:
+            changes = self._snapshot(task)
+        with self._lock, self._conn:
+            self._local[session_id] = task
+            self._dirty.pop(session_id, None)
+            self._conn.execute('INSERT OR REPLACE INTO task_sessions (session_id, updated_at) VALUES (?, ?)',
+                               (session_id, time.time()))
+            self._write_fields(session_id, True, changes)
+
+    def __delitem__(self, session_id):
+        with self._lock, self._conn:
+            self._local.pop(session_id, None)
+            self._dirty.pop(session_id, None)
+            self._conn.execute('DELETE FROM task_sessions WHERE session_id = ?', (session_id,))
+            self._conn.execute('DELETE FROM task_fields WHERE session_id = ?', (session_id,))
+
+    def is_local(self, session_id):
+        return session_id in self._local
+
+    @staticmethod
+    def _snapshot(task, fields=None, index=None):
+        """序列化任务的字段（fields为None时为所有共享字段），返回 {(字段, 列表项序号或None): 值}"""
+        if fields is None:
+            fields = [field for field in task if field not in LOCAL_FIELDS]
+        return {(field, index): json.dumps(task[field] if index is None else task[field][index], ensure_ascii=False)
+                for field in fields}
+
+    def mark_changed(self, session_id, *fields, index=None):
+        with self.lock:
+            task = self._local.get(session_id)
+            if task is None:
+                return
+            changes = self._snapshot(task, fields or None, index)
+            with self._lock:
+                rewrite, pending = self._dirty.get(session_id, (False, {}))
+                if index is not None:
+                    # 同一字段整体的修改尚未写入时，重新序列化整个字段，不写入单独的列表项
+                    whole = [field for field in fields if (field, None) in pending]
+                    changes = {key: value for key, value in changes.items() if key[0] not in whole}
+                    changes.update(self._snapshot(task, whole))
+                for field in {field for field, item in changes if item is None}:
+                    for key in [key for key in pending if key[0] == field and key[1] is not None]:
+                        del pending[key]
+                pending.update(changes)
+                self._dirty[session_id] = (rewrite or not fields, pending)
+
+    def release(self, session_id):
+        """立即重写整个任务的最终状态，之后本进程也从数据库读取该任务"""
+        with self.lock, self._lock:
+            task = self._local.get(session_id)
+            if task is None:
+                return
+            self._dirty[session_id] = (True, self._snapshot(task))
+            self._write([session_id])
+            self._local.pop(session_id, None)
+
+    def _write_fields(self, session_id, rewrite, changes):
+        """写入序列化后的字段值 {(字段, 列表项序号或None): 值}，rewrite为True时先删除任务已写入的所有字段"""
+        if rewrite:
+            self._conn.execute('DELETE FROM task_fields WHERE session_id = ?', (session_id,))
+
+        for (field, index), value in changes.items():
+            if index is None:
+                self._conn.execute('DELETE FROM task_fields WHERE session_id = ? AND field = ?',
+                                   (session_id, field))
+                self._conn.execute('INSERT INTO task_fields (session_id, field, item, value) VALUES (?, ?, -1, ?)',
+                                   (session_id, field, value))
+            else:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO task_fields (session_id, field, item, value) VALUES (?, ?, ?, ?)',
+                    (session_id, field, index, value))
+
+    def _write(self, session_ids):
+        """写入本进程持有的任务中被修改的字段，已被删除的会话不会重新写入"""
+        for session_id in session_ids:
+            dirty = self._dirty.pop(session_id, None)
+            if dirty is None or session_id not in self._local:
+                continue
+            with self._conn:
+                if not self._exists(session_id):
+                    continue
+                self._write_fields(session_id, *dirty)
+                self._conn.execute('UPDATE task_sessions SET updated_at = ? WHERE session_id = ?',
+                                   (time.time(), session_id))
+
+    def sync(self):
+        with self._lock:
+            if self._dirty:
+                self._write(list(self._dirty))
+
+    def migrate(self):
+        """旧版把整个任务序列化在 tasks 表的一行中；任务状态只在处理期间使用，升级时直接丢弃"""
+        with self._lock, self._conn:
+            self._conn.execute('DROP TABLE IF EXISTS tasks')
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"同步任务状态失败: {e}")
+
+
+def create_task_store(state_config):
+    """根据 [state] backend 配置创建任务状态存储"""
+    if state_config['backend'] == 'sqlite':
+        return SqliteTaskStore(state_config['db_path'], state_config['sync_interval'])
+    return MemoryTaskStore()
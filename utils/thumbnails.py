@@ -0,0 +1,102 @@
+import os
+import hashlib
+import threading
+
+from PIL import Image, features
+
+from utils.preprocess import IMAGE_MIME_TYPES
+
+
+def snap_width(width, widths):
+    """把请求的宽度对齐到配置的档位（不小于请求宽度的最小档），避免任意宽度撑满缓存"""
+    for candidate in sorted(widths):
+        if candidate >= width:
+            return candidate
+    return max(widths)
+
+
+class ThumbnailCache:
+    """幻灯片图片的缩略图磁盘缓存
+
+    按需把原图缩放到指定宽度并编码为WebP（浏览器不支持或PIL不支持时为JPEG），
+    结果以 原图路径+修改时间+宽度+格式 的摘要命名保存在cache_dir中，
+    总大小超过max_size_bytes时按最近访问时间(LRU)删除最旧的文件。
+    """
+
+    def __init__(self, cache_dir, max_size_bytes, widths, format='webp', quality=80):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size_bytes = max_size_bytes
+        self.widths = widths
+        self.format = format if format != 'webp' or features.check('webp') else 'jpeg'
+        self.quality = quality
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """列出缓存文件 (最近访问时间, 路径, 大小)"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _cache_path(self, image_path, width, format):
+        stat = os.stat(image_path)
+        raw = f"{os.path.abspath(image_path)}\n{stat.st_mtime_ns}\n{stat.st_size}\n{width}\n{format}\n{self.quality}"
+        key = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{format}")
+
+    def get(self, image_path, width, accept_webp=True):
+        """返回 (缩略图路径, MIME类型)；请求宽度不小于原图宽度时返回原图路径"""
+        width = snap_width(width, self.widths)
+        format = self.format if accept_webp else 'jpeg'
+        cache_path = self._cache_path(image_path, width, format)
+
+        if os.path.exists(cache_path):
+            # 以修改时间记录最近访问时间
+            os.utime(cache_path)
+            return cache_path, IMAGE_MIME_TYPES[format]
+
+        with Image.open(image_path) as image:
+            if image.width <= width:
+                return image_path, Image.MIME.get(image.format, 'application/octet-stream')
+            height = max(1, round(image.height * width / image.width))
+            thumbnail = image.convert('RGB').resize((width, height), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        thumbnail.save(temp_path, format.upper(), quality=self.quality)
+        os.replace(temp_path, cache_path)
+
+        with self._lock:
+            self._total_bytes += os.path.getsize(cache_path)
+            if self._total_bytes > self.max_size_bytes:
+                self._evict(keep=cache_path)
+        return cache_path, IMAGE_MIME_TYPES[format]
+
+    def _evict(self, keep=None):
+        """删除最久未访问的缩略图直到总大小不超过上限的90%，keep为刚生成、即将返回的文件"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_size_bytes * 0.9
+        evicted = 0
+        for _, path, size in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        print(f"缩略图缓存超出容量，删除了 {evicted} 个文件")
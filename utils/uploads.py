@@ -0,0 +1,81 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+
+def save_and_hash(stream, file_path, chunk_size=1024 * 1024):
+    """将上传的文件流写入磁盘，同时计算SHA-256摘要，避免写完后再读一遍"""
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, target):
+    """优先用硬链接复制文件（不占用额外磁盘空间），跨文件系统等无法链接时复制"""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def link_tree(source_dir, target_dir):
+    """把source_dir中的所有文件以硬链接方式复制到target_dir"""
+    for root, _, files in os.walk(source_dir):
+        target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            link_or_copy(os.path.join(root, name), os.path.join(target_root, name))
+
+
+class UploadIndex:
+    """上传文件摘要索引：SHA-256 -> 已完整分析该文件的会话，用于复用相同文件的分析结果"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS upload_index (
+                digest TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_index_session ON upload_index (session_id)')
+        self._conn.commit()
+
+    def get(self, digest):
+        """查找已完成分析的会话ID，没有时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT session_id FROM upload_index WHERE digest = ?', (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest, session_id):
+        """记录文件摘要对应的会话，已有记录时保留原来的会话"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO upload_index (digest, session_id, created_at) VALUES (?, ?, ?)',
+                (digest, session_id, time.time())
+            )
+            self._conn.commit()
+
+    def remove_session(self, session_id):
+        """会话被删除时移除指向它的索引"""
+        with self._lock:
+            self._conn.execute('DELETE FROM upload_index WHERE session_id = ?', (session_id,))
+            self._conn.commit()